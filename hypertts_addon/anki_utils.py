@@ -95,6 +95,11 @@ class AnkiUtils():
         note = aqt.mw.col.get_note(note_id)
         return note
 
+    def get_note_fields_containing(self, text):
+        # raw field contents (separated by 0x1f) of the notes containing text, without loading the notes
+        ensure_anki_collection_open()
+        return aqt.mw.col.db.list('select flds from notes where flds like ?', f'%{text}%')
+
     def get_model(self, model_id):
         ensure_anki_collection_open()
         return aqt.mw.col.models.get(model_id)
@@ -238,6 +243,13 @@ class AnkiUtils():
     def ask_user_get_text(self, message, parent, default, title):
         return aqt.utils.getText(message, parent, default=default, title=f'{constants.TITLE_PREFIX}{title}')
 
+    def ask_user_save_file(self, parent, title, default_filename, file_filter):
+        # returns None if the user cancelled
+        file_path, _ = aqt.qt.QFileDialog.getSaveFileName(parent, f'{constants.TITLE_PREFIX}{title}', default_filename, file_filter)
+        if file_path == None or len(file_path) == 0:
+            return None
+        return file_path
+
     def ask_user_choose_from_list(self, parent, prompt: str, choices: list[str], startrow: int = 0) -> int:
         d = aqt.qt.QDialog(parent)
         d.setWindowModality(aqt.qt.Qt.WindowModality.WindowModal)
@@ -265,6 +277,12 @@ class AnkiUtils():
     def show_progress_bar(self, message):
         aqt.mw.progress.start(immediate=True, label=f'{constants.MENU_PREFIX} {message}')
 
+    def update_progress_bar(self, message, value, max_value):
+        aqt.mw.progress.update(label=f'{constants.MENU_PREFIX} {message}', value=value, max=max_value)
+
+    def progress_bar_want_cancel(self):
+        return aqt.mw.progress.want_cancel()
+
     def stop_progress_bar(self):
         aqt.mw.progress.finish()
 
@@ -0,0 +1,335 @@
+"""
+index of the audio files generated in user_files, stored in a sqlite database next to them.
+maps the audio request hash to the file, so that looking up, measuring or evicting cached audio
+doesn't require listing or stat'ing a directory which can hold hundreds of thousands of files.
+files generated by previous versions are imported the first time the index gets created.
+the hash of the audio content is kept as well, so that requests which got identical audio
+(common with dictionary services) can share a single file.
+words that a service doesn't have audio for are remembered too, so that they don't get requested again.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import collections
+
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+# bumped whenever the table layout changes
+SCHEMA_VERSION = 3
+
+AUDIO_FILE_PREFIX = 'hypertts-'
+
+
+ENTRY_COLUMNS = 'hash, filename, size, format, service, created, last_used, content_hash'
+
+
+class AudioCacheEntry():
+    def __init__(self, hash_str, filename, size, format, service, created, last_used, content_hash):
+        self.hash_str = hash_str
+        self.filename = filename
+        self.size = size
+        self.format = format
+        self.service = service
+        self.created = created
+        self.last_used = last_used
+        # None for files imported from previous versions
+        self.content_hash = content_hash
+
+
+class AudioCacheIndex():
+    def __init__(self, user_files_dir, clock=time.time):
+        self.user_files_dir = user_files_dir
+        self.clock = clock
+        self.connection = None
+        # a single connection shared by the batch workers, the ui and the realtime playback
+        self.lock = threading.Lock()
+
+    def get_file_path(self):
+        return os.path.join(self.user_files_dir, constants.AUDIO_CACHE_INDEX_FILENAME)
+
+    def open(self):
+        self.connection = sqlite3.connect(self.get_file_path(), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.lock:
+            schema_version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if schema_version == 0:
+                self.create_schema()
+            elif schema_version < SCHEMA_VERSION:
+                self.upgrade_schema(schema_version)
+
+    def create_schema(self):
+        logger.info(f'creating audio cache index {self.get_file_path()}')
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS audio_files (
+                hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                format TEXT,
+                service TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                content_hash TEXT)''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS audio_files_last_used ON audio_files (last_used)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS audio_files_content_hash ON audio_files (content_hash)')
+            self.create_missing_audio_table()
+            self.import_existing_files()
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def upgrade_schema(self, schema_version):
+        logger.info(f'upgrading audio cache index from version {schema_version} to {SCHEMA_VERSION}')
+        with self.connection:
+            if schema_version < 2:
+                self.connection.execute('ALTER TABLE audio_files ADD COLUMN content_hash TEXT')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS audio_files_content_hash ON audio_files (content_hash)')
+            if schema_version < 3:
+                self.create_missing_audio_table()
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def create_missing_audio_table(self):
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS missing_audio (
+            service TEXT NOT NULL,
+            voice_key TEXT NOT NULL,
+            source_text TEXT NOT NULL,
+            created REAL NOT NULL,
+            PRIMARY KEY (service, voice_key, source_text))''')
+
+    def import_existing_files(self):
+        # one-time scan of the files generated before the index existed, their voice isn't known
+        entry_list = []
+        removed_count = 0
+        with os.scandir(self.user_files_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(constants.AUDIO_TEMP_FILE_PREFIX):
+                    if self.remove_temp_file(entry):
+                        removed_count += 1
+                    continue
+                if not entry.name.startswith(AUDIO_FILE_PREFIX) or not entry.is_file():
+                    continue
+                stat_result = entry.stat()
+                if stat_result.st_size == 0:
+                    continue
+                hash_str = os.path.splitext(entry.name)[0][len(AUDIO_FILE_PREFIX):]
+                entry_list.append((hash_str, entry.name, stat_result.st_size, None, None, stat_result.st_mtime, stat_result.st_mtime, None))
+        self.connection.executemany(f'INSERT OR REPLACE INTO audio_files ({ENTRY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', entry_list)
+        logger.info(f'imported {len(entry_list)} existing audio files into the audio cache index, removed {removed_count} temp files')
+
+    def remove_temp_file(self, entry):
+        # audio gets written to a temp file which is renamed once complete, an old one was left behind
+        # by a request which got interrupted. a recent one may still be getting written
+        try:
+            if entry.is_file() and entry.stat().st_mtime < self.clock() - constants.AUDIO_TEMP_FILE_MAX_AGE_SECONDS:
+                os.remove(entry.path)
+                return True
+        except FileNotFoundError:
+            pass
+        return False
+
+    def remove_temp_files(self):
+        # returns the number of temp files removed
+        removed_count = 0
+        with os.scandir(self.user_files_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(constants.AUDIO_TEMP_FILE_PREFIX) and self.remove_temp_file(entry):
+                    removed_count += 1
+        if removed_count > 0:
+            logger.info(f'removed {removed_count} temp files left behind by interrupted audio requests')
+        return removed_count
+
+    def lookup(self, hash_str) -> AudioCacheEntry:
+        # returns None if the audio isn't cached, otherwise marks the entry as used
+        with self.lock:
+            row = self.connection.execute(f'SELECT {ENTRY_COLUMNS} FROM audio_files WHERE hash = ?', (hash_str,)).fetchone()
+            if row == None:
+                return None
+            entry = AudioCacheEntry(*row)
+            entry.last_used = self.clock()
+            with self.connection:
+                self.connection.execute('UPDATE audio_files SET last_used = ? WHERE hash = ?', (entry.last_used, hash_str))
+            return entry
+
+    def get_filename(self, hash_str):
+        # doesn't mark the entry as used
+        with self.lock:
+            row = self.connection.execute('SELECT filename FROM audio_files WHERE hash = ?', (hash_str,)).fetchone()
+            return row[0] if row != None else None
+
+    def find_content(self, content_hash):
+        # returns the filename of a cached file with this exact content, or None
+        with self.lock:
+            row = self.connection.execute('SELECT filename FROM audio_files WHERE content_hash = ? LIMIT 1', (content_hash,)).fetchone()
+            return row[0] if row != None else None
+
+    def add(self, hash_str, filename, size, format, service, content_hash=None):
+        current_time = self.clock()
+        with self.lock:
+            with self.connection:
+                self.connection.execute(f'INSERT OR REPLACE INTO audio_files ({ENTRY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (hash_str, filename, size, format, service, current_time, current_time, content_hash))
+
+    def mark_used(self, filename):
+        # for entries served without a lookup, so that the files played often don't get evicted first
+        with self.lock:
+            with self.connection:
+                self.connection.execute('UPDATE audio_files SET last_used = ? WHERE filename = ?', (self.clock(), filename))
+
+    def remove(self, hash_str):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM audio_files WHERE hash = ?', (hash_str,))
+
+    def evict(self, max_size, protected_filenames):
+        # removes the least recently used files until the cache fits in max_size bytes,
+        # returns (evicted file count, evicted bytes). a file shared by several requests was last used
+        # by the most recent of them, and gets removed along with all of its entries
+        total_size = self.get_total_size()
+        if total_size <= max_size:
+            return 0, 0
+        with self.lock:
+            candidate_list = self.connection.execute('SELECT filename, MAX(size), MAX(last_used) AS file_last_used FROM audio_files '
+                'GROUP BY filename ORDER BY file_last_used').fetchall()
+        evicted_count = 0
+        evicted_size = 0
+        for filename, size, last_used in candidate_list:
+            if total_size - evicted_size <= max_size:
+                break
+            if filename in protected_filenames:
+                continue
+            with self.lock:
+                # the entries go first, so that a concurrent lookup can't return a file which is about to be removed
+                with self.connection:
+                    self.connection.execute('DELETE FROM audio_files WHERE filename = ?', (filename,))
+                try:
+                    os.remove(os.path.join(self.user_files_dir, filename))
+                except FileNotFoundError:
+                    pass
+            evicted_count += 1
+            evicted_size += size
+        logger.info(f'evicted {evicted_count} audio files ({evicted_size} bytes) from the audio cache, '
+            f'{total_size - evicted_size} bytes left, limit {max_size} bytes')
+        return evicted_count, evicted_size
+
+    def is_missing_audio(self, service, voice_key, source_text, max_age_seconds):
+        # whether the service recently reported that it doesn't have audio for this text
+        with self.lock:
+            row = self.connection.execute('SELECT created FROM missing_audio WHERE service = ? AND voice_key = ? AND source_text = ?',
+                (service, voice_key, source_text)).fetchone()
+            return row != None and row[0] > self.clock() - max_age_seconds
+
+    def add_missing_audio(self, service, voice_key, source_text):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO missing_audio (service, voice_key, source_text, created) VALUES (?, ?, ?, ?)',
+                    (service, voice_key, source_text, self.clock()))
+
+    def remove_expired_missing_audio(self, max_age_seconds):
+        with self.lock:
+            with self.connection:
+                return self.connection.execute('DELETE FROM missing_audio WHERE created <= ?', (self.clock() - max_age_seconds,)).rowcount
+
+    def get_missing_audio_count(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM missing_audio').fetchone()[0]
+
+    def get_filename_set(self):
+        with self.lock:
+            return set([row[0] for row in self.connection.execute('SELECT filename FROM audio_files')])
+
+    def get_hash_set(self):
+        with self.lock:
+            return set([row[0] for row in self.connection.execute('SELECT hash FROM audio_files')])
+
+    def get_entry_count(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(DISTINCT filename) FROM audio_files').fetchone()[0]
+
+    def get_total_size(self):
+        with self.lock:
+            # files shared by several requests only count once
+            return self.connection.execute('SELECT COALESCE(SUM(file_size), 0) FROM '
+                '(SELECT MAX(size) AS file_size FROM audio_files GROUP BY filename)').fetchone()[0]
+
+    def get_service_stats(self):
+        # returns {service: (file count, total size)}, files imported from previous versions have no service
+        with self.lock:
+            return {service: (count, size) for service, count, size in
+                self.connection.execute('SELECT service, COUNT(*), SUM(size) FROM audio_files GROUP BY service')}
+
+    def close(self):
+        with self.lock:
+            if self.connection != None:
+                self.connection.close()
+                self.connection = None
+
+
+class HotAudioCache():
+    """
+    in memory LRU cache, bounded in bytes, from a realtime tts tag to the audio file which plays it,
+    so that reviewing the same card again doesn't go through the realtime config and the cache index
+    """
+    def __init__(self, max_bytes, mark_used_interval=constants.REALTIME_HOT_AUDIO_CACHE_MARK_USED_SECONDS, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        # how often the cache index gets told that an entry is still being played
+        self.mark_used_interval = mark_used_interval
+        self.clock = clock
+        self.entries = collections.OrderedDict()
+        # key -> when the index last recorded the entry as used
+        self.last_marked_used = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get_entry_size(self, key, full_filename):
+        return len(key.encode('utf-8')) + len(full_filename.encode('utf-8'))
+
+    def get(self, key):
+        with self.lock:
+            full_filename = self.entries.get(key, None)
+            if full_filename != None:
+                self.entries.move_to_end(key)
+            return full_filename
+
+    def put(self, key, full_filename):
+        entry_size = self.get_entry_size(key, full_filename)
+        with self.lock:
+            previous_filename = self.entries.pop(key, None)
+            if previous_filename != None:
+                self.total_bytes -= self.get_entry_size(key, previous_filename)
+            self.entries[key] = full_filename
+            # put right after a lookup in the cache index, which marked the entry as used
+            self.last_marked_used[key] = self.clock()
+            self.total_bytes += entry_size
+            while self.total_bytes > self.max_bytes and len(self.entries) > 0:
+                evicted_key, evicted_filename = self.entries.popitem(last=False)
+                self.last_marked_used.pop(evicted_key, None)
+                self.total_bytes -= self.get_entry_size(evicted_key, evicted_filename)
+
+    def mark_used_required(self, key):
+        # whether the cache index should record that this entry was played, at most once per interval
+        with self.lock:
+            current_time = self.clock()
+            last_marked_used = self.last_marked_used.get(key, None)
+            if last_marked_used != None and current_time - last_marked_used < self.mark_used_interval:
+                return False
+            self.last_marked_used[key] = current_time
+            return True
+
+    def remove(self, key):
+        with self.lock:
+            full_filename = self.entries.pop(key, None)
+            if full_filename != None:
+                self.total_bytes -= self.get_entry_size(key, full_filename)
+            self.last_marked_used.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.last_marked_used.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
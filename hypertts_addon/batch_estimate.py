@@ -0,0 +1,65 @@
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class ServiceEstimate():
+    # in random mode, notes are spread across voices according to their weights, so counts can be fractional
+    def __init__(self, service_name):
+        self.service_name = service_name
+        self.request_count = 0
+        self.cache_hit_count = 0
+        # only requests which aren't cache hits get billed
+        self.character_count = 0
+        self.latency_seconds = None
+        self.estimated_seconds = 0
+
+
+class BatchEstimate():
+    """
+    result of a batch dry run: what the batch would send to each service, without sending anything
+    """
+    def __init__(self):
+        self.note_count = 0
+        self.empty_note_count = 0
+        # notes which share their audio with an earlier note of the batch
+        self.shared_request_count = 0
+        self.service_estimates = {}
+        self.estimated_seconds = 0
+
+    def get_service_estimate(self, service_name) -> ServiceEstimate:
+        if service_name not in self.service_estimates:
+            self.service_estimates[service_name] = ServiceEstimate(service_name)
+        return self.service_estimates[service_name]
+
+    def request_count(self):
+        return round(sum([x.request_count for x in self.service_estimates.values()]))
+
+    def cache_hit_count(self):
+        return round(sum([x.cache_hit_count for x in self.service_estimates.values()]))
+
+    def character_count(self):
+        return round(sum([x.character_count for x in self.service_estimates.values()]))
+
+    def get_summary(self):
+        lines = [f'{self.note_count} notes, {self.request_count()} audio requests needed, '
+            f'{self.cache_hit_count()} already in cache, {self.shared_request_count} shared between notes']
+        for service_estimate in self.service_estimates.values():
+            lines.append(f'{service_estimate.service_name}: {round(service_estimate.request_count):,} requests, '
+                f'{round(service_estimate.character_count):,} characters billed')
+        lines.append(f'Estimated time: {format_duration(self.estimated_seconds)}')
+        return '\n'.join(lines)
+
+
+def pluralize(count, unit):
+    return f'{count} {unit}' if count == 1 else f'{count} {unit}s'
+
+
+def format_duration(seconds):
+    if seconds >= 3600:
+        return f'{seconds / 3600:.1f} hours'
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    if minutes >= 5:
+        return pluralize(minutes, 'minute')
+    if minutes == 0:
+        return pluralize(seconds, 'second')
+    return f"{pluralize(minutes, 'minute')}, {pluralize(seconds, 'second')}"
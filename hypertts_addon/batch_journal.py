@@ -0,0 +1,157 @@
+"""
+append-only record of a batch run, one json object per line:
+- a header line identifying the batch (batch uuid, batch key)
+- one line per processed note (note_id, audio request hash, status)
+the file is removed once the batch completes, so any journal left on disk belongs to a batch
+which was interrupted (stopped by the user, or Anki closed / crashed) and can be resumed.
+"""
+
+import os
+import json
+import time
+
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+RECORD_TYPE_HEADER = 'header'
+RECORD_TYPE_NOTE = 'note'
+
+JOURNAL_FILE_PREFIX = 'batch-'
+JOURNAL_FILE_EXTENSION = '.jsonl'
+
+
+class BatchJournal():
+    def __init__(self, journal_dir, batch_uuid, batch_key, note_count):
+        self.journal_dir = journal_dir
+        self.batch_uuid = batch_uuid
+        self.batch_key = batch_key
+        self.note_count = note_count
+        # note ids which were processed successfully in this run or previous runs
+        self.completed_note_ids = set()
+        self.file = None
+        self.unsynced_record_count = 0
+
+    def get_file_path(self):
+        return os.path.join(self.journal_dir, f'{JOURNAL_FILE_PREFIX}{self.batch_uuid}{JOURNAL_FILE_EXTENSION}')
+
+    def open(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        file_path = self.get_file_path()
+        new_journal = not os.path.exists(file_path)
+        self.file = open(file_path, 'a', encoding='utf-8')
+        if new_journal:
+            self.write_record({
+                'type': RECORD_TYPE_HEADER,
+                'batch_uuid': self.batch_uuid,
+                'batch_key': self.batch_key,
+                'note_count': self.note_count,
+                'start_time': time.time()
+            })
+            self.sync()
+
+    def record_note(self, note_id, hash_str, status: constants.BatchNoteStatus):
+        if status == constants.BatchNoteStatus.Done:
+            self.completed_note_ids.add(note_id)
+        self.write_record({
+            'type': RECORD_TYPE_NOTE,
+            'note_id': note_id,
+            'hash': hash_str,
+            'status': status.name
+        })
+        self.unsynced_record_count += 1
+        if self.unsynced_record_count >= constants.BATCH_JOURNAL_SYNC_INTERVAL:
+            self.sync()
+
+    def is_completed(self, note_id):
+        return note_id in self.completed_note_ids
+
+    def write_record(self, record):
+        # a single write per line, a crash can at worst leave a truncated last line, which gets ignored on load
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced_record_count = 0
+
+    def close(self, completed):
+        if self.file == None:
+            return
+        self.sync()
+        self.file.close()
+        self.file = None
+        if completed:
+            # nothing left to resume
+            logger.info(f'batch {self.batch_uuid} completed, removing journal')
+            os.remove(self.get_file_path())
+
+
+def get_journal_dir(user_files_dir):
+    return os.path.join(user_files_dir, constants.DIR_BATCH_JOURNAL)
+
+
+def load_journal(file_path):
+    journal = None
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # truncated line from an interrupted write
+                logger.warning(f'skipping invalid line in batch journal {file_path}')
+                continue
+            if record['type'] == RECORD_TYPE_HEADER:
+                journal = BatchJournal(os.path.dirname(file_path), record['batch_uuid'], record['batch_key'], record['note_count'])
+            elif record['type'] == RECORD_TYPE_NOTE and journal != None:
+                if record['status'] == constants.BatchNoteStatus.Done.name:
+                    journal.completed_note_ids.add(record['note_id'])
+                else:
+                    journal.completed_note_ids.discard(record['note_id'])
+    return journal
+
+
+def read_journal_batch_key(file_path):
+    # only reads the header, so that looking for a resumable batch stays cheap
+    with open(file_path, 'r', encoding='utf-8') as f:
+        record = json.loads(f.readline())
+        if record['type'] == RECORD_TYPE_HEADER:
+            return record['batch_key']
+    return None
+
+
+def list_journal_files(journal_dir):
+    if not os.path.isdir(journal_dir):
+        return []
+    return [os.path.join(journal_dir, filename) for filename in os.listdir(journal_dir)
+        if filename.startswith(JOURNAL_FILE_PREFIX) and filename.endswith(JOURNAL_FILE_EXTENSION)]
+
+
+def find_interrupted_journal(journal_dir, batch_key):
+    # returns the journal of an interrupted run of the same batch, or None
+    for file_path in list_journal_files(journal_dir):
+        try:
+            if read_journal_batch_key(file_path) == batch_key:
+                return load_journal(file_path)
+        except Exception as e:
+            logger.warning(f'could not read batch journal {file_path}: {e}')
+    return None
+
+
+def remove_journals(journal_dir, batch_key):
+    # starting the same batch from scratch, previous journals are no longer needed
+    for file_path in list_journal_files(journal_dir):
+        try:
+            if read_journal_batch_key(file_path) == batch_key:
+                logger.info(f'removing batch journal {file_path}')
+                os.remove(file_path)
+        except Exception as e:
+            logger.warning(f'could not read batch journal {file_path}: {e}')
+
+
+def remove_expired_journals(journal_dir):
+    expiration_time = time.time() - constants.BATCH_JOURNAL_MAX_AGE_DAYS * 24 * 3600
+    for file_path in list_journal_files(journal_dir):
+        if os.path.getmtime(file_path) < expiration_time:
+            logger.info(f'removing expired batch journal {file_path}')
+            os.remove(file_path)
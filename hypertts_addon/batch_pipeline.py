@@ -0,0 +1,262 @@
+"""
+a batch runs as three stages joined by bounded queues:
+- reader: processes the text of the notes, ahead of the synthesis workers
+- dispatcher: submits audio requests to the worker pool (identical requests share the same future)
+- committer: waits for the audio in note order, updates the notes and writes them to the collection in chunks
+the committer runs on the calling (collection) thread, the reader and dispatcher run on their own threads.
+the collection is only accessed from the calling thread: in between commits, it reads the notes ahead of the
+committed ones and hands their text over to the reader.
+"""
+
+import time
+import queue
+import threading
+import concurrent.futures
+
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+# how often blocked stages wake up to check whether the batch got stopped
+STAGE_POLL_INTERVAL_SECONDS = 0.1
+
+
+class BatchNoteRequest():
+    """
+    a note from a batch, which has been read and for which audio was requested,
+    but which hasn't been updated yet
+    """
+    def __init__(self, note_id):
+        self.note_id = note_id
+        self.note = None
+        self.source_text = None
+        self.target_field_content = None
+        self.processed_text = None
+        self.request_key = None
+        self.error = None
+        self.future = None
+        # processed by a previous run of this batch, nothing to do
+        self.already_completed = False
+        # the note already has the right sound tag
+        self.skipped = False
+
+    def result(self):
+        # raises the error encountered while preparing the note or requesting the audio
+        if self.error != None:
+            raise self.error
+        return self.future.result()
+
+    def cancel(self):
+        if self.future != None:
+            self.future.cancel()
+
+
+class StageQueue():
+    """
+    bounded queue between two stages, keeps track of how full it gets and how long each side waits on
+    the other, so that the slowest stage of a batch can be identified from the logs
+    """
+    def __init__(self, name, max_depth, stop_event):
+        self.name = name
+        self.max_depth = max_depth
+        self.queue = queue.Queue(maxsize=max_depth)
+        self.stop_event = stop_event
+        self.lock = threading.Lock()
+        self.peak_depth = 0
+        self.depth_total = 0
+        self.get_count = 0
+        # producer waited on a full queue: the consumer is the bottleneck
+        self.producer_wait_time = 0.0
+        # consumer waited on an empty queue: the producer is the bottleneck
+        self.consumer_wait_time = 0.0
+
+    def put(self, item) -> bool:
+        # returns False if the batch got stopped before the item could be queued
+        start_time = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(item, timeout=STAGE_POLL_INTERVAL_SECONDS)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        finally:
+            with self.lock:
+                self.producer_wait_time += time.monotonic() - start_time
+                self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+    def get(self):
+        # returns None once the batch got stopped
+        start_time = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    item = self.queue.get(timeout=STAGE_POLL_INTERVAL_SECONDS)
+                    with self.lock:
+                        self.get_count += 1
+                        self.depth_total += self.queue.qsize() + 1
+                    return item
+                except queue.Empty:
+                    pass
+            return None
+        finally:
+            with self.lock:
+                self.consumer_wait_time += time.monotonic() - start_time
+
+    def drain(self):
+        # items which were queued but will never be consumed
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def get_stats(self):
+        with self.lock:
+            average_depth = self.depth_total / self.get_count if self.get_count > 0 else 0
+            return f'{self.name} queue: peak depth {self.peak_depth}/{self.max_depth}, average depth {average_depth:.1f}, ' \
+                f'producer waited {self.producer_wait_time:.1f}s, consumer waited {self.consumer_wait_time:.1f}s'
+
+
+class BatchPipeline():
+    # marks the end of the notes, so that the next stage can stop waiting
+    END_OF_BATCH = object()
+
+    def __init__(self, hypertts, note_id_list, batch, batch_status, anki_collection, journal,
+            concurrency, prepare_queue_depth, pending_requests_per_worker, note_update_chunk_size):
+        self.hypertts = hypertts
+        self.note_id_list = note_id_list
+        self.batch = batch
+        self.batch_status = batch_status
+        self.anki_collection = anki_collection
+        self.journal = journal
+        self.concurrency = concurrency
+        self.note_update_chunk_size = note_update_chunk_size
+
+        self.stop_event = threading.Event()
+        pending_queue_depth = concurrency * pending_requests_per_worker
+        # how many notes get read from the collection ahead of the last committed one, enough to fill the queues
+        self.read_ahead_count = prepare_queue_depth + pending_queue_depth
+        # notes read from the collection, waiting for their text to be processed (leaves room for the end of batch marker)
+        self.loaded_queue = StageQueue('loaded', self.read_ahead_count + 1, self.stop_event)
+        # notes read and processed, waiting to be dispatched to the workers
+        self.prepared_queue = StageQueue('prepared', prepare_queue_depth, self.stop_event)
+        # audio requested (in flight or done), waiting to be committed in note order
+        self.pending_queue = StageQueue('pending', pending_queue_depth, self.stop_event)
+        # notes which share the same audio request key share the same future
+        self.audio_requests = {}
+        self.note_updates = []
+        # unexpected errors in the reader / dispatcher threads, re-raised on the calling thread
+        self.stage_errors = []
+        self.loaded_count = 0
+        self.end_of_batch_loaded = False
+        # notes taken out of the pending queue, whether committed or not
+        self.completed_count = 0
+        self.committed_count = 0
+
+    def get_queue_depths(self):
+        return {
+            self.loaded_queue.name: self.loaded_queue.depth(),
+            self.prepared_queue.name: self.prepared_queue.depth(),
+            self.pending_queue.name: self.pending_queue.depth()
+        }
+
+    def run(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='hypertts_batch') as executor:
+            stage_threads = [
+                threading.Thread(target=self.run_stage, args=(self.read_notes,), name='hypertts_batch_reader', daemon=True),
+                threading.Thread(target=self.run_stage, args=(self.dispatch_requests, executor), name='hypertts_batch_dispatcher', daemon=True)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            try:
+                self.commit_notes()
+            finally:
+                # wakes up the other stages if the batch got stopped (or the committer failed)
+                self.stop_event.set()
+                for thread in stage_threads:
+                    thread.join()
+                # notes modified so far get written, even if the batch was interrupted
+                self.hypertts.flush_batch_note_updates(self.note_updates, self.batch_status, self.anki_collection, self.journal)
+                # don't send the audio requests which haven't started yet
+                for batch_note_request in self.loaded_queue.drain() + self.prepared_queue.drain() + self.pending_queue.drain():
+                    if batch_note_request is not self.END_OF_BATCH:
+                        batch_note_request.cancel()
+                logger.info(self.loaded_queue.get_stats())
+                logger.info(self.prepared_queue.get_stats())
+                logger.info(self.pending_queue.get_stats())
+        if len(self.stage_errors) > 0:
+            raise self.stage_errors[0]
+        logger.info(f'batch sent {len(self.audio_requests)} unique audio requests for {len(self.note_id_list)} notes')
+
+    def run_stage(self, stage_fn, *args):
+        try:
+            stage_fn(*args)
+        except Exception as e:
+            logger.exception(f'batch pipeline stage failed: {e}')
+            self.stage_errors.append(e)
+            self.stop_event.set()
+
+    def load_notes(self):
+        # runs on the collection thread, never blocks: the loaded queue has room for all the notes read ahead
+        note_count = len(self.note_id_list)
+        while self.loaded_count < note_count and self.loaded_count - self.completed_count < self.read_ahead_count:
+            note_id = self.note_id_list[self.loaded_count]
+            if self.journal.is_completed(note_id):
+                batch_note_request = BatchNoteRequest(note_id)
+                batch_note_request.already_completed = True
+            else:
+                batch_note_request = self.hypertts.load_batch_note_request(note_id, self.batch)
+            self.loaded_queue.put(batch_note_request)
+            self.loaded_count += 1
+        if self.loaded_count == note_count and not self.end_of_batch_loaded:
+            self.loaded_queue.put(self.END_OF_BATCH)
+            self.end_of_batch_loaded = True
+
+    def read_notes(self):
+        while True:
+            batch_note_request = self.loaded_queue.get()
+            if batch_note_request == None:
+                return
+            if batch_note_request is not self.END_OF_BATCH and not batch_note_request.already_completed:
+                self.hypertts.prepare_batch_note_request(batch_note_request, self.batch)
+            if not self.prepared_queue.put(batch_note_request):
+                return
+            if batch_note_request is self.END_OF_BATCH:
+                return
+
+    def dispatch_requests(self, executor):
+        while True:
+            batch_note_request = self.prepared_queue.get()
+            if batch_note_request == None:
+                return
+            if batch_note_request is not self.END_OF_BATCH:
+                self.hypertts.submit_batch_note_request(executor, batch_note_request, self.batch, self.audio_requests)
+            if not self.pending_queue.put(batch_note_request):
+                if batch_note_request is not self.END_OF_BATCH:
+                    batch_note_request.cancel()
+                return
+            if batch_note_request is self.END_OF_BATCH:
+                return
+
+    def commit_notes(self):
+        while self.batch_status.must_continue == True:
+            self.load_notes()
+            batch_note_request = self.pending_queue.get()
+            if batch_note_request == None or batch_note_request is self.END_OF_BATCH:
+                return
+            self.completed_count += 1
+            if batch_note_request.already_completed:
+                self.batch_status.set_status(batch_note_request.note_id, constants.BatchNoteStatus.Done)
+                continue
+            self.hypertts.complete_batch_note_request(batch_note_request, self.batch, self.batch_status, self.note_updates, self.journal)
+            if len(self.note_updates) >= self.note_update_chunk_size:
+                self.hypertts.flush_batch_note_updates(self.note_updates, self.batch_status, self.anki_collection, self.journal)
+            self.committed_count += 1
+            if self.committed_count % constants.BATCH_PIPELINE_LOG_INTERVAL == 0:
+                logger.debug(f'committed {self.committed_count} notes, queue depths: {self.get_queue_depths()}')
@@ -1,18 +1,48 @@
 import sys
+import array
 
 from . import constants
 from . import errors
 from . import logging_utils
 logger = logging_utils.get_child_logger(__name__)
 
+# statuses are stored as one byte per note, 0 means no status yet
+STATUS_LIST = [None] + list(constants.BatchNoteStatus)
+STATUS_CODE_MAP = {status: code for code, status in enumerate(STATUS_LIST)}
+
 class NoteStatus():
-    def __init__(self, note_id):
-        self.note_id = note_id
-        self.source_text = None
-        self.processed_text = None
-        self.sound_file = None
-        self.error = None
-        self.status = None
+    """
+    read-only view of a row of the BatchStatus, created on demand
+    """
+    __slots__ = ('batch_status', 'row')
+
+    def __init__(self, batch_status, row):
+        self.batch_status = batch_status
+        self.row = row
+
+    @property
+    def note_id(self):
+        return self.batch_status.note_id_list[self.row]
+
+    @property
+    def source_text(self):
+        return self.batch_status.source_text_list[self.row]
+
+    @property
+    def processed_text(self):
+        return self.batch_status.processed_text_list[self.row]
+
+    @property
+    def sound_file(self):
+        return self.batch_status.sound_file_map.get(self.row, None)
+
+    @property
+    def error(self):
+        return self.batch_status.error_map.get(self.row, None)
+
+    @property
+    def status(self):
+        return STATUS_LIST[self.batch_status.status_codes[self.row]]
 
 class BatchNoteActionContext():
     def __init__(self, batch_status, note_id):
@@ -62,22 +92,29 @@ class BatchRunningActionContext():
         return False        
 
 class BatchStatus():
+    """
+    status of each note of a batch, stored as parallel arrays indexed by row, so that very large
+    selections don't need an object per note. texts are only held once they've been computed,
+    and fields which are rarely set (errors, sound files) are stored sparsely.
+    """
     def __init__(self, anki_utils, note_id_list, change_listener):
         self.anki_utils = anki_utils
         self.note_id_list = note_id_list
         self.change_listener = change_listener
-        self.note_status_array = []
-        self.note_status_map = {}
-        self.note_id_map = {}
+        self.note_id_map = {note_id: row for row, note_id in enumerate(note_id_list)}
+        self.reset()
         self.task_running = False
         self.must_continue = False
-        i = 0
-        for note_id in self.note_id_list:
-            note_status = NoteStatus(note_id)
-            self.note_status_array.append(note_status)
-            self.note_status_map[note_id] = note_status
-            self.note_id_map[note_id] = i
-            i += 1
+        self.start_time = None
+
+    def reset(self):
+        # forget the texts and statuses of all notes
+        note_count = len(self.note_id_list)
+        self.source_text_list = [None] * note_count
+        self.processed_text_list = [None] * note_count
+        self.status_codes = array.array('b', bytes(note_count))
+        self.sound_file_map = {}
+        self.error_map = {}
     
     def is_running(self):
         return self.task_running
@@ -87,50 +124,69 @@ class BatchStatus():
         self.must_continue = False
 
     def __getitem__(self, array_index):
-        return self.note_status_array[array_index]
+        if array_index < 0 or array_index >= len(self.note_id_list):
+            raise IndexError(array_index)
+        return NoteStatus(self, array_index)
+
+    def __len__(self):
+        return len(self.note_id_list)
 
     def get_batch_running_action_context(self):
         return BatchRunningActionContext(self)
 
+    def get_note_status(self, note_id):
+        return NoteStatus(self, self.note_id_map[note_id])
+
     def get_note_action_context(self, note_id, blank_fields):
-        note_status = self.note_status_map[note_id]
-        note_status.error = None
-        note_status.status = constants.BatchNoteStatus.Processing
+        row = self.note_id_map[note_id]
+        self.error_map.pop(row, None)
+        self.status_codes[row] = STATUS_CODE_MAP[constants.BatchNoteStatus.Processing]
         if blank_fields:
-            note_status.source_text = None
-            note_status.processed_text = None
-            note_status.sound_file = None
+            self.source_text_list[row] = None
+            self.processed_text_list[row] = None
+            self.sound_file_map.pop(row, None)
         return BatchNoteActionContext(self, note_id)
 
     # error reporting
 
     def report_known_error(self, note_id, exception_value):
-        self.note_status_map[note_id].status = constants.BatchNoteStatus.Error
-        self.note_status_map[note_id].error = exception_value
+        row = self.note_id_map[note_id]
+        self.status_codes[row] = STATUS_CODE_MAP[constants.BatchNoteStatus.Error]
+        self.error_map[row] = exception_value
         self.notify_change(note_id)
 
     def report_unknown_exception(self, note_id, exception_value):
-        self.note_status_map[note_id].status = constants.BatchNoteStatus.Error
-        self.note_status_map[note_id].error = exception_value
+        row = self.note_id_map[note_id]
+        self.status_codes[row] = STATUS_CODE_MAP[constants.BatchNoteStatus.Error]
+        self.error_map[row] = exception_value
         self.anki_utils.report_unknown_exception_background(exception_value)
         self.notify_change(note_id)
 
     # set the various fields on the NoteStatus
 
     def set_source_text(self, note_id, source_text):
-        self.note_status_map[note_id].source_text = source_text
+        self.source_text_list[self.note_id_map[note_id]] = source_text
         self.notify_change(note_id)
 
     def set_processed_text(self, note_id, processed_text):
-        self.note_status_map[note_id].processed_text = processed_text
+        row = self.note_id_map[note_id]
+        source_text = self.source_text_list[row]
+        if processed_text == source_text:
+            # text processing often leaves the text unchanged, don't hold two copies
+            processed_text = source_text
+        self.processed_text_list[row] = processed_text
         self.notify_change(note_id)
 
     def set_sound_file(self, note_id, sound_file):
-        self.note_status_map[note_id].sound_file = sound_file
+        row = self.note_id_map[note_id]
+        if sound_file == None:
+            self.sound_file_map.pop(row, None)
+        else:
+            self.sound_file_map[row] = sound_file
         self.notify_change(note_id)
 
     def set_status(self, note_id, status):
-        self.note_status_map[note_id].status = status
+        self.status_codes[self.note_id_map[note_id]] = STATUS_CODE_MAP[status]
         self.notify_change(note_id)
 
     def notify_start(self):
@@ -142,4 +198,4 @@ class BatchStatus():
         self.change_listener.batch_change(note_id, row, len(self.note_id_list), self.start_time, self.anki_utils.get_current_time())
 
     def notify_end(self, completed):
-        self.change_listener.batch_end(completed)
\ No newline at end of file
+        self.change_listener.batch_end(completed)
@@ -1,12 +1,12 @@
 import sys
 import os
-import requests
 import json
 
 from . import errors
 from . import version
 from . import constants
 from . import config_models
+from . import http_session
 from . import voice as voice_module
 from . import logging_utils
 logger = logging_utils.get_child_logger(__name__)
@@ -18,6 +18,8 @@ class CloudLanguageTools():
     def __init__(self):
         self.clt_api_base_url = os.environ.get('ANKI_LANGUAGE_TOOLS_BASE_URL', constants.CLOUDLANGUAGETOOLS_API_BASE_URL)
         self.vocabai_api_base_url = os.environ.get('ANKI_LANGUAGE_TOOLS_VOCABAI_BASE_URL', constants.VOCABAI_API_BASE_URL)
+        # replaced by the ServiceManager's, so that the connections are shared with the services
+        self.http_session_manager = http_session.HttpSessionManager()
 
     def configure(self, config: config_models.Configuration):
         self.config = config
@@ -43,6 +45,15 @@ class CloudLanguageTools():
             return self.clt_api_base_url
 
     def get_tts_audio(self, source_text, voice, options, audio_request_context):
+        return self.request_audio(source_text, voice, options, audio_request_context, False).content
+
+    def write_tts_audio(self, source_text, voice, options, audio_request_context, audio_file):
+        # streamed from the response into audio_file
+        with self.request_audio(source_text, voice, options, audio_request_context, True) as response:
+            for chunk in response.iter_content(chunk_size=constants.AUDIO_STREAM_CHUNK_SIZE):
+                audio_file.write(chunk)
+
+    def request_audio(self, source_text, voice, options, audio_request_context, stream):
         if hasattr(sys, '_sentry_crash_reporting'):
             sentry_sdk.set_user({"id": f'api_key:{self.config.hypertts_pro_api_key}'})
             sentry_sdk.set_context("user", {
@@ -64,21 +75,22 @@ class CloudLanguageTools():
             'options': options
         }
         logger.info(f'request url: {full_url}, data: {data}')
-        response = requests.post(full_url, json=data, headers=self.get_request_headers(),
-            timeout=constants.RequestTimeout)
+        response = self.http_session_manager.post(full_url, constants.CLOUDLANGUAGETOOLS_BATCH_CONCURRENCY, json=data, headers=self.get_request_headers(),
+            timeout=constants.RequestTimeout, stream=stream)
 
         if response.status_code == 200:
-            return response.content
-        elif response.status_code == 404:
-            raise errors.AudioNotFoundError(source_text, voice)
-        else:
+            return response
+        # the response may be streamed, release the connection before raising
+        with response:
+            if response.status_code == 404:
+                raise errors.AudioNotFoundError(source_text, voice)
             error_message = f"Status code: {response.status_code} ({response.content})"
-            raise errors.RequestError(source_text, voice, error_message)    
+            raise errors.RequestError(source_text, voice, error_message, response=response)
 
     def account_info(self, api_key):
         # try to get account data on vocabai first
         logger.debug(f'verifying API key on vocabai API')
-        response = requests.get(self.vocabai_api_base_url + '/account', headers={
+        response = self.http_session_manager.get(self.vocabai_api_base_url + '/account', headers={
                 'Authorization': f'Api-Key {api_key}',
                 'User-Agent': f'anki-hyper-tts/{version.ANKI_HYPER_TTS_VERSION}'}
         )
@@ -94,7 +106,7 @@ class CloudLanguageTools():
 
         # now try to get account data on CLT API
         logger.debug(f'verifying API key on CLT API')
-        response = requests.get(self.clt_api_base_url + '/account', headers={'api_key': api_key})
+        response = self.http_session_manager.get(self.clt_api_base_url + '/account', headers={'api_key': api_key})
         logger.debug(f'CLT API result: {response.json()}')
         if response.status_code == 200:
             # API key is valid on CLT API
@@ -122,7 +134,7 @@ class CloudLanguageTools():
 
     def request_trial_key(self, email):
         logger.info(f'requesting trial key for email {email}')
-        response = requests.post(self.clt_api_base_url + '/request_trial_key', json={'email': email})
+        response = self.http_session_manager.post(self.clt_api_base_url + '/request_trial_key', json={'email': email})
         data = json.loads(response.content)
         logger.info(f'retrieved {data}')
         return data        
\ No newline at end of file
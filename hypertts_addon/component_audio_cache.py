@@ -0,0 +1,195 @@
+import sys
+import aqt.qt
+
+from . import component_common
+from . import config_models
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class AudioCache(component_common.ConfigComponentBase):
+
+    def __init__(self, hypertts, dialog, model_change_callback):
+        self.hypertts = hypertts
+        self.dialog = dialog
+        self.model = config_models.AudioCache()
+        self.model_change_callback = model_change_callback
+        self.propagate_model_change = True
+
+        self.max_size_mb = aqt.qt.QSpinBox()
+        self.max_size_mb.setMinimum(0)
+        self.max_size_mb.setMaximum(constants.AUDIO_CACHE_MAX_SIZE_MB_MAX)
+        self.max_size_mb.setSuffix(' MB')
+        # shown when the value is 0
+        self.max_size_mb.setSpecialValueText('No Limit')
+
+        self.deduplicate_audio_checkbox = aqt.qt.QCheckBox('Share identical audio between notes')
+
+        self.missing_audio_ttl_days = aqt.qt.QSpinBox()
+        self.missing_audio_ttl_days.setMinimum(0)
+        self.missing_audio_ttl_days.setMaximum(constants.AUDIO_CACHE_MISSING_AUDIO_TTL_DAYS_MAX)
+        self.missing_audio_ttl_days.setSuffix(' days')
+        self.missing_audio_ttl_days.setSpecialValueText('Disabled')
+
+        self.statistics_label = aqt.qt.QLabel()
+        self.statistics_label.setTextFormat(aqt.qt.Qt.TextFormat.RichText)
+        self.refresh_statistics_button = aqt.qt.QPushButton('Refresh')
+        self.reset_statistics_button = aqt.qt.QPushButton('Reset')
+        self.export_statistics_button = aqt.qt.QPushButton('Export JSON...')
+
+    def get_model(self):
+        return self.model
+
+    def load_model(self, model):
+        self.model = model
+        self.propagate_model_change = False
+        self.max_size_mb.setValue(self.model.max_size_mb)
+        self.deduplicate_audio_checkbox.setChecked(self.model.deduplicate_audio)
+        self.missing_audio_ttl_days.setValue(self.model.missing_audio_ttl_days)
+        self.propagate_model_change = True
+
+    def notify_model_update(self):
+        if self.propagate_model_change == True:
+            self.model_change_callback(self.model)
+
+    def draw(self):
+        layout_widget = aqt.qt.QWidget()
+        layout = aqt.qt.QVBoxLayout(layout_widget)
+
+        # cache size
+        # ==========
+
+        groupbox = aqt.qt.QGroupBox('Cache Size')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        max_size_label = aqt.qt.QLabel(constants.GUI_TEXT_AUDIO_CACHE_MAX_SIZE)
+        max_size_label.setWordWrap(True)
+        vlayout.addWidget(max_size_label)
+        vlayout.addWidget(self.max_size_mb)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        # identical audio
+        # ===============
+
+        groupbox = aqt.qt.QGroupBox('Identical Audio')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        deduplicate_audio_label = aqt.qt.QLabel(constants.GUI_TEXT_AUDIO_CACHE_DEDUPLICATE)
+        deduplicate_audio_label.setWordWrap(True)
+        vlayout.addWidget(deduplicate_audio_label)
+        vlayout.addWidget(self.deduplicate_audio_checkbox)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        # missing audio
+        # =============
+
+        groupbox = aqt.qt.QGroupBox('Missing Audio')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        missing_audio_ttl_label = aqt.qt.QLabel(constants.GUI_TEXT_AUDIO_CACHE_MISSING_AUDIO_TTL)
+        missing_audio_ttl_label.setWordWrap(True)
+        vlayout.addWidget(missing_audio_ttl_label)
+        vlayout.addWidget(self.missing_audio_ttl_days)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        # statistics
+        # ==========
+
+        groupbox = aqt.qt.QGroupBox('Statistics')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        vlayout.addWidget(self.statistics_label)
+        hlayout = aqt.qt.QHBoxLayout()
+        hlayout.addWidget(self.refresh_statistics_button)
+        hlayout.addWidget(self.reset_statistics_button)
+        hlayout.addWidget(self.export_statistics_button)
+        hlayout.addStretch()
+        vlayout.addLayout(hlayout)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        layout.addStretch()
+
+        self.update_statistics()
+
+        # wire events
+        self.max_size_mb.valueChanged.connect(self.max_size_mb_changed)
+        self.deduplicate_audio_checkbox.stateChanged.connect(self.deduplicate_audio_changed)
+        self.missing_audio_ttl_days.valueChanged.connect(self.missing_audio_ttl_days_changed)
+        self.refresh_statistics_button.pressed.connect(self.update_statistics)
+        self.reset_statistics_button.pressed.connect(self.reset_statistics)
+        self.export_statistics_button.pressed.connect(self.export_statistics)
+
+        return layout_widget
+
+    def max_size_mb_changed(self, value):
+        logger.info(f'max_size_mb_changed {value}')
+        self.model.max_size_mb = value
+        self.notify_model_update()
+
+    def deduplicate_audio_changed(self, value):
+        logger.info(f'deduplicate_audio_changed {value}')
+        self.model.deduplicate_audio = self.deduplicate_audio_checkbox.isChecked()
+        self.notify_model_update()
+
+    def missing_audio_ttl_days_changed(self, value):
+        logger.info(f'missing_audio_ttl_days_changed {value}')
+        self.model.missing_audio_ttl_days = value
+        self.notify_model_update()
+
+    def update_statistics(self):
+        if not self.hypertts.audio_cache_opened():
+            self.statistics_label.setText('Loading the audio cache...')
+            self.hypertts.anki_utils.run_in_background(self.hypertts.get_audio_cache, self.open_audio_cache_done)
+            return
+        with self.hypertts.error_manager.get_single_action_context('Getting Audio Cache Statistics'):
+            audio_cache_index = self.hypertts.get_audio_cache()
+            lines = [f'Cached audio files: {audio_cache_index.get_entry_count()}, {format_size(audio_cache_index.get_total_size())}',
+                f'<br/>Words without audio: {audio_cache_index.get_missing_audio_count()}']
+            service_summary = self.hypertts.service_manager.latency_tracker.get_service_summary()
+            if len(service_summary) > 0:
+                lines.append('<table cellpadding="3"><tr><th align="left">Service</th><th>Hits</th><th>Misses</th>'
+                    '<th>Hit Rate</th><th>Served from Cache</th><th>Time Saved</th></tr>')
+                for service_name, (hit_count, miss_count, hit_rate, bytes_served, latency_saved) in sorted(service_summary.items()):
+                    lines.append(f'<tr><td>{service_name}</td><td align="right">{hit_count}</td><td align="right">{miss_count}</td>'
+                        f'<td align="right">{hit_rate:.0%}</td><td align="right">{format_size(bytes_served)}</td>'
+                        f'<td align="right">{latency_saved:.1f}s</td></tr>')
+                lines.append('</table>')
+            else:
+                lines.append('<br/>No audio requested during this session.')
+            self.statistics_label.setText(''.join(lines))
+
+    def open_audio_cache_done(self, result):
+        with self.hypertts.error_manager.get_single_action_context('Opening Audio Cache'):
+            result.result()
+            self.update_statistics()
+
+    def reset_statistics(self):
+        self.hypertts.service_manager.latency_tracker.reset()
+        self.update_statistics()
+
+    def export_statistics(self):
+        with self.hypertts.error_manager.get_single_action_context('Exporting Audio Cache Statistics'):
+            file_path = self.hypertts.anki_utils.ask_user_save_file(self.dialog, 'Export Audio Statistics',
+                'hypertts_audio_statistics.json', 'JSON (*.json)')
+            if file_path == None:
+                return
+            # the cache statistics are left out while the index is still being opened
+            audio_cache_index = self.hypertts.get_audio_cache() if self.hypertts.audio_cache_opened() else None
+            self.hypertts.service_manager.latency_tracker.export_json(file_path, audio_cache_index)
+
+
+def format_size(size):
+    if size >= 1024 * 1024 * 1024:
+        return f'{size / (1024 * 1024 * 1024):.1f} GB'
+    if size >= 1024 * 1024:
+        return f'{size / (1024 * 1024):.1f} MB'
+    return f'{size / 1024:.1f} KB'
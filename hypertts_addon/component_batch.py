@@ -38,6 +38,9 @@ class ComponentBatch(component_common.ConfigComponentBase):
         self.show_settings_button = aqt.qt.QPushButton('Hide Settings')
         self.preview_sound_button = aqt.qt.QPushButton('Preview Sound')
         self.apply_button = aqt.qt.QPushButton('Apply to Notes')
+        self.resume_button = aqt.qt.QPushButton('Resume Batch')
+        self.resume_button.setToolTip('Continue the previous run of this batch, which was interrupted')
+        self.resume_button.setVisible(False)
         self.cancel_button = aqt.qt.QPushButton('Cancel')
         self.profile_open_button = aqt.qt.QPushButton('Open')
         self.profile_open_button.setToolTip('Open a different preset')
@@ -62,7 +65,7 @@ class ComponentBatch(component_common.ConfigComponentBase):
         self.voice_selection = component_voiceselection.VoiceSelection(self.hypertts, self.dialog, self.voice_selection_model_updated)
         self.text_processing = component_text_processing.TextProcessing(self.hypertts, self.text_processing_model_updated)
         self.preview = component_batch_preview.BatchPreview(self.hypertts, self.dialog, self.note_id_list, 
-            self.sample_selected, self.apply_notes_batch_start, self.apply_notes_batch_end)
+            self.sample_selected, self.apply_notes_batch_start, self.apply_notes_batch_end, self.interrupted_batch_found)
         self.editor_mode = False
         self.show_settings = True
 
@@ -271,6 +274,8 @@ class ComponentBatch(component_common.ConfigComponentBase):
         self.apply_button.setText(apply_label_text)
         if self.editor_mode == False:
             self.apply_button.setStyleSheet(self.hypertts.anki_utils.get_green_stylesheet())
+        if not self.editor_mode:
+            hlayout.addWidget(self.resume_button)
         hlayout.addWidget(self.apply_button)
         # save and close
         if self.editor_mode == True:
@@ -284,6 +289,7 @@ class ComponentBatch(component_common.ConfigComponentBase):
         self.show_settings_button.pressed.connect(self.show_settings_button_pressed)
         self.preview_sound_button.pressed.connect(self.sound_preview_button_pressed)
         self.apply_button.pressed.connect(self.apply_button_pressed)
+        self.resume_button.pressed.connect(self.resume_button_pressed)
         self.cancel_button.pressed.connect(self.cancel_button_pressed)
         self.profile_save_and_close_button.pressed.connect(self.profile_save_and_close_button_pressed)
 
@@ -415,6 +421,21 @@ class ComponentBatch(component_common.ConfigComponentBase):
                 self.apply_button.setText('Loading...')
                 self.preview.apply_audio_to_notes()
 
+    def resume_button_pressed(self):
+        with self.hypertts.error_manager.get_single_action_context('Resuming Batch'):
+            self.get_model().validate()
+            logger.info('resume_button_pressed')
+            self.disable_bottom_buttons()
+            self.apply_button.setText('Loading...')
+            self.preview.apply_audio_to_notes(resume=True)
+
+    def interrupted_batch_found(self, journal):
+        if journal == None or len(journal.completed_note_ids) == 0:
+            self.resume_button.setVisible(False)
+            return
+        self.resume_button.setText(f'Resume Batch ({len(journal.completed_note_ids)} / {journal.note_count} done)')
+        self.resume_button.setVisible(True)
+
     def cancel_button_pressed(self):
         self.dialog.close()
 
@@ -452,11 +473,13 @@ class ComponentBatch(component_common.ConfigComponentBase):
     def disable_bottom_buttons(self):
         self.preview_sound_button.setEnabled(False)
         self.apply_button.setEnabled(False)
+        self.resume_button.setEnabled(False)
         self.cancel_button.setEnabled(False)
 
     def enable_bottom_buttons(self):
         self.preview_sound_button.setEnabled(True)
         self.apply_button.setEnabled(True)
+        self.resume_button.setEnabled(True)
         self.cancel_button.setEnabled(True)
 
     def apply_notes_batch_start(self):
@@ -472,6 +495,7 @@ class ComponentBatch(component_common.ConfigComponentBase):
         self.cancel_button.setEnabled(True)
         self.apply_button.setStyleSheet(None)
         self.apply_button.setText('Done')
+        self.resume_button.setVisible(False)
 
     def apply_notes_batch_end(self, completed):
         if completed:
@@ -1,6 +1,6 @@
 import sys
 import aqt.qt
-import time
+import threading
 import html
 import aqt.operations
 
@@ -10,16 +10,49 @@ from . import batch_status
 from . import logging_utils
 logger = logging_utils.get_child_logger(__name__)
 
-class TableRepaintTimer():
+class PreviewTimer():
     def __init__(self, delay_ms):
         self.delay_ms = delay_ms
         self.timer_obj = None
 
 
+class BatchProgressChannel():
+    """
+    collects the changes reported by BatchStatus (from the batch thread) into a set of dirty rows,
+    which the GUI picks up at a fixed rate, instead of handling every change of every note separately
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirty_rows = set()
+        self.latest_progress = None
+        # a flush is already scheduled on the main thread
+        self.flush_scheduled = False
+
+    def add_change(self, row, progress) -> bool:
+        # returns True if the caller needs to schedule a flush
+        with self.lock:
+            self.dirty_rows.add(row)
+            self.latest_progress = progress
+            if self.flush_scheduled:
+                return False
+            self.flush_scheduled = True
+            return True
+
+    def take_changes(self):
+        # returns (dirty rows, latest progress)
+        with self.lock:
+            dirty_rows = self.dirty_rows
+            self.dirty_rows = set()
+            self.flush_scheduled = False
+            return dirty_rows, self.latest_progress
+
+
 class BatchPreviewTableModel(aqt.qt.QAbstractTableModel):
-    def __init__(self, batch_status):
+    def __init__(self, batch_status, row_displayed_fn=None):
         aqt.qt.QAbstractTableModel.__init__(self, None)
         self.batch_status = batch_status
+        # gets called for each row the view displays, so that its text can be computed on demand
+        self.row_displayed_fn = row_displayed_fn
         self.note_id_header = 'Note Id'
         self.source_text_header = 'Source Text'
         self.processed_text_header = 'Processed Text'
@@ -36,10 +69,10 @@ class BatchPreviewTableModel(aqt.qt.QAbstractTableModel):
         # logger.debug('SourceTextPreviewTableModel.columnCount')
         return 4
     
-    def notifyChange(self, row):
-        # logger.info(f'notifyChange, row: {row}')
-        start_index = self.createIndex(row, 0)
-        end_index = self.createIndex(row, 2)
+    def notifyChange(self, start_row, end_row):
+        # logger.info(f'notifyChange, rows: {start_row} to {end_row}')
+        start_index = self.createIndex(start_row, 0)
+        end_index = self.createIndex(end_row, 3)
         self.dataChanged.emit(start_index, end_index)
 
     def data(self, index, role):
@@ -49,6 +82,8 @@ class BatchPreviewTableModel(aqt.qt.QAbstractTableModel):
         if not index.isValid():
             return aqt.qt.QVariant()
         data = None
+        if self.row_displayed_fn != None:
+            self.row_displayed_fn(index.row())
         note_status = self.batch_status[index.row()]
         if index.column() == 0:
             data = note_status.note_id
@@ -77,16 +112,18 @@ class BatchPreviewTableModel(aqt.qt.QAbstractTableModel):
         return aqt.qt.QVariant()
 
 class BatchPreview(component_common.ComponentBase):
-    def __init__(self, hypertts, dialog, note_id_list, sample_selection_fn, batch_start_fn, batch_end_fn):
+    def __init__(self, hypertts, dialog, note_id_list, sample_selection_fn, batch_start_fn, batch_end_fn, interrupted_batch_fn=None):
         self.hypertts = hypertts
         self.dialog = dialog
         self.note_id_list = note_id_list
         self.sample_selection_fn = sample_selection_fn
         self.batch_start_fn = batch_start_fn
         self.batch_end_fn = batch_end_fn
+        # gets called with the journal of a previous interrupted run of this batch (or None), so that it can be resumed
+        self.interrupted_batch_fn = interrupted_batch_fn
 
         self.batch_status = batch_status.BatchStatus(hypertts.anki_utils, note_id_list, self)
-        self.batch_preview_table_model = BatchPreviewTableModel(self.batch_status)
+        self.batch_preview_table_model = BatchPreviewTableModel(self.batch_status, self.row_displayed)
         self.table_view = None
 
         # create certain widgets right away
@@ -94,30 +131,148 @@ class BatchPreview(component_common.ComponentBase):
         self.progress_bar = aqt.qt.QProgressBar()
         self.progress_bar.setMaximum(len(self.note_id_list))        
         self.progress_details = aqt.qt.QLabel()
+        self.audio_request_count_label = aqt.qt.QLabel()
+        self.estimate_button = aqt.qt.QPushButton('Estimate Cost')
+        self.estimate_label = aqt.qt.QLabel()
+        self.estimate_label.setWordWrap(True)
 
         self.selected_row = None
 
         self.apply_to_notes_batch_started = False
-
-        self.table_repaint_timer = TableRepaintTimer(500)
+        # the model changed while a batch was running
+        self.reload_after_batch_end = False
+
+        self.progress_channel = BatchProgressChannel()
+        self.progress_flush_timer = PreviewTimer(constants.BATCH_PROGRESS_FLUSH_INTERVAL_MS)
+        # preview text is computed for the rows the table view displays, plus a prefetch window.
+        # loading a new model increments the generation, which stops computations started for the previous one
+        self.generation = 0
+        self.rows_requested = bytearray(len(self.note_id_list))
+        self.pending_rows = set()
+        self.populate_rows_timer = PreviewTimer(constants.BATCH_PREVIEW_POPULATE_DELAY_MS)
 
     def load_model(self, model):
         self.batch_model = model
-        self.hypertts.anki_utils.run_in_background(self.update_batch_status_task, self.update_batch_status_task_done)
-
-    def update_batch_status_task(self):
         if self.batch_status.is_running():
-            # stop current batch
+            # stop current batch, the preview gets reset once the batch has ended, see batch_end
+            self.reload_after_batch_end = True
             self.batch_status.stop()
-        while self.batch_status.is_running():
-            time.sleep(0.1)
-
-        logger.info('update_batch_status_task')
+            return
+        self.reload_model()
+
+    def reload_model(self):
+        # previous preview text computations stop at the next note
+        self.generation += 1
+        # computed for the previous model
+        self.update_estimate(None)
+        self.update_audio_request_count(None)
+        self.rows_requested = bytearray(len(self.note_id_list))
+        self.pending_rows = set()
+        self.batch_status.reset()
+        if len(self.note_id_list) > 0:
+            self.batch_preview_table_model.notifyChange(0, len(self.note_id_list) - 1)
         if self.batch_model.text_processing != None:
-            self.hypertts.populate_batch_status_processed_text(self.note_id_list, self.batch_model.source, self.batch_model.text_processing, self.batch_status)
+            self.request_visible_rows()
+        self.hypertts.anki_utils.run_in_background(self.find_interrupted_batch_task, self.find_interrupted_batch_task_done)
+
+    def find_interrupted_batch_task(self):
+        if self.batch_model.text_processing != None and self.batch_model.voice_selection != None:
+            return self.hypertts.get_interrupted_batch_journal(self.note_id_list, self.batch_model)
+        return None
+
+    def find_interrupted_batch_task_done(self, result):
+        with self.hypertts.error_manager.get_single_action_context('Looking for Interrupted Batch'):
+            journal = result.result()
+            self.report_interrupted_batch(journal)
 
-    def update_batch_status_task_done(self, result):
-        logger.info('update_batch_status_task_done')
+    def row_displayed(self, row):
+        # called by the table model on the main thread
+        if self.rows_requested[row] == 0:
+            self.request_visible_rows()
+            self.request_rows([row])
+
+    def request_visible_rows(self):
+        first_row = 0
+        last_row = -1
+        if self.table_view != None:
+            first_row = max(0, self.table_view.rowAt(0))
+            last_row = self.table_view.rowAt(self.table_view.viewport().height() - 1)
+        if last_row == -1:
+            # the view isn't displayed yet, or isn't full
+            last_row = first_row + constants.BATCH_PREVIEW_PREFETCH_ROWS
+        self.request_rows(range(first_row, last_row + 1 + constants.BATCH_PREVIEW_PREFETCH_ROWS))
+
+    def request_rows(self, rows):
+        if self.batch_model.text_processing == None:
+            return
+        new_row_found = False
+        for row in rows:
+            if row < len(self.note_id_list) and self.rows_requested[row] == 0:
+                self.rows_requested[row] = 1
+                self.pending_rows.add(row)
+                new_row_found = True
+        if new_row_found:
+            self.hypertts.anki_utils.call_on_timer_expire(self.populate_rows_timer, self.populate_pending_rows)
+
+    def populate_pending_rows(self):
+        if len(self.pending_rows) == 0:
+            return
+        note_id_list = [self.note_id_list[row] for row in sorted(self.pending_rows)]
+        self.pending_rows = set()
+        generation = self.generation
+        batch_model = self.batch_model
+        def populate_rows_task():
+            self.hypertts.populate_batch_status_rows_processed_text(note_id_list, batch_model.source, batch_model.text_processing,
+                self.batch_status, lambda: self.generation == generation)
+        self.hypertts.anki_utils.run_in_background(populate_rows_task, self.populate_rows_task_done)
+
+    def populate_rows_task_done(self, result):
+        with self.hypertts.error_manager.get_single_action_context('Computing Preview Text'):
+            result.result()
+
+    def report_interrupted_batch(self, journal):
+        if self.interrupted_batch_fn != None:
+            self.hypertts.anki_utils.run_on_main(lambda: self.interrupted_batch_fn(journal))
+
+    def update_audio_request_count(self, audio_request_count):
+        if audio_request_count == None:
+            self.audio_request_count_label.setText('')
+            return
+        note_count, request_count = audio_request_count
+        saved_count = note_count - request_count
+        self.audio_request_count_label.setText(f'{note_count} notes, {request_count} unique audio requests ({saved_count} API calls saved)')
+
+    def estimate_button_pressed(self):
+        if self.batch_model.text_processing == None or self.batch_model.voice_selection == None:
+            return
+        self.estimate_label.setText('Estimating...')
+        # the estimate needs the text of every note, not just the rows displayed
+        for row in range(len(self.note_id_list)):
+            self.rows_requested[row] = 1
+        generation = self.generation
+        batch_model = self.batch_model
+        def estimate_batch_task():
+            note_id_list = [self.note_id_list[row] for row in range(len(self.note_id_list))
+                if self.batch_status.processed_text_list[row] == None]
+            self.hypertts.populate_batch_status_rows_processed_text(note_id_list, batch_model.source, batch_model.text_processing,
+                self.batch_status, lambda: self.generation == generation)
+            if self.generation != generation:
+                return None, None
+            audio_request_count = self.hypertts.get_batch_audio_request_count(self.batch_status, batch_model.voice_selection)
+            return audio_request_count, self.hypertts.estimate_batch(self.batch_status, batch_model.voice_selection)
+        self.hypertts.anki_utils.run_in_background(estimate_batch_task, self.estimate_batch_task_done)
+
+    def estimate_batch_task_done(self, result):
+        with self.hypertts.error_manager.get_single_action_context('Estimating Batch Cost'):
+            audio_request_count, estimate = result.result()
+            self.hypertts.anki_utils.run_on_main(lambda: self.update_audio_request_count(audio_request_count))
+            self.hypertts.anki_utils.run_on_main(lambda: self.update_estimate(estimate))
+
+    def update_estimate(self, estimate):
+        if estimate == None:
+            self.estimate_label.setText('')
+            return
+        self.estimate_label.setText(estimate.get_summary())
 
     def draw(self):
         # populate processed text
@@ -128,6 +283,7 @@ class BatchPreview(component_common.ComponentBase):
         self.table_view.setSelectionMode(aqt.qt.QTableView.SelectionMode.SingleSelection)
         self.table_view.setSelectionBehavior(aqt.qt.QTableView.SelectionBehavior.SelectRows)
         self.table_view.selectionModel().selectionChanged.connect(self.selection_changed)
+        self.table_view.verticalScrollBar().valueChanged.connect(self.table_scrolled)
         self.batch_preview_layout.addWidget(self.table_view, stretch=1)
         
         self.error_label = aqt.qt.QLabel()
@@ -142,6 +298,11 @@ class BatchPreview(component_common.ComponentBase):
 
         # populate the "notRunning" stack
         notRunningLayout = aqt.qt.QVBoxLayout()
+        hlayout = aqt.qt.QHBoxLayout()
+        hlayout.addWidget(self.audio_request_count_label, stretch=1)
+        hlayout.addWidget(self.estimate_button)
+        notRunningLayout.addLayout(hlayout)
+        notRunningLayout.addWidget(self.estimate_label)
         self.batchNotRunningStack.setLayout(notRunningLayout)
 
         # poulate the "running" stack
@@ -169,6 +330,7 @@ class BatchPreview(component_common.ComponentBase):
 
         # wire events
         self.stop_button.pressed.connect(self.stop_button_pressed)
+        self.estimate_button.pressed.connect(self.estimate_button_pressed)
 
         return self.batch_preview_layout
 
@@ -182,8 +344,14 @@ class BatchPreview(component_common.ComponentBase):
     def show_completed_stack(self):
         self.stack.setCurrentIndex(2)
 
+    def table_scrolled(self, value):
+        self.request_visible_rows()
+
     def selection_changed(self):
         logger.info('selection_changed')
+        row_indices = self.table_view.selectionModel().selectedIndexes()
+        if len(row_indices) >= 1:
+            self.request_rows([row_indices[0].row()])
         self.report_sample_text()
         self.update_error_label_for_selected()
 
@@ -209,18 +377,24 @@ class BatchPreview(component_common.ComponentBase):
             return self.batch_status[self.selected_row]
         return None
 
-    def apply_audio_to_notes(self):
+    def apply_audio_to_notes(self, resume=False):
         self.apply_to_notes_batch_started = True
+        # the batch computes the text of every note, the preview doesn't need to anymore
+        self.generation += 1
+        self.rows_requested = bytearray(b'\x01') * len(self.note_id_list)
+        self.resume_batch = resume
         self.hypertts.anki_utils.run_in_background_collection_op(self.dialog, self.apply_audio_fn, self.finished_apply_audio_fn)
 
     def stop_button_pressed(self):
         self.batch_status.stop()
 
     def apply_audio_fn(self, anki_collection):
-        self.hypertts.process_batch_audio(self.note_id_list, self.batch_model, self.batch_status, anki_collection)
+        self.hypertts.process_batch_audio(self.note_id_list, self.batch_model, self.batch_status, anki_collection, resume=self.resume_batch)
 
     def finished_apply_audio_fn(self, result):
         logger.debug(f'finished_apply_audio_fn, result: {result}')
+        # the batch may have pushed the audio cache above its size limit
+        self.hypertts.start_audio_cache_eviction()
 
     def batch_start(self):
         self.hypertts.anki_utils.run_on_main(self.show_running_stack)
@@ -233,6 +407,13 @@ class BatchPreview(component_common.ComponentBase):
             self.hypertts.anki_utils.run_on_main(self.show_not_running_stack)
         if self.apply_to_notes_batch_started:
             self.batch_end_fn(completed)
+            if not completed:
+                # the journal of this run allows resuming it
+                self.report_interrupted_batch(self.hypertts.get_interrupted_batch_journal(self.note_id_list, self.batch_model))
+        if self.reload_after_batch_end:
+            # the batch isn't running anymore, the statuses can be reset
+            self.reload_after_batch_end = False
+            self.hypertts.anki_utils.run_on_main(self.reload_model)
 
     def update_progress_bar(self, row, total_count, start_time, current_time):
         self.progress_bar.setValue(row + 1)
@@ -259,20 +440,24 @@ class BatchPreview(component_common.ComponentBase):
         self.progress_details.setText(status_text)
 
 
-    def table_viewport_repaint_refresh_timer(self):
+    def schedule_progress_flush(self):
         # needs to be called on main thread
-        self.hypertts.anki_utils.call_on_timer_expire(self.table_repaint_timer, self.table_viewport_repaint)        
-
-    def table_viewport_repaint(self):
-        if self.table_view != None:
-            # logger.info('table_viewport_repaint')
-            self.table_view.viewport().repaint()
+        self.hypertts.anki_utils.call_on_timer_expire(self.progress_flush_timer, self.flush_progress)
+
+    def flush_progress(self):
+        dirty_rows, latest_progress = self.progress_channel.take_changes()
+        if len(dirty_rows) == 0:
+            return
+        self.batch_preview_table_model.notifyChange(min(dirty_rows), max(dirty_rows))
+        row, total_count, start_time, current_time = latest_progress
+        if start_time != None:
+            # only batches applying audio report progress
+            self.update_progress_bar(row, total_count, start_time, current_time)
+        if self.selected_row in dirty_rows:
+            self.update_error_label_for_selected()
+            self.report_sample_text()
 
     def batch_change(self, note_id, row, total_count, start_time, current_time):
         # logger.info(f'change_listener row {row}')
-        self.hypertts.anki_utils.run_on_main(lambda: self.batch_preview_table_model.notifyChange(row))
-        self.hypertts.anki_utils.run_on_main(lambda: self.update_progress_bar(row, total_count, start_time, current_time))
-        self.hypertts.anki_utils.run_on_main(lambda: self.table_viewport_repaint_refresh_timer())
-        if row == self.selected_row:
-            self.hypertts.anki_utils.run_on_main(self.update_error_label_for_selected)
-            self.hypertts.anki_utils.run_on_main(self.report_sample_text)
\ No newline at end of file
+        if self.progress_channel.add_change(row, (row, total_count, start_time, current_time)):
+            self.hypertts.anki_utils.run_on_main(self.schedule_progress_flush)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import sys
+import aqt.qt
+
+from . import component_common
+from . import config_models
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class BatchProcessing(component_common.ConfigComponentBase):
+
+    def __init__(self, hypertts, dialog, model_change_callback):
+        self.hypertts = hypertts
+        self.dialog = dialog
+        self.model = config_models.BatchProcessing()
+        self.model_change_callback = model_change_callback
+        self.propagate_model_change = True
+
+        self.note_update_chunk_size = aqt.qt.QSpinBox()
+        self.note_update_chunk_size.setMinimum(1)
+        self.note_update_chunk_size.setMaximum(constants.BATCH_NOTE_UPDATE_CHUNK_SIZE_MAX)
+
+        self.prepare_queue_depth = aqt.qt.QSpinBox()
+        self.prepare_queue_depth.setMinimum(1)
+        self.prepare_queue_depth.setMaximum(constants.BATCH_PREPARE_QUEUE_DEPTH_MAX)
+
+        self.pending_requests_per_worker = aqt.qt.QSpinBox()
+        self.pending_requests_per_worker.setMinimum(1)
+        self.pending_requests_per_worker.setMaximum(constants.BATCH_PENDING_REQUESTS_PER_WORKER_MAX)
+
+    def get_model(self):
+        return self.model
+
+    def load_model(self, model):
+        self.model = model
+        self.propagate_model_change = False
+        self.note_update_chunk_size.setValue(self.model.note_update_chunk_size)
+        self.prepare_queue_depth.setValue(self.model.prepare_queue_depth)
+        self.pending_requests_per_worker.setValue(self.model.pending_requests_per_worker)
+        self.propagate_model_change = True
+
+    def notify_model_update(self):
+        if self.propagate_model_change == True:
+            self.model_change_callback(self.model)
+
+    def draw(self):
+        layout_widget = aqt.qt.QWidget()
+        layout = aqt.qt.QVBoxLayout(layout_widget)
+
+        # note updates
+        # ============
+
+        groupbox = aqt.qt.QGroupBox('Note Updates')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        note_update_chunk_size_label = aqt.qt.QLabel(constants.GUI_TEXT_BATCH_PROCESSING_NOTE_UPDATE_CHUNK_SIZE)
+        note_update_chunk_size_label.setWordWrap(True)
+        vlayout.addWidget(note_update_chunk_size_label)
+        vlayout.addWidget(self.note_update_chunk_size)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        # pipeline queues
+        # ===============
+
+        groupbox = aqt.qt.QGroupBox('Queue Depths')
+        vlayout = aqt.qt.QVBoxLayout()
+
+        prepare_queue_depth_label = aqt.qt.QLabel(constants.GUI_TEXT_BATCH_PROCESSING_PREPARE_QUEUE_DEPTH)
+        prepare_queue_depth_label.setWordWrap(True)
+        vlayout.addWidget(prepare_queue_depth_label)
+        vlayout.addWidget(self.prepare_queue_depth)
+
+        pending_requests_per_worker_label = aqt.qt.QLabel(constants.GUI_TEXT_BATCH_PROCESSING_PENDING_REQUESTS_PER_WORKER)
+        pending_requests_per_worker_label.setWordWrap(True)
+        vlayout.addWidget(pending_requests_per_worker_label)
+        vlayout.addWidget(self.pending_requests_per_worker)
+
+        groupbox.setLayout(vlayout)
+        layout.addWidget(groupbox)
+
+        layout.addStretch()
+
+        # wire events
+        self.note_update_chunk_size.valueChanged.connect(self.note_update_chunk_size_changed)
+        self.prepare_queue_depth.valueChanged.connect(self.prepare_queue_depth_changed)
+        self.pending_requests_per_worker.valueChanged.connect(self.pending_requests_per_worker_changed)
+
+        return layout_widget
+
+    def note_update_chunk_size_changed(self, value):
+        logger.info(f'note_update_chunk_size_changed {value}')
+        self.model.note_update_chunk_size = value
+        self.notify_model_update()
+
+    def prepare_queue_depth_changed(self, value):
+        logger.info(f'prepare_queue_depth_changed {value}')
+        self.model.prepare_queue_depth = value
+        self.notify_model_update()
+
+    def pending_requests_per_worker_changed(self, value):
+        logger.info(f'pending_requests_per_worker_changed {value}')
+        self.model.pending_requests_per_worker = value
+        self.notify_model_update()
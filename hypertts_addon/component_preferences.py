@@ -4,6 +4,8 @@ import aqt.qt
 from . import component_common
 from . import component_shortcuts
 from . import component_errorhandling
+from . import component_batch_processing
+from . import component_audio_cache
 from . import config_models
 from . import constants
 from . import errors
@@ -18,6 +20,8 @@ class ComponentPreferences(component_common.ConfigComponentBase):
         self.model = config_models.Preferences()
         self.shortcuts = component_shortcuts.Shortcuts(self.hypertts, self.dialog, self.shortcuts_updated)
         self.error_handling = component_errorhandling.ErrorHandling(self.hypertts, self.dialog, self.error_handling_updated)
+        self.batch_processing = component_batch_processing.BatchProcessing(self.hypertts, self.dialog, self.batch_processing_updated)
+        self.audio_cache = component_audio_cache.AudioCache(self.hypertts, self.dialog, self.audio_cache_updated)
 
         self.save_button = aqt.qt.QPushButton('Apply')   
         self.cancel_button = aqt.qt.QPushButton('Cancel')        
@@ -27,6 +31,8 @@ class ComponentPreferences(component_common.ConfigComponentBase):
         self.model = model
         self.shortcuts.load_model(self.model.keyboard_shortcuts)
         self.error_handling.load_model(self.model.error_handling)
+        self.batch_processing.load_model(self.model.batch_processing)
+        self.audio_cache.load_model(self.model.audio_cache)
 
     def get_model(self):
         return self.model
@@ -39,6 +45,14 @@ class ComponentPreferences(component_common.ConfigComponentBase):
         self.model.error_handling = model
         self.model_part_updated_common()
 
+    def batch_processing_updated(self, model):
+        self.model.batch_processing = model
+        self.model_part_updated_common()
+
+    def audio_cache_updated(self, model):
+        self.model.audio_cache = model
+        self.model_part_updated_common()
+
     def model_part_updated_common(self):
         self.save_button.setEnabled(True)
         self.save_button.setStyleSheet(self.hypertts.anki_utils.get_green_stylesheet())        
@@ -63,6 +77,8 @@ class ComponentPreferences(component_common.ConfigComponentBase):
         self.tabs = aqt.qt.QTabWidget()
         self.tabs.addTab(self.shortcuts.draw(), 'Keyboard Shortcuts')
         self.tabs.addTab(self.error_handling.draw(), 'Error Handling')
+        self.tabs.addTab(self.batch_processing.draw(), 'Batch Processing')
+        self.tabs.addTab(self.audio_cache.draw(), 'Audio Cache')
         layout.addWidget(self.tabs)
 
         # setup bottom buttons
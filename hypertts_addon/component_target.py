@@ -30,6 +30,7 @@ class BatchTarget(component_common.ConfigComponentBase):
         self.radio_button_sound_only.setChecked(not self.batch_target_model.text_and_sound_tag)
         self.radio_button_remove_sound.setChecked(self.batch_target_model.remove_sound_tag)
         self.radio_button_keep_sound.setChecked(not self.batch_target_model.remove_sound_tag)
+        self.skip_up_to_date_checkbox.setChecked(self.batch_target_model.skip_up_to_date)
 
         # ensure model at the higher level gets updated
         # this is important for example if the target field doesn't exist in the field list, we want to make
@@ -92,6 +93,18 @@ class BatchTarget(component_common.ConfigComponentBase):
         groupbox.setLayout(vlayout)
         self.batch_target_layout.addWidget(groupbox)                
 
+        # skip notes which are up to date
+        # ==============================
+        groupbox = aqt.qt.QGroupBox('Notes Already Processed')
+        vlayout = aqt.qt.QVBoxLayout()
+        label = aqt.qt.QLabel(constants.GUI_TEXT_TARGET_SKIP_UP_TO_DATE)
+        label.setWordWrap(True)
+        vlayout.addWidget(label)
+        self.skip_up_to_date_checkbox = aqt.qt.QCheckBox('Only add audio to notes which are missing it or outdated')
+        vlayout.addWidget(self.skip_up_to_date_checkbox)
+        groupbox.setLayout(vlayout)
+        self.batch_target_layout.addWidget(groupbox)
+
         self.batch_target_layout.addStretch()
 
         # connect events
@@ -101,6 +114,7 @@ class BatchTarget(component_common.ConfigComponentBase):
         self.radio_button_text_sound.toggled.connect(self.update_text_sound)
         self.radio_button_remove_sound.toggled.connect(self.update_remove_sound)
         self.radio_button_keep_sound.toggled.connect(self.update_remove_sound)
+        self.skip_up_to_date_checkbox.stateChanged.connect(self.update_skip_up_to_date)
 
         # select default to trigger model update
         self.update_field()
@@ -116,6 +130,10 @@ class BatchTarget(component_common.ConfigComponentBase):
         self.batch_target_model.remove_sound_tag = self.radio_button_remove_sound.isChecked()
         self.notify_model_update()
 
+    def update_skip_up_to_date(self):
+        self.batch_target_model.skip_up_to_date = self.skip_up_to_date_checkbox.isChecked()
+        self.notify_model_update()
+
     def update_field(self):
         logger.info('update_field')
         self.batch_target_model.target_field = self.field_list[self.target_field_combobox.currentIndex()]
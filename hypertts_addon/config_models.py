@@ -119,16 +119,19 @@ def deserialize_batchsource(batch_source_config):
 
 
 class BatchTarget(ConfigModelBase):
-    def __init__(self, target_field, text_and_sound_tag, remove_sound_tag):
+    def __init__(self, target_field, text_and_sound_tag, remove_sound_tag, skip_up_to_date=False):
         self.target_field = target_field
         self.text_and_sound_tag = text_and_sound_tag
         self.remove_sound_tag = remove_sound_tag
+        # only add audio to notes which are missing it, or whose audio is outdated
+        self.skip_up_to_date = skip_up_to_date
 
     def serialize(self):
         return {
             'target_field': self.target_field,
             'text_and_sound_tag': self.text_and_sound_tag,
-            'remove_sound_tag': self.remove_sound_tag
+            'remove_sound_tag': self.remove_sound_tag,
+            'skip_up_to_date': self.skip_up_to_date
         }
 
     def validate(self):
@@ -544,10 +547,29 @@ class KeyboardShortcuts:
 class ErrorHandling:
     realtime_tts_errors_dialog_type: constants.ErrorDialogType = constants.ErrorDialogType.Dialog
 
+@dataclass
+class BatchProcessing:
+    # number of modified notes written to the collection at once
+    note_update_chunk_size: int = constants.BATCH_NOTE_UPDATE_CHUNK_SIZE_DEFAULT
+    # depths of the queues between the batch pipeline stages
+    prepare_queue_depth: int = constants.BATCH_PREPARE_QUEUE_DEPTH_DEFAULT
+    pending_requests_per_worker: int = constants.BATCH_PENDING_REQUESTS_PER_WORKER_DEFAULT
+
+@dataclass
+class AudioCache:
+    # least recently used audio files get evicted above this size, 0 means no limit
+    max_size_mb: int = constants.AUDIO_CACHE_MAX_SIZE_MB_DEFAULT
+    # requests which got identical audio share the same file
+    deduplicate_audio: bool = False
+    # words a dictionary service doesn't have aren't requested again for this many days, 0 disables
+    missing_audio_ttl_days: int = constants.AUDIO_CACHE_MISSING_AUDIO_TTL_DAYS_DEFAULT
+
 @dataclass
 class Preferences:
     keyboard_shortcuts: KeyboardShortcuts = field(default_factory=KeyboardShortcuts)
     error_handling: ErrorHandling = field(default_factory=ErrorHandling)
+    batch_processing: BatchProcessing = field(default_factory=BatchProcessing)
+    audio_cache: AudioCache = field(default_factory=AudioCache)
 
 def serialize_preferences(preferences):
     return databind.json.dump(preferences, Preferences)
@@ -9,10 +9,72 @@ LOGGER_NAME_TEST = 'test_hypertts'
 
 # requests related constants
 RequestTimeout = 20 # 20 seconds max
+# connections kept alive per host, at least this many, more when the batch concurrency is higher
+HTTP_POOL_MAXSIZE_MIN = 4
+# audio streamed from the response to the audio file in chunks of this size
+AUDIO_STREAM_CHUNK_SIZE = 64 * 1024
+# pages of dictionary websites (cambridge, oxford) are shared by the voices of each accent for a few minutes
+DICTIONARY_PAGE_CACHE_TTL_SECONDS = 300
+DICTIONARY_PAGE_CACHE_MAX_ENTRIES = 256
+# access tokens of the services which use them get refreshed in the background when they expire within this window
+TOKEN_REFRESH_WINDOW_SECONDS = 300
+# and aren't used anymore when they expire within this margin
+TOKEN_EXPIRY_MARGIN_SECONDS = 30
 
 CLOUDLANGUAGETOOLS_API_BASE_URL = 'https://cloudlanguagetools-api.vocab.ai'
 VOCABAI_API_BASE_URL = 'https://app.vocab.ai/languagetools-api/v2'
 
+# retrying transient request failures (rate limiting, server errors, connection errors)
+RETRY_MAX_ATTEMPTS_BATCH = 4
+RETRY_MAX_ATTEMPTS_INTERACTIVE = 2 # user is waiting on the result (preview, realtime, editor)
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 30.0
+# stop sending requests to a service which keeps failing
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_SECONDS = 60.0
+
+# batch processing
+# number of audio requests a batch keeps in flight when going through cloudlanguagetools
+CLOUDLANGUAGETOOLS_BATCH_CONCURRENCY = 4
+# notes read and processed ahead of the audio requests (configurable in preferences)
+BATCH_PREPARE_QUEUE_DEPTH_DEFAULT = 50
+BATCH_PREPARE_QUEUE_DEPTH_MAX = 10000
+# audio requests submitted ahead of the note currently being written, per worker (configurable in preferences)
+BATCH_PENDING_REQUESTS_PER_WORKER_DEFAULT = 2
+BATCH_PENDING_REQUESTS_PER_WORKER_MAX = 100
+# queue depths get logged every N notes
+BATCH_PIPELINE_LOG_INTERVAL = 100
+# modified notes are written to the collection in chunks (configurable in preferences)
+BATCH_NOTE_UPDATE_CHUNK_SIZE_DEFAULT = 200
+BATCH_NOTE_UPDATE_CHUNK_SIZE_MAX = 10000
+# batch estimates use the average latency of the most recent requests to each service
+LATENCY_SAMPLE_COUNT = 50
+# latency assumed for services which haven't been used yet
+BATCH_ESTIMATE_DEFAULT_LATENCY_SECONDS = 1.0
+# changes to the batch preview table and progress bar are applied at most this often
+BATCH_PROGRESS_FLUSH_INTERVAL_MS = 50
+# the batch preview computes text for the rows displayed, plus this many rows below
+BATCH_PREVIEW_PREFETCH_ROWS = 50
+# rows requested by the preview get computed together after this delay
+BATCH_PREVIEW_POPULATE_DELAY_MS = 20
+# the batch journal is flushed after every note, and synced to disk every N notes
+BATCH_JOURNAL_SYNC_INTERVAL = 50
+# journals of interrupted batches which never got resumed
+BATCH_JOURNAL_MAX_AGE_DAYS = 30
+
+# size cap of the generated audio files in user_files, 0 means no limit
+AUDIO_CACHE_MAX_SIZE_MB_DEFAULT = 0
+AUDIO_CACHE_MAX_SIZE_MB_MAX = 1000000
+# audio not found by a service is remembered, so that the request isn't sent again, 0 disables
+AUDIO_CACHE_MISSING_AUDIO_TTL_DAYS_DEFAULT = 30
+AUDIO_CACHE_MISSING_AUDIO_TTL_DAYS_MAX = 3650
+# upper bounds (in seconds) of the audio request duration histogram
+AUDIO_STATISTICS_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+# in memory cache of the audio files played by realtime tts tags
+REALTIME_HOT_AUDIO_CACHE_MAX_BYTES = 4 * 1024 * 1024
+# files played from the in memory cache get their last use recorded in the cache index at most this often
+REALTIME_HOT_AUDIO_CACHE_MARK_USED_SECONDS = 300
+
 class ServiceType(enum.Enum):
     dictionary = ("Dictionary, contains recordings of words.")
     tts = ("Text To Speech, can generate audio for full sentences.")
@@ -56,6 +118,8 @@ class BatchNoteStatus(enum.Enum):
     Done = enum.auto()
     Error = enum.auto()
     OK = enum.auto()
+    # the note already has the right sound tag
+    Skipped = enum.auto()
 
 class TextReplacementRuleType(enum.Enum):
     Simple = enum.auto()
@@ -79,6 +143,11 @@ class MappingRuleType(enum.Enum):
 
 DIR_HYPERTTS_ADDON = 'hypertts_addon'
 DIR_SERVICES = 'services'
+DIR_BATCH_JOURNAL = 'batch_journal' # inside user_files
+AUDIO_CACHE_INDEX_FILENAME = 'audio_cache_index.sqlite3' # inside user_files
+# audio being written, renamed once complete. doesn't start with hypertts- so that it never gets indexed
+AUDIO_TEMP_FILE_PREFIX = 'tmp-hypertts-'
+AUDIO_TEMP_FILE_MAX_AGE_SECONDS = 3600 # older temp files were left behind by an interrupted request
 
 ANKIWEB_ADDON_ID = '111623432'
 
@@ -185,6 +254,8 @@ GUI_TEXT_TARGET_FIELD = """Sound tags will be inserted in this field"""
 GUI_TEXT_TARGET_TEXT_AND_SOUND = """Should the target field only contain the sound tag, or should
 it contain both text and sound tag."""
 GUI_TEXT_TARGET_REMOVE_SOUND_TAG = """If the target field already contains a sound tag, should it get  removed?"""
+GUI_TEXT_TARGET_SKIP_UP_TO_DATE = """When running this preset again, skip the notes whose target field already contains """\
+"""the sound tag for their current text and voice settings. Only new or modified notes get audio."""
 
 GUI_TEXT_BATCH_COMPLETED = """<b>Finished adding Audio to notes</b>. You can undo this operation in menu Edit, 
 Undo HyperTTS: Add Audio to Notes. You may close this dialog.
@@ -211,6 +282,8 @@ GUI_TEXT_HYPERTTS_PRO_TRIAL_ENTER_EMAIL = """Enter your email to get trial acces
 GUI_TEXT_REALTIME_SINGLE_NOTE = """Please select a single note to add Realtime Audio"""
 GUI_TEXT_REALTIME_CHOOSE_TEMPLATE = """Choose card template"""
 GUI_TEXT_REALTIME_REMOVED_TAG = """Removed TTS Tag. Realtime audio will not play anymore."""
+GUI_TEXT_REALTIME_WARM_CACHE_STARTED = """Generating Realtime audio for the selected notes..."""
+GUI_TEXT_REALTIME_WARM_CACHE_NO_TAG = """None of the selected notes have Realtime audio."""
 
 GUI_TEXT_SHORTCUTS_ANKI_RESTART = """Note: You'll need to restart Anki after modifying these shortcuts."""
 
@@ -219,6 +292,18 @@ GUI_TEXT_SHORTCUTS_EDITOR_PREVIEW_AUDIO = """Preview Audio for a note using the
 
 GUI_TEXT_ERROR_HANDLING_REALTIME_TTS = """How to display errors during Realtime TTS"""
 
+GUI_TEXT_BATCH_PROCESSING_NOTE_UPDATE_CHUNK_SIZE = """Number of notes written to the collection at once when adding audio in batch. """\
+"""Larger values are faster on big collections, smaller values lose less work if Anki gets interrupted."""
+GUI_TEXT_BATCH_PROCESSING_PREPARE_QUEUE_DEPTH = """Number of notes read and prepared ahead of the audio requests."""
+GUI_TEXT_BATCH_PROCESSING_PENDING_REQUESTS_PER_WORKER = """Number of audio requests queued ahead of the note being written, """\
+"""for each concurrent request allowed by the service."""
+GUI_TEXT_AUDIO_CACHE_MAX_SIZE = """Maximum size of the audio files kept in the HyperTTS cache (in user_files). """\
+"""The least recently used files get removed after a batch, files used by notes in the collection are never removed."""
+GUI_TEXT_AUDIO_CACHE_DEDUPLICATE = """Dictionary services often return the exact same audio for different requests. """\
+"""When enabled, such audio is stored once and all the notes use the same file, which saves space in the collection media."""
+GUI_TEXT_AUDIO_CACHE_MISSING_AUDIO_TTL = """Dictionary services (Forvo, Cambridge, Oxford...) don't have audio for every word. """\
+"""Words which weren't found aren't requested again from the same voice during this number of days."""
+
 GRAPHICS_PRO_BANNER = 'hypertts_pro_banner.png'
 GRAPHICS_LITE_BANNER = 'hypertts_lite_banner.png'
 GRAPHICS_SERVICE_COMPATIBLE = 'hypertts_service_compatible_banner.png'
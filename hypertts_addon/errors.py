@@ -45,6 +45,11 @@ class TextReplacementError(HyperTTSError):
         message = f'Could not process text replacement (pattern: {pattern}, replacement: {replacement}, text: {text}): {error_msg}'
         super().__init__(message)
 
+class NoteUpdateError(HyperTTSError):
+    def __init__(self, exception):
+        message = f'Could not write the note to the collection: {exception}'
+        super().__init__(message)
+
 class AudioNotFoundError(HyperTTSError):
     def __init__(self, source_text, voice):
         message = f'Audio not found for [{source_text}] (voice: {voice})'
@@ -88,12 +93,25 @@ class MissingDirectory(HyperTTSError):
 
 
 class RequestError(HyperTTSError):
-    def __init__(self, source_text, voice, error_message):
+    def __init__(self, source_text, voice, error_message, response=None):
         message = f'Could not request audio for [{source_text}]: {error_message} (voice: {voice})'
         super().__init__(message)
         self.source_text = source_text
         self.voice = voice
         self.error_message = error_message
+        # when the error comes from an HTTP response, keep what's needed to decide whether to retry
+        self.status_code = None
+        self.retry_after = None
+        if response != None:
+            self.status_code = response.status_code
+            self.retry_after = response.headers.get('Retry-After', None)
+
+class ServiceUnavailable(HyperTTSError):
+    def __init__(self, service_name, failure_count, retry_in_seconds):
+        message = f'{service_name} failed {failure_count} times in a row, ' \
+            f'requests to this service are paused for {retry_in_seconds:.0f} seconds'
+        super().__init__(message)
+        self.service_name = service_name
 
 class NoVoiceSelected(HyperTTSError):
     def __init__(self):
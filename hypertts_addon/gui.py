@@ -1,5 +1,6 @@
 import sys
 import json
+import threading
 
 # pyqt
 import aqt.qt
@@ -140,6 +141,35 @@ def remove_realtime_tts_tag(hypertts, browser, note_id_list):
         hypertts.remove_tts_tags(note, card_ord)
         hypertts.anki_utils.info_message(constants.GUI_TEXT_REALTIME_REMOVED_TAG, browser)
 
+def warm_realtime_audio_cache(hypertts, note_id_list):
+    # the audio gets generated ahead of the reviews, so that they don't wait for the network.
+    # the notes are loaded and rendered here on the main thread, only the texts go to the background
+    realtime_request_list = hypertts.get_realtime_audio_requests(note_id_list)
+    if len(realtime_request_list) == 0:
+        hypertts.anki_utils.tooltip_message(constants.GUI_TEXT_REALTIME_WARM_CACHE_NO_TAG)
+        return
+    request_count = len(realtime_request_list)
+    cancel_event = threading.Event()
+    def update_progress(completed_count):
+        # runs on the main thread
+        hypertts.anki_utils.update_progress_bar(f'Generating Realtime Audio {completed_count} / {request_count}', completed_count, request_count)
+        if hypertts.anki_utils.progress_bar_want_cancel():
+            cancel_event.set()
+    def progress_fn(completed_count, request_count):
+        hypertts.anki_utils.run_on_main(lambda: update_progress(completed_count))
+    def warm_realtime_audio_cache_task():
+        return hypertts.warm_realtime_audio_cache(realtime_request_list, progress_fn, cancel_event)
+    def warm_realtime_audio_cache_task_done(result):
+        hypertts.anki_utils.stop_progress_bar()
+        with hypertts.error_manager.get_single_action_context('Generating Realtime Audio'):
+            completed_count, error_count = result.result()
+            message = f'Realtime audio ready for {completed_count - error_count} / {request_count} texts, {error_count} errors'
+            if cancel_event.is_set():
+                message = f'Cancelled. {message}'
+            hypertts.anki_utils.tooltip_message(message)
+    hypertts.anki_utils.show_progress_bar(constants.GUI_TEXT_REALTIME_WARM_CACHE_STARTED)
+    hypertts.anki_utils.run_in_background(warm_realtime_audio_cache_task, warm_realtime_audio_cache_task_done)
+
 
 def init(hypertts):
 
@@ -167,6 +197,12 @@ def init(hypertts):
                     launch_realtime_dialog_browser(hypertts, browser.selectedNotes())
             return launch
 
+        def get_warm_realtime_audio_cache_fn(hypertts, browser):
+            def launch():
+                with hypertts.error_manager.get_single_action_context('Generating Realtime Audio'):
+                    warm_realtime_audio_cache(hypertts, browser.selectedNotes())
+            return launch
+
         def get_remove_realtime_tts_tag_fn(hypertts, browser):
             def launch():
                 with hypertts.error_manager.get_single_action_context('Removing Realtime TTS'):
@@ -192,6 +228,10 @@ def init(hypertts):
         action.triggered.connect(get_launch_realtime_dialog_browser_fn(hypertts, browser))
         menu.addAction(action)
 
+        action = aqt.qt.QAction(f'Generate Audio (Realtime) for Selected Notes', browser)
+        action.triggered.connect(get_warm_realtime_audio_cache_fn(hypertts, browser))
+        menu.addAction(action)
+
         action = aqt.qt.QAction(f'Remove Audio (Realtime) / TTS Tag...', browser)
         action.triggered.connect(get_remove_realtime_tts_tag_fn(hypertts, browser))
         menu.addAction(action)
@@ -263,5 +303,11 @@ def init(hypertts):
     # editor buttons
     aqt.gui_hooks.editor_did_init_buttons.append(setup_editor_buttons)
 
+    # open the audio cache index ahead of the first audio request
+    aqt.gui_hooks.profile_did_open.append(hypertts.start_audio_cache_open)
+
+    # release the access tokens and connections of the profile
+    aqt.gui_hooks.profile_will_close.append(hypertts.service_manager.shutdown)
+
     # register TTS player
     aqt.sound.av_player.players.append(ttsplayer.AnkiHyperTTSPlayer(aqt.mw.taskman, hypertts))
\ No newline at end of file
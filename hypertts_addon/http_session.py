@@ -0,0 +1,77 @@
+"""
+pooled http sessions used by the services: one requests.Session per service and host, so that the connections
+(and their TLS handshake) are kept alive and reused from one audio request to the next, instead of
+being opened again for every note. services don't share sessions, so that the cookies set for one
+service are never sent along with the requests of another.
+"""
+
+import threading
+import urllib.parse
+import requests
+import requests.adapters
+
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class HttpSessionManager():
+    def __init__(self):
+        # (session name, host) -> requests.Session
+        self.sessions = {}
+        # (session name, host) -> connection pool size of the session
+        self.pool_sizes = {}
+        self.lock = threading.Lock()
+
+    def get_host(self, url):
+        parsed_url = urllib.parse.urlsplit(url)
+        return f'{parsed_url.scheme}://{parsed_url.netloc}'
+
+    def get_session(self, url, pool_maxsize=1, session_name=None) -> requests.Session:
+        # session_name is the name of the service sending the request
+        # the pool must hold a connection for each request the batch has in flight,
+        # plus the realtime / editor requests which can run at the same time
+        pool_maxsize = max(pool_maxsize + 1, constants.HTTP_POOL_MAXSIZE_MIN)
+        host = self.get_host(url)
+        key = (session_name, host)
+        with self.lock:
+            session = self.sessions.get(key, None)
+            if session == None:
+                logger.debug(f'creating http session for {session_name} on {host}, pool size {pool_maxsize}')
+                session = requests.Session()
+                self.sessions[key] = session
+                self.mount_adapter(key, session, pool_maxsize)
+            elif pool_maxsize > self.pool_sizes[key]:
+                logger.debug(f'growing http session pool for {session_name} on {host} to {pool_maxsize}')
+                self.mount_adapter(key, session, pool_maxsize)
+            return session
+
+    def mount_adapter(self, key, session, pool_maxsize):
+        # must hold the lock
+        session_name, host = key
+        previous_adapter = session.adapters.get(host, None)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount(host, adapter)
+        self.pool_sizes[key] = pool_maxsize
+        if previous_adapter != None:
+            # the batch concurrency was raised, the idle connections of the previous pool get closed now,
+            # the ones in use once they're released
+            previous_adapter.close()
+
+    def request(self, method, url, pool_maxsize=1, session_name=None, **kwargs) -> requests.Response:
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = constants.RequestTimeout
+        return self.get_session(url, pool_maxsize, session_name).request(method, url, **kwargs)
+
+    def get(self, url, pool_maxsize=1, session_name=None, **kwargs) -> requests.Response:
+        return self.request('GET', url, pool_maxsize, session_name, **kwargs)
+
+    def post(self, url, pool_maxsize=1, session_name=None, **kwargs) -> requests.Response:
+        return self.request('POST', url, pool_maxsize, session_name, **kwargs)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+            self.pool_sizes = {}
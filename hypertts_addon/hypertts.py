@@ -9,6 +9,9 @@ import copy
 import json
 from typing import List, Dict
 import pprint
+import threading
+import concurrent.futures
+import tempfile
 
 # anki imports
 import aqt
@@ -28,6 +31,11 @@ from . import context
 from . import logging_utils
 from . import gui
 from . import preset_rules_status
+from . import batch_journal
+from . import batch_pipeline
+from . import batch_estimate
+from . import audio_cache
+from . import singleflight
 logger = logging_utils.get_child_logger(__name__)
 
 
@@ -46,35 +54,320 @@ class HyperTTS():
         self.error_manager = errors.ErrorManager(self.anki_utils)
         self.config = self.anki_utils.get_config()
         self.latest_saved_batch_name = None
+        # opened on first use, see get_audio_cache
+        self.audio_cache = None
+        self.audio_cache_lock = threading.Lock()
+        self.audio_single_flight = singleflight.SingleFlight()
+        # realtime tts tag -> audio file, cleared whenever the configuration changes
+        self.realtime_audio_cache = audio_cache.HotAudioCache(constants.REALTIME_HOT_AUDIO_CACHE_MAX_BYTES)
 
         # do maintenance on the configuration
         self.perform_config_migration()
 
 
-    def process_batch_audio(self, note_id_list, batch, batch_status, anki_collection):
-        # for each note, generate audio
-        with batch_status.get_batch_running_action_context():
-
-            modified_notes = []
-
-            for note_id in note_id_list:
-                with batch_status.get_note_action_context(note_id, False) as note_action_context:
-                    note = self.anki_utils.get_note_by_id(note_id)
-                    # process note
-                    source_text, processed_text, sound_file, full_filename = self.process_note_audio(batch, note, False,
-                        context.AudioRequestContext(constants.AudioRequestReason.batch), None, anki_collection)
-                    # update note action context
-                    note_action_context.set_source_text(source_text)
-                    note_action_context.set_processed_text(processed_text)
-                    note_action_context.set_sound(sound_file)
-                    note_action_context.set_status(constants.BatchNoteStatus.Done)                    
-                    
-                    modified_notes.append(note)
+    def process_batch_audio(self, note_id_list, batch, batch_status, anki_collection, resume=False):
+        # notes are read ahead of the audio requests, which are sent concurrently, up to the concurrency allowed
+        # by the services in the voice selection, and notes are updated in order, on the calling (collection) thread
+        concurrency = self.get_batch_concurrency(batch.voice_selection)
+        batch_processing = self.get_preferences().batch_processing
+        prepare_queue_depth = max(1, batch_processing.prepare_queue_depth)
+        pending_requests_per_worker = max(1, batch_processing.pending_requests_per_worker)
+        # modified notes are written to the collection in chunks
+        note_update_chunk_size = max(1, batch_processing.note_update_chunk_size)
+        logger.info(f'processing batch of {len(note_id_list)} notes, concurrency: {concurrency}, '
+            f'prepare queue depth: {prepare_queue_depth}, pending requests per worker: {pending_requests_per_worker}, '
+            f'note update chunk size: {note_update_chunk_size}, resume: {resume}')
+        journal = self.open_batch_journal(note_id_list, batch, resume)
+        completed = False
+        try:
+            with batch_status.get_batch_running_action_context():
+                pipeline = batch_pipeline.BatchPipeline(self, note_id_list, batch, batch_status, anki_collection, journal,
+                    concurrency, prepare_queue_depth, pending_requests_per_worker, note_update_chunk_size)
+                pipeline.run()
                 if batch_status.must_continue == False:
                     logger.info('batch_status execution interrupted')
-                    break
+                completed = batch_status.must_continue
+        finally:
+            journal.close(completed)
+
+    def load_batch_note_request(self, note_id, batch: config_models.BatchConfig):
+        # runs on the collection thread: read the note and its text, errors are reported on the note once its turn comes
+        batch_note_request = batch_pipeline.BatchNoteRequest(note_id)
+        try:
+            batch_note_request.note = self.anki_utils.get_note_by_id(note_id)
+            target_field = batch.target.target_field
+            if target_field not in batch_note_request.note:
+                raise errors.TargetFieldNotFoundError(target_field)
+            batch_note_request.source_text = self.get_source_text(batch_note_request.note, batch.source, None)
+            batch_note_request.target_field_content = batch_note_request.note[target_field]
+        except Exception as e:
+            batch_note_request.error = e
+        return batch_note_request
+
+    def prepare_batch_note_request(self, batch_note_request, batch: config_models.BatchConfig):
+        # runs on the reader thread, only works on the text read from the note
+        if batch_note_request.error != None:
+            return
+        try:
+            batch_note_request.processed_text = self.process_text(batch_note_request.source_text, batch.text_processing)
+            batch_note_request.request_key = self.get_batch_audio_request_key(batch_note_request.processed_text, batch.voice_selection)
+            if batch.target.skip_up_to_date and self.note_audio_up_to_date(batch, batch_note_request.target_field_content, batch_note_request.processed_text):
+                batch_note_request.skipped = True
+        except Exception as e:
+            batch_note_request.error = e
+
+    def submit_batch_note_request(self, executor, batch_note_request, batch: config_models.BatchConfig, audio_requests):
+        # only the audio request goes to the executor
+        if batch_note_request.error != None or batch_note_request.skipped:
+            return
+        request_key = batch_note_request.request_key
+        try:
+            if request_key != None and request_key in audio_requests:
+                # identical audio was already requested for another note in this batch
+                batch_note_request.future = audio_requests[request_key]
+            else:
+                batch_note_request.future = executor.submit(self.get_audio_file, batch_note_request.processed_text,
+                    batch.voice_selection, context.AudioRequestContext(constants.AudioRequestReason.batch))
+                if request_key != None:
+                    audio_requests[request_key] = batch_note_request.future
+        except Exception as e:
+            batch_note_request.error = e
+
+    def complete_batch_note_request(self, batch_note_request, batch: config_models.BatchConfig, batch_status, note_updates, journal):
+        if batch_note_request.skipped:
+            # up to date, neither the cache nor the collection get touched
+            with batch_status.get_note_action_context(batch_note_request.note_id, False) as note_action_context:
+                note_action_context.set_source_text(batch_note_request.source_text)
+                note_action_context.set_processed_text(batch_note_request.processed_text)
+                note_action_context.set_status(constants.BatchNoteStatus.Skipped)
+            return
+        with batch_status.get_note_action_context(batch_note_request.note_id, False) as note_action_context:
+            full_filename, audio_filename = batch_note_request.result()
+            sound_file = self.set_note_sound_tag(batch, batch_note_request.note, full_filename, audio_filename)
+            # update note action context
+            note_action_context.set_source_text(batch_note_request.source_text)
+            note_action_context.set_processed_text(batch_note_request.processed_text)
+            note_action_context.set_sound(sound_file)
+            note_action_context.set_status(constants.BatchNoteStatus.Done)
+            # journaled once it's written to the collection
+            note_updates.append(batch_note_request)
+            return
+        # the note failed
+        journal.record_note(batch_note_request.note_id, batch_note_request.request_key,
+            batch_status.get_note_status(batch_note_request.note_id).status)
+
+    def flush_batch_note_updates(self, note_updates, batch_status, anki_collection, journal):
+        if len(note_updates) == 0:
+            return
+        logger.debug(f'writing {len(note_updates)} notes to the collection')
+        try:
+            anki_collection.update_notes([batch_note_request.note for batch_note_request in note_updates])
+        except Exception as e:
+            logger.error(f'could not write {len(note_updates)} notes to the collection: {e}')
+            # reported once for the whole chunk
+            if not isinstance(e, errors.HyperTTSError):
+                self.anki_utils.report_unknown_exception_background(e)
+            # none of the notes in this chunk got written, the error shows on each of them
+            note_update_error = errors.NoteUpdateError(e)
+            for batch_note_request in note_updates:
+                batch_status.report_known_error(batch_note_request.note_id, note_update_error)
+        for batch_note_request in note_updates:
+            journal.record_note(batch_note_request.note_id, batch_note_request.request_key,
+                batch_status.get_note_status(batch_note_request.note_id).status)
+        note_updates.clear()
+
+    def get_batch_journal_key(self, note_id_list, batch: config_models.BatchConfig):
+        # the same settings applied to the same notes make up the same batch, regardless of preset name / uuid
+        batch_data = {
+            'source': config_models.serialize_batchsource(batch.source),
+            'target': batch.target.serialize(),
+            'voice_selection': batch.voice_selection.serialize(),
+            'text_processing': batch.text_processing.serialize(),
+            'note_id_list': list(note_id_list)
+        }
+        return hashlib.sha224(json.dumps(batch_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_batch_journal_dir(self):
+        return batch_journal.get_journal_dir(self.anki_utils.get_user_files_dir())
+
+    def open_batch_journal(self, note_id_list, batch: config_models.BatchConfig, resume):
+        journal_dir = self.get_batch_journal_dir()
+        batch_key = self.get_batch_journal_key(note_id_list, batch)
+        journal = None
+        if resume:
+            journal = batch_journal.find_interrupted_journal(journal_dir, batch_key)
+            if journal != None:
+                logger.info(f'resuming batch {journal.batch_uuid}, {len(journal.completed_note_ids)} notes already completed')
+        if journal == None:
+            batch_journal.remove_journals(journal_dir, batch_key)
+            journal = batch_journal.BatchJournal(journal_dir, self.anki_utils.get_uuid(), batch_key, len(note_id_list))
+        journal.open()
+        return journal
+
+    def get_interrupted_batch_journal(self, note_id_list, batch: config_models.BatchConfig):
+        # returns the journal of a previous, interrupted run of this batch, if any
+        journal_dir = self.get_batch_journal_dir()
+        batch_journal.remove_expired_journals(journal_dir)
+        return batch_journal.find_interrupted_journal(journal_dir, self.get_batch_journal_key(note_id_list, batch))
+
+    def get_batch_audio_request_key(self, processed_text, voice_selection):
+        # notes which are guaranteed to get the same audio share the same key, in random mode
+        # each note may get a different voice, so the audio can't be shared (returns None)
+        if voice_selection.selection_mode == constants.VoiceSelectionMode.single:
+            voice_with_options = voice_selection.voice
+        elif voice_selection.selection_mode == constants.VoiceSelectionMode.priority and len(voice_selection.voice_list) > 0:
+            # the voice list is the same for the whole batch, so the first voice identifies the request
+            voice_with_options = voice_selection.voice_list[0]
+        else:
+            return None
+        if voice_with_options == None:
+            return None
+        return self.get_hash_for_audio_request(processed_text, voice_with_options.voice_id, voice_with_options.options)
+
+    def get_batch_audio_request_count(self, batch_status, voice_selection):
+        # returns the number of notes which need audio, and the number of audio requests
+        # which will actually be sent once identical requests are grouped together
+        note_count = 0
+        request_key_set = set()
+        ungrouped_count = 0
+        for processed_text in batch_status.processed_text_list:
+            if processed_text == None or len(processed_text) == 0:
+                continue
+            note_count += 1
+            request_key = self.get_batch_audio_request_key(processed_text, voice_selection)
+            if request_key == None:
+                ungrouped_count += 1
+            else:
+                request_key_set.add(request_key)
+        return note_count, len(request_key_set) + ungrouped_count
+
+    def estimate_batch(self, batch_status, voice_selection) -> batch_estimate.BatchEstimate:
+        # dry run: uses the processed text populated by populate_batch_status_processed_text, nothing gets requested
+        estimate = batch_estimate.BatchEstimate()
+        cached_hashes = self.get_cached_audio_hashes()
+        voice_share_list = [(voice_with_options, share, self.get_audio_format(voice_with_options.options))
+            for voice_with_options, share in self.get_batch_estimate_voice_shares(voice_selection)]
+        # in random mode each note may get a different voice, so the audio can't be shared between notes
+        share_requests = voice_selection.selection_mode != constants.VoiceSelectionMode.random
+        requested_hashes = set()
+        for processed_text in batch_status.processed_text_list:
+            if processed_text == None or len(processed_text) == 0:
+                estimate.empty_note_count += 1
+                continue
+            estimate.note_count += 1
+            for voice_with_options, share, audio_format in voice_share_list:
+                hash_str = self.get_hash_for_audio_request(processed_text, voice_with_options.voice_id, voice_with_options.options)
+                if share_requests:
+                    if hash_str in requested_hashes:
+                        estimate.shared_request_count += 1
+                        continue
+                    requested_hashes.add(hash_str)
+                service_estimate = estimate.get_service_estimate(voice_with_options.voice_id.service)
+                service_estimate.request_count += share
+                if hash_str in cached_hashes or \
+                    self.get_legacy_hash_for_audio_request(processed_text, voice_with_options.voice_id, voice_with_options.options) in cached_hashes:
+                    service_estimate.cache_hit_count += share
+                else:
+                    service_estimate.character_count += share * len(processed_text)
+        self.estimate_batch_duration(estimate, voice_selection)
+        return estimate
+
+    def get_batch_estimate_voice_shares(self, voice_selection):
+        # returns (voice_with_options, share of the notes which will use this voice)
+        if voice_selection.selection_mode == constants.VoiceSelectionMode.single:
+            voice_list = [(voice_selection.voice, 1.0)] if voice_selection.voice != None else []
+        elif voice_selection.selection_mode == constants.VoiceSelectionMode.priority:
+            # the next voices only get used when the first one doesn't have the audio
+            voice_list = [(voice_selection.voice_list[0], 1.0)] if len(voice_selection.voice_list) > 0 else []
+        else:
+            total_weight = sum([x.random_weight for x in voice_selection.voice_list])
+            voice_list = [(x, x.random_weight / total_weight) for x in voice_selection.voice_list if total_weight > 0]
+        return [(voice_with_options, share) for voice_with_options, share in voice_list
+            if self.service_manager.service_exists(voice_with_options.voice_id.service)]
+
+    def estimate_batch_duration(self, estimate: batch_estimate.BatchEstimate, voice_selection):
+        # requests are sent concurrently, but can't go faster than the service rate limits allow
+        concurrency = self.get_batch_concurrency(voice_selection)
+        for service_estimate in estimate.service_estimates.values():
+            service = self.service_manager.get_service(service_estimate.service_name)
+            service_estimate.latency_seconds = self.service_manager.latency_tracker.get_average_latency(service_estimate.service_name)
+            latency_seconds = service_estimate.latency_seconds
+            if latency_seconds == None:
+                latency_seconds = constants.BATCH_ESTIMATE_DEFAULT_LATENCY_SECONDS
+            sent_request_count = service_estimate.request_count - service_estimate.cache_hit_count
+            duration_list = [sent_request_count * latency_seconds / concurrency]
+            rate_limits = service.get_rate_limits()
+            if rate_limits.requests_per_second > 0:
+                duration_list.append(sent_request_count / rate_limits.requests_per_second)
+            if rate_limits.characters_per_minute > 0:
+                duration_list.append(service_estimate.character_count * 60.0 / rate_limits.characters_per_minute)
+            service_estimate.estimated_seconds = max(duration_list)
+        estimate.estimated_seconds = sum([x.estimated_seconds for x in estimate.service_estimates.values()])
+
+    def get_cached_audio_filenames(self):
+        # a single query on the cache index, so that checking the cache for a large batch stays fast
+        if not os.path.isdir(self.anki_utils.get_user_files_dir()):
+            return set()
+        return self.get_audio_cache().get_filename_set()
+
+    def get_cached_audio_hashes(self):
+        # audio request hashes, several of them may share the same file
+        if not os.path.isdir(self.anki_utils.get_user_files_dir()):
+            return set()
+        return self.get_audio_cache().get_hash_set()
+
+    def note_audio_up_to_date(self, batch: config_models.BatchConfig, target_field_content, processed_text):
+        # the note is up to date if its target field holds the sound tag which the batch would add
+        if len(processed_text) == 0:
+            return False
+        for sound_tag in self.get_expected_sound_tags(processed_text, batch.voice_selection):
+            if sound_tag in target_field_content:
+                return True
+        return False
+
+    def get_expected_sound_tags(self, processed_text, voice_selection):
+        # in priority and random mode, the audio may have come from any of the voices
+        if voice_selection.selection_mode == constants.VoiceSelectionMode.single:
+            voice_list = [voice_selection.voice]
+        else:
+            voice_list = voice_selection.voice_list
+        sound_tag_list = []
+        for voice_with_options in voice_list:
+            if voice_with_options == None:
+                continue
+            audio_format = self.get_audio_format(voice_with_options.options)
+            hash_str = self.get_hash_for_audio_request(processed_text, voice_with_options.voice_id, voice_with_options.options)
+            # notes processed by previous versions refer to the legacy hash
+            for sound_hash_str in [hash_str, self.get_legacy_hash_for_audio_request(processed_text, voice_with_options.voice_id, voice_with_options.options)]:
+                sound_tag_list.append(f'[sound:{self.get_audio_filename(sound_hash_str, audio_format)}]')
+            # the audio may be shared with another request which got identical audio
+            shared_filename = self.get_audio_cache().get_filename(hash_str)
+            if shared_filename != None and shared_filename != self.get_audio_filename(hash_str, audio_format):
+                sound_tag_list.append(f'[sound:{shared_filename}]')
+        return sound_tag_list
+
+    def get_batch_concurrency(self, voice_selection) -> int:
+        # the batch can only go as fast as the most restrictive service in the voice selection
+        if voice_selection.selection_mode == constants.VoiceSelectionMode.single:
+            voice_list = [voice_selection.voice]
+        else:
+            voice_list = voice_selection.voice_list
+        concurrency_list = []
+        for voice_with_options in voice_list:
+            if voice_with_options == None or not self.service_manager.service_exists(voice_with_options.voice_id.service):
+                continue
+            concurrency_list.append(self.service_manager.get_batch_concurrency(voice_with_options.voice_id))
+        if len(concurrency_list) == 0:
+            return 1
+        return max(1, min(concurrency_list))
 
     def process_note_audio(self, batch: config_models.BatchConfig, note, add_mode, audio_request_context, text_override, anki_collection):
+        source_text, processed_text = self.prepare_note_audio(batch, note, text_override)
+        full_filename, audio_filename = self.get_audio_file(processed_text, batch.voice_selection, audio_request_context)
+        sound_file = self.apply_note_audio(batch, note, full_filename, audio_filename, add_mode, anki_collection)
+        return source_text, processed_text, sound_file, full_filename
+
+    def prepare_note_audio(self, batch: config_models.BatchConfig, note, text_override):
         target_field = batch.target.target_field
 
         if target_field not in note:
@@ -82,8 +375,17 @@ class HyperTTS():
 
         source_text = self.get_source_text(note, batch.source, text_override)
         processed_text = self.process_text(source_text, batch.text_processing)
+        return source_text, processed_text
 
-        full_filename, audio_filename = self.get_audio_file(processed_text, batch.voice_selection, audio_request_context)
+    def apply_note_audio(self, batch: config_models.BatchConfig, note, full_filename, audio_filename, add_mode, anki_collection):
+        sound_file = self.set_note_sound_tag(batch, note, full_filename, audio_filename)
+        if not add_mode:
+            anki_collection.update_note(note)
+        return sound_file
+
+    def set_note_sound_tag(self, batch: config_models.BatchConfig, note, full_filename, audio_filename):
+        # modifies the note in memory, the caller is responsible for writing it to the collection
+        target_field = batch.target.target_field
         sound_tag, sound_file = self.get_collection_sound_tag(full_filename, audio_filename)
 
         target_field_content = note[target_field]
@@ -103,10 +405,7 @@ class HyperTTS():
         target_field_content = target_field_content.strip()
 
         note[target_field] = target_field_content
-        if not add_mode:
-            anki_collection.update_note(note)
-
-        return source_text, processed_text, sound_file, full_filename
+        return sound_file
 
     def get_note_audio(self, batch, note, audio_request_context, text_override):
         source_text = self.get_source_text(note, batch.source, text_override)
@@ -382,33 +681,173 @@ class HyperTTS():
 
     def generate_audio_write_file(self, source_text, voice_id: voice_module.TtsVoiceId_v3, voice_options, audio_request_context):
         assert isinstance(voice_id, voice_module.TtsVoiceId_v3), f"Expected voice_id to be TtsVoiceId_v3, got {type(voice_id).__name__}"
-        format = options.AudioFormat.mp3 # default to mp3
-        if options.AUDIO_FORMAT_PARAMETER in voice_options:
-            format = options.AudioFormat[voice_options[options.AUDIO_FORMAT_PARAMETER]]
+        format = self.get_audio_format(voice_options)
 
         # write to user files directory
         hash_str = self.get_hash_for_audio_request(source_text, voice_id, voice_options)
         audio_filename = self.get_audio_filename(hash_str, format)
         full_filename = self.get_full_audio_file_name(hash_str, format)
         logger.info(f'requesting audio for hash {hash_str}, full filename {full_filename}')
-        if not os.path.exists(full_filename) or os.path.getsize(full_filename) == 0:
-
+        # concurrent requests for the same audio (editor, realtime playback, preview, batch) share a single synthesis
+        return self.audio_single_flight.call(hash_str,
+            lambda: self.generate_audio_file_cached(source_text, voice_id, voice_options, audio_request_context,
+                hash_str, format, full_filename, audio_filename))
+
+    def generate_audio_file_cached(self, source_text, voice_id, voice_options, audio_request_context, hash_str, format, full_filename, audio_filename):
+        audio_cache_index = self.get_audio_cache()
+        latency_tracker = self.service_manager.latency_tracker
+        cache_entry = audio_cache_index.lookup(hash_str)
+        if cache_entry != None and (cache_entry.size == 0 or not os.path.exists(os.path.join(os.path.dirname(full_filename), cache_entry.filename))):
+            # the file got removed from user_files (check media, or by hand), or it's empty, the audio gets generated again
+            logger.info(f'file {cache_entry.filename} missing from user_files or empty, removing it from the cache index')
+            audio_cache_index.remove(hash_str)
+            cache_entry = None
+        if cache_entry != None:
+            logger.info(f'file exists in cache')
+            latency_tracker.record_hit(voice_id.service, audio_request_context, cache_entry.size)
+            if cache_entry.filename != audio_filename:
+                # identical audio shared with another request
+                return os.path.join(os.path.dirname(full_filename), cache_entry.filename), cache_entry.filename
+        elif os.path.exists(full_filename) and os.path.getsize(full_filename) > 0:
+            # written outside of the index (for example by another profile sharing user_files)
+            logger.info(f'file exists in cache, adding it to the index')
+            audio_cache_index.add(hash_str, audio_filename, os.path.getsize(full_filename), format.name, voice_id.service)
+            latency_tracker.record_hit(voice_id.service, audio_request_context, os.path.getsize(full_filename))
+        elif self.migrate_legacy_audio_file(source_text, voice_id, voice_options, hash_str, format, full_filename, audio_filename):
+            logger.info(f'file exists in cache under its legacy hash')
+            latency_tracker.record_hit(voice_id.service, audio_request_context, os.path.getsize(full_filename))
+        else:
             # get the voice which corresponds to the voice_id
             voice = self.service_manager.locate_voice(voice_id)
             logger.info(f'located voice: {voice}')
 
-            audio_data = self.service_manager.get_tts_audio(source_text, voice, voice_options, audio_request_context)
+            # dictionary services don't have every word, the words they recently didn't find aren't requested again.
+            # other services report audio not found for requests which may work later
+            missing_audio_ttl_seconds = 0
+            if self.service_manager.get_service(voice_id.service).service_type == constants.ServiceType.dictionary:
+                missing_audio_ttl_seconds = self.get_preferences().audio_cache.missing_audio_ttl_days * 24 * 3600
+            voice_key = json.dumps(voice_id.voice_key, sort_keys=True)
+            if missing_audio_ttl_seconds > 0 and \
+                audio_cache_index.is_missing_audio(voice_id.service, voice_key, source_text, missing_audio_ttl_seconds):
+                logger.info(f'audio not found during a previous request, not requesting again')
+                raise errors.AudioNotFoundError(source_text, voice)
+
             logger.info(f'not found in cache, requesting')
-            logger.debug(f'opening {full_filename}')
-            f = open(full_filename, 'wb')
-            logger.debug(f'done opening {full_filename}')
-            f.write(audio_data)
-            logger.debug(f'wrote audio data')
-            f.close()
-        else:
-            logger.info(f'file exists in cache')
+            try:
+                temp_filename = self.request_audio_file(source_text, voice, voice_options, audio_request_context, full_filename)
+            except errors.AudioNotFoundError as e:
+                if missing_audio_ttl_seconds > 0:
+                    audio_cache_index.add_missing_audio(voice_id.service, voice_key, source_text)
+                raise e
+            try:
+                size = os.path.getsize(temp_filename)
+                if size == 0:
+                    # never cached, the next request tries again
+                    raise errors.RequestError(source_text, voice, 'the service returned empty audio')
+                latency_tracker.record_miss(voice_id.service, audio_request_context, size)
+                content_hash = self.get_file_content_hash(temp_filename)
+                if self.get_preferences().audio_cache.deduplicate_audio:
+                    shared_filename = audio_cache_index.find_content(content_hash)
+                    shared_full_filename = os.path.join(os.path.dirname(full_filename), shared_filename) if shared_filename != None else None
+                    if shared_full_filename != None and os.path.exists(shared_full_filename):
+                        logger.info(f'identical audio already cached as {shared_filename}')
+                        os.remove(temp_filename)
+                        audio_cache_index.add(hash_str, shared_filename, size, format.name, voice_id.service, content_hash)
+                        return shared_full_filename, shared_filename
+                # the complete file replaces any previous one at once, a reader never sees a partially written file
+                os.replace(temp_filename, full_filename)
+            except Exception as e:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+                raise e
+            logger.debug(f'wrote audio data to {full_filename}')
+            audio_cache_index.add(hash_str, audio_filename, size, format.name, voice_id.service, content_hash)
         return full_filename, audio_filename
 
+    def migrate_legacy_audio_file(self, source_text, voice_id, voice_options, hash_str, format, full_filename, audio_filename):
+        # audio generated by previous versions gets renamed to its canonical hash the first time it's requested again
+        legacy_hash_str = self.get_legacy_hash_for_audio_request(source_text, voice_id, voice_options)
+        legacy_full_filename = self.get_full_audio_file_name(legacy_hash_str, format)
+        audio_cache_index = self.get_audio_cache()
+        if audio_cache_index.lookup(legacy_hash_str) == None and \
+            not (os.path.exists(legacy_full_filename) and os.path.getsize(legacy_full_filename) > 0):
+            return False
+        try:
+            os.replace(legacy_full_filename, full_filename)
+        except FileNotFoundError:
+            audio_cache_index.remove(legacy_hash_str)
+            return False
+        audio_cache_index.remove(legacy_hash_str)
+        audio_cache_index.add(hash_str, audio_filename, os.path.getsize(full_filename), format.name, voice_id.service)
+        return True
+
+    def request_audio_file(self, source_text, voice, voice_options, audio_request_context, full_filename):
+        # the audio is streamed into a temporary file next to full_filename, so that memory use doesn't depend
+        # on the length of the audio. returns the temporary filename, which the caller renames or removes
+        file_descriptor, temp_filename = tempfile.mkstemp(dir=os.path.dirname(full_filename), prefix=constants.AUDIO_TEMP_FILE_PREFIX)
+        logger.debug(f'writing audio data to {temp_filename}')
+        try:
+            with os.fdopen(file_descriptor, 'w+b') as f:
+                self.service_manager.get_tts_audio(source_text, voice, voice_options, audio_request_context, audio_file=f)
+        except Exception as e:
+            os.remove(temp_filename)
+            raise e
+        return temp_filename
+
+    def get_file_content_hash(self, full_filename):
+        content_hash = hashlib.sha256()
+        with open(full_filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(constants.AUDIO_STREAM_CHUNK_SIZE), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def get_audio_cache(self) -> audio_cache.AudioCacheIndex:
+        with self.audio_cache_lock:
+            if self.audio_cache == None:
+                audio_cache_index = audio_cache.AudioCacheIndex(self.anki_utils.get_user_files_dir())
+                audio_cache_index.open()
+                # missing audio past its ttl can be requested again
+                audio_cache_index.remove_expired_missing_audio(self.get_preferences().audio_cache.missing_audio_ttl_days * 24 * 3600)
+                self.audio_cache = audio_cache_index
+            return self.audio_cache
+
+    def audio_cache_opened(self):
+        return self.audio_cache != None
+
+    def start_audio_cache_open(self):
+        # the first open imports the audio files generated by previous versions, which can take a while
+        # with a large user_files directory, so it shouldn't happen on the main thread
+        self.anki_utils.run_in_background(self.get_audio_cache, self.open_audio_cache_done)
+
+    def open_audio_cache_done(self, result):
+        with self.error_manager.get_single_action_context('Opening Audio Cache'):
+            result.result()
+
+    def start_audio_cache_eviction(self):
+        if self.get_preferences().audio_cache.max_size_mb > 0:
+            self.anki_utils.run_in_background(self.evict_audio_cache, self.evict_audio_cache_done)
+
+    def evict_audio_cache(self):
+        max_size = self.get_preferences().audio_cache.max_size_mb * 1024 * 1024
+        if max_size == 0:
+            return 0, 0
+        self.get_audio_cache().remove_temp_files()
+        result = self.get_audio_cache().evict(max_size, self.get_collection_audio_filenames())
+        # realtime playback may refer to a file which just got evicted
+        self.realtime_audio_cache.clear()
+        return result
+
+    def evict_audio_cache_done(self, result):
+        with self.error_manager.get_single_action_context('Removing Unused Audio Files'):
+            result.result()
+
+    def get_collection_audio_filenames(self):
+        # files of the audio cache which are used by notes, these must stay in the cache
+        filename_set = set()
+        for field_values in self.anki_utils.get_note_fields_containing(f'[sound:{audio_cache.AUDIO_FILE_PREFIX}'):
+            filename_set.update(re.findall(r'\[sound:(' + audio_cache.AUDIO_FILE_PREFIX + r'[^\]]+)\]', field_values))
+        return filename_set
+
     def get_collection_sound_tag(self, full_filename, audio_filename):
         self.anki_utils.media_add_file(full_filename)
         return f'[sound:{audio_filename}]', audio_filename
@@ -422,6 +861,12 @@ class HyperTTS():
         filename = self.get_audio_filename(hash_str, format)
         return os.path.join(user_files_dir, filename)
     
+    def get_audio_format(self, voice_options) -> options.AudioFormat:
+        format = options.AudioFormat.mp3 # default to mp3
+        if options.AUDIO_FORMAT_PARAMETER in voice_options:
+            format = options.AudioFormat[voice_options[options.AUDIO_FORMAT_PARAMETER]]
+        return format
+
     def get_audio_filename(self, hash_str, format: options.AudioFormat):
         extension_map = {
             options.AudioFormat.mp3: 'mp3',
@@ -433,6 +878,28 @@ class HyperTTS():
         return filename
 
     def get_hash_for_audio_request(self, source_text, voice_id: voice_module.TtsVoiceId_v3, options):
+        request_key = self.get_audio_request_key(source_text, voice_id, options)
+        return hashlib.sha224(request_key.encode('utf-8')).hexdigest()
+
+    def get_audio_request_key(self, source_text, voice_id: voice_module.TtsVoiceId_v3, options):
+        # canonical form of the request, so that requests for the same audio share the same hash:
+        # keys are sorted, 1.0 and 1 are the same value. only depends on the request, not on the voices
+        # currently available, otherwise the same audio would get a different hash when a service is disabled
+        canonical_options = {}
+        for key, value in options.items():
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            canonical_options[key] = value
+        combined_data = {
+            'source_text': source_text,
+            'service': voice_id.service,
+            'voice_key': voice_id.voice_key,
+            'options': canonical_options
+        }
+        return json.dumps(combined_data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+    def get_legacy_hash_for_audio_request(self, source_text, voice_id: voice_module.TtsVoiceId_v3, options):
+        # hash used by previous versions, depends on the order of the options
         combined_data = {
             'source_text': source_text,
             'voice_id': voice_id,
@@ -453,9 +920,22 @@ class HyperTTS():
     # ===========================
 
     def get_audio_filename_tts_tag(self, tts_tag):
+        realtime_audio_key = '\x1f'.join(tts_tag.other_args + [tts_tag.field_text])
+        full_filename = self.realtime_audio_cache.get(realtime_audio_key)
+        if full_filename != None:
+            if os.path.exists(full_filename):
+                if self.realtime_audio_cache.mark_used_required(realtime_audio_key):
+                    # keeps the files played often from being evicted
+                    self.get_audio_cache().mark_used(os.path.basename(full_filename))
+                return full_filename
+            # evicted or removed from user_files
+            self.realtime_audio_cache.remove(realtime_audio_key)
         hypertts_preset = self.extract_hypertts_preset(tts_tag.other_args)
         realtime_side_model = self.get_realtime_side_config(hypertts_preset)
         full_filename, audio_filename = self.get_realtime_audio(realtime_side_model, tts_tag.field_text)
+        # in random mode, each playback may use a different voice
+        if realtime_side_model.voice_selection.selection_mode != constants.VoiceSelectionMode.random:
+            self.realtime_audio_cache.put(realtime_audio_key, full_filename)
         return full_filename
 
     def build_realtime_tts_tag(self, realtime_side_model: config_models.RealtimeConfigSide, setting_key):
@@ -555,18 +1035,96 @@ class HyperTTS():
         return note_model
 
     def render_card_template_extract_tts_tag(self, realtime_model: config_models.RealtimeConfig, note, side, card_ord):
+        note_model = self.build_realtime_preview_note_model(realtime_model, note, side, card_ord)
+        return self.extract_card_tts_tags(note, note_model, side, card_ord)
+
+    def build_realtime_preview_note_model(self, realtime_model: config_models.RealtimeConfig, note, side, card_ord):
         realtime_model.validate()
         note_model = note.note_type()
         note_model = copy.deepcopy(note_model)
         note_model = self.set_tts_tag_note_model(realtime_model, 'preview', note_model, side, card_ord, False)
-        logger.debug(f'render_card_template_extract_tts_tag, note_model {pprint.pformat(note_model, compact=True, width=500)}')
+        logger.debug(f'build_realtime_preview_note_model, note_model {pprint.pformat(note_model, compact=True, width=500)}')
+        return note_model
 
+    def extract_card_tts_tags(self, note, note_model, side, card_ord):
         card = self.anki_utils.create_card_from_note(note, card_ord, note_model, note_model["tmpls"][card_ord])
         if side == constants.AnkiCardSide.Front:
             return self.anki_utils.extract_tts_tags(card.question_av_tags())
         elif side == constants.AnkiCardSide.Back:
             return self.anki_utils.extract_tts_tags(card.answer_av_tags())
 
+    def warm_realtime_audio_cache(self, realtime_request_list, progress_fn, cancel_event):
+        # generates the audio of the (realtime side model, text) pairs ahead of the reviews, runs in the background,
+        # doesn't touch the collection. progress_fn(completed count, request count) is called after each request,
+        # no more requests are sent once cancel_event is set. returns (number of completed requests, number of errors)
+        if len(realtime_request_list) == 0:
+            return 0, 0
+        concurrency = min([self.get_batch_concurrency(realtime_side_model.voice_selection)
+            for realtime_side_model, text in realtime_request_list])
+        logger.info(f'generating realtime audio for {len(realtime_request_list)} audio requests, concurrency: {concurrency}')
+        completed_count = 0
+        error_count = 0
+        request_iterator = iter(realtime_request_list)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='hypertts_realtime_warm') as executor:
+            # requests are submitted as workers free up, so that cancelling doesn't leave a backlog of queued requests
+            pending_futures = set()
+            while True:
+                while not cancel_event.is_set() and len(pending_futures) < concurrency:
+                    realtime_request = next(request_iterator, None)
+                    if realtime_request == None:
+                        break
+                    realtime_side_model, text = realtime_request
+                    pending_futures.add(executor.submit(self.get_realtime_audio, realtime_side_model, text))
+                if len(pending_futures) == 0:
+                    break
+                done_futures, pending_futures = concurrent.futures.wait(pending_futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done_futures:
+                    try:
+                        future.result()
+                    except errors.HyperTTSError as e:
+                        logger.warning(f'could not generate realtime audio: {e}')
+                        error_count += 1
+                    except Exception as e:
+                        # connection errors and the like, the other requests keep going
+                        logger.exception(f'unexpected error while generating realtime audio: {e}')
+                        error_count += 1
+                    completed_count += 1
+                progress_fn(completed_count, len(realtime_request_list))
+        if cancel_event.is_set():
+            logger.info(f'realtime audio generation cancelled after {completed_count} / {len(realtime_request_list)} audio requests')
+        return completed_count, error_count
+
+    def get_realtime_audio_requests(self, note_id_list):
+        # renders the realtime sides of the notes' cards, returns the unique (realtime side model, text) pairs.
+        # loads notes from the collection, must run on the main thread
+        realtime_side_map = {}
+        realtime_request_map = {}
+        for note_id in note_id_list:
+            note = self.anki_utils.get_note_by_id(note_id)
+            if note.mid not in realtime_side_map:
+                realtime_side_map[note.mid] = self.get_realtime_note_model_sides(note)
+            for settings_key, realtime_side_model, note_model, side, card_ord in realtime_side_map[note.mid]:
+                for tts_tag in self.extract_card_tts_tags(note, note_model, side, card_ord):
+                    if len(tts_tag.field_text) > 0:
+                        realtime_request_map[(settings_key, side, tts_tag.field_text)] = (realtime_side_model, tts_tag.field_text)
+        return list(realtime_request_map.values())
+
+    def get_realtime_note_model_sides(self, note):
+        # (settings key, realtime side model, preview note model, side, card ord) for each side which has a realtime tts tag
+        realtime_side_list = []
+        for card_ord in range(len(note.note_type()['tmpls'])):
+            for side in [constants.AnkiCardSide.Front, constants.AnkiCardSide.Back]:
+                settings_key = self.card_template_has_tts_tag(note, side, card_ord)
+                if settings_key == None:
+                    continue
+                realtime_config = self.load_realtime_config(settings_key)
+                realtime_side_model = realtime_config.front if side == constants.AnkiCardSide.Front else realtime_config.back
+                if not realtime_side_model.side_enabled:
+                    continue
+                note_model = self.build_realtime_preview_note_model(realtime_side_model, note, side, card_ord)
+                realtime_side_list.append((settings_key, realtime_side_model, note_model, side, card_ord))
+        return realtime_side_list
+
     def build_side_settings_key(self, card_side: constants.AnkiCardSide, settings_key):
         return f'{card_side.name}_{settings_key}'
 
@@ -628,16 +1186,28 @@ class HyperTTS():
     def populate_batch_status_processed_text(self, note_id_list, batch_source, text_processing, batch_status):
         with batch_status.get_batch_running_action_context():
             for note_id in note_id_list:
-                with batch_status.get_note_action_context(note_id, True) as note_action_context:
-                    note = self.anki_utils.get_note_by_id(note_id)
-                    source_text, processed_text = self.get_source_processed_text(note, batch_source, text_processing)
-                    note_action_context.set_source_text(source_text)
-                    note_action_context.set_processed_text(processed_text)
-                    note_action_context.set_status(constants.BatchNoteStatus.OK)
+                self.populate_note_processed_text(note_id, batch_source, text_processing, batch_status)
                 if batch_status.must_continue == False:
                     logger.info('batch_status execution interrupted')
                     break
 
+    def populate_batch_status_rows_processed_text(self, note_id_list, batch_source, text_processing, batch_status, is_current_fn):
+        # used by the preview to compute the text of a few rows at a time, stops as soon as
+        # is_current_fn returns False (the preview model changed)
+        for note_id in note_id_list:
+            if not is_current_fn():
+                logger.debug('preview text computation superseded')
+                return
+            self.populate_note_processed_text(note_id, batch_source, text_processing, batch_status)
+
+    def populate_note_processed_text(self, note_id, batch_source, text_processing, batch_status):
+        with batch_status.get_note_action_context(note_id, True) as note_action_context:
+            note = self.anki_utils.get_note_by_id(note_id)
+            source_text, processed_text = self.get_source_processed_text(note, batch_source, text_processing)
+            note_action_context.set_source_text(source_text)
+            note_action_context.set_processed_text(processed_text)
+            note_action_context.set_status(constants.BatchNoteStatus.OK)
+
     def get_source_processed_text(self, note, batch_source, text_processing):
         source_text = self.get_source_text(note, batch_source, None)
         logger.debug(f'get_source_processed_text: source_text: {source_text}')
@@ -728,6 +1298,7 @@ class HyperTTS():
             final_key = settings_key
         self.config[constants.CONFIG_REALTIME_CONFIG][final_key] = realtime_model.serialize()
         self.anki_utils.write_config(self.config)
+        self.realtime_audio_cache.clear()
         return final_key
 
     def load_realtime_config(self, settings_key):
@@ -745,6 +1316,7 @@ class HyperTTS():
         configuration_model.validate()
         self.config[constants.CONFIG_CONFIGURATION] = config_models.serialize_configuration(configuration_model)
         self.anki_utils.write_config(self.config)
+        self.realtime_audio_cache.clear()
 
     def get_configuration(self):
         return self.deserialize_configuration(self.config.get(constants.CONFIG_CONFIGURATION, {}))
@@ -778,7 +1350,8 @@ class HyperTTS():
         batch = config_models.BatchConfig(self.anki_utils)
         source = config_models.deserialize_batchsource(batch_config['source'])
         batch_target_config = batch_config['target']
-        target = config_models.BatchTarget(batch_target_config['target_field'], batch_target_config['text_and_sound_tag'], batch_target_config['remove_sound_tag'])
+        target = config_models.BatchTarget(batch_target_config['target_field'], batch_target_config['text_and_sound_tag'], batch_target_config['remove_sound_tag'],
+            batch_target_config.get('skip_up_to_date', False))
         voice_selection = self.deserialize_voice_selection(batch_config['voice_selection'])
 
         text_processing_config = batch_config.get('text_processing', {})
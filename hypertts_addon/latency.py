@@ -0,0 +1,183 @@
+"""
+measures the audio requests, per service and per request reason (batch, realtime, editor...):
+- the duration of the most recent successful requests to each service, used to estimate how long a batch will take
+- whether the audio was served from the audio cache (hits) or by the service (misses), and how many bytes each
+- how long the service took to respond, as a histogram
+the counters are kept in memory for the current Anki session, they can be exported as json
+"""
+
+import time
+import json
+import threading
+import collections
+
+from . import constants
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+# when the audio request context isn't known
+UNKNOWN_REASON = 'unknown'
+
+
+class AudioRequestCounters():
+    def __init__(self):
+        self.hit_count = 0
+        self.miss_count = 0
+        self.error_count = 0
+        self.bytes_served = 0
+        self.bytes_generated = 0
+        self.request_count = 0
+        self.request_seconds = 0.0
+        # one bucket per entry of constants.AUDIO_STATISTICS_LATENCY_BUCKETS, plus one for slower requests
+        self.latency_histogram = [0] * (len(constants.AUDIO_STATISTICS_LATENCY_BUCKETS) + 1)
+
+    def get_average_latency(self):
+        if self.request_count == 0:
+            return None
+        return self.request_seconds / self.request_count
+
+    def serialize(self):
+        return {
+            'hit_count': self.hit_count,
+            'miss_count': self.miss_count,
+            'error_count': self.error_count,
+            'bytes_served': self.bytes_served,
+            'bytes_generated': self.bytes_generated,
+            'request_count': self.request_count,
+            'request_seconds': self.request_seconds,
+            'latency_histogram': {get_bucket_label(i): count for i, count in enumerate(self.latency_histogram)}
+        }
+
+
+def get_bucket_label(bucket_index):
+    bucket_list = constants.AUDIO_STATISTICS_LATENCY_BUCKETS
+    if bucket_index < len(bucket_list):
+        return f'<{bucket_list[bucket_index]}s'
+    return f'>={bucket_list[-1]}s'
+
+
+def get_reason_name(audio_request_context):
+    if audio_request_context == None:
+        return UNKNOWN_REASON
+    return audio_request_context.audio_request_reason.name
+
+
+class LatencyTracker():
+    def __init__(self, sample_count=constants.LATENCY_SAMPLE_COUNT):
+        self.sample_count = sample_count
+        # service -> duration of the most recent successful requests
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # resets the counters, the samples are kept for the batch estimates
+        with self.lock:
+            # (service, reason) -> AudioRequestCounters
+            self.counters = {}
+            self.start_time = time.time()
+
+    def get_counters(self, service_name, audio_request_context) -> AudioRequestCounters:
+        # must hold the lock
+        key = (service_name, get_reason_name(audio_request_context))
+        if key not in self.counters:
+            self.counters[key] = AudioRequestCounters()
+        return self.counters[key]
+
+    def record_hit(self, service_name, audio_request_context, size):
+        with self.lock:
+            counters = self.get_counters(service_name, audio_request_context)
+            counters.hit_count += 1
+            counters.bytes_served += size
+
+    def record_miss(self, service_name, audio_request_context, size):
+        with self.lock:
+            counters = self.get_counters(service_name, audio_request_context)
+            counters.miss_count += 1
+            counters.bytes_generated += size
+
+    def record_request(self, service_name, audio_request_context, duration_seconds, success):
+        with self.lock:
+            counters = self.get_counters(service_name, audio_request_context)
+            if not success:
+                counters.error_count += 1
+                return
+            if service_name not in self.samples:
+                self.samples[service_name] = collections.deque(maxlen=self.sample_count)
+            self.samples[service_name].append(duration_seconds)
+            counters.request_count += 1
+            counters.request_seconds += duration_seconds
+            bucket_index = len(constants.AUDIO_STATISTICS_LATENCY_BUCKETS)
+            for i, bucket_limit in enumerate(constants.AUDIO_STATISTICS_LATENCY_BUCKETS):
+                if duration_seconds < bucket_limit:
+                    bucket_index = i
+                    break
+            counters.latency_histogram[bucket_index] += 1
+
+    def get_average_latency(self, service_name):
+        # average of the most recent requests, returns None if no request was sent to this service yet
+        with self.lock:
+            samples = self.samples.get(service_name, None)
+            if samples == None or len(samples) == 0:
+                return None
+            return sum(samples) / len(samples)
+
+    def measure(self, service_name, audio_request_context):
+        return LatencyMeasurement(self, service_name, audio_request_context)
+
+    def get_service_summary(self):
+        # returns {service: (hits, misses, hit rate, bytes served, latency saved in seconds)}
+        with self.lock:
+            service_counters = {}
+            for (service_name, reason), counters in self.counters.items():
+                service_counters.setdefault(service_name, []).append(counters)
+            summary = {}
+            for service_name, counters_list in service_counters.items():
+                hit_count = sum([x.hit_count for x in counters_list])
+                miss_count = sum([x.miss_count for x in counters_list])
+                request_count = sum([x.request_count for x in counters_list])
+                request_seconds = sum([x.request_seconds for x in counters_list])
+                hit_rate = hit_count / (hit_count + miss_count) if hit_count + miss_count > 0 else 0.0
+                # each hit saved a request to the service, which would have taken the average latency
+                latency_saved = hit_count * request_seconds / request_count if request_count > 0 else 0.0
+                summary[service_name] = (hit_count, miss_count, hit_rate, sum([x.bytes_served for x in counters_list]), latency_saved)
+            return summary
+
+    def serialize(self):
+        with self.lock:
+            services = {}
+            for (service_name, reason), counters in self.counters.items():
+                services.setdefault(service_name, {})[reason] = counters.serialize()
+            return {
+                'start_time': self.start_time,
+                'latency_buckets': constants.AUDIO_STATISTICS_LATENCY_BUCKETS,
+                'services': services
+            }
+
+    def export_json(self, file_path, audio_cache_index=None):
+        data = self.serialize()
+        if audio_cache_index != None:
+            data['audio_cache'] = {
+                'file_count': audio_cache_index.get_entry_count(),
+                'total_size': audio_cache_index.get_total_size()
+            }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        logger.info(f'exported audio statistics to {file_path}')
+
+
+class LatencyMeasurement():
+    # records the duration of the request to the service, and whether it succeeded
+    def __init__(self, latency_tracker, service_name, audio_request_context):
+        self.latency_tracker = latency_tracker
+        self.service_name = service_name
+        self.audio_request_context = audio_request_context
+
+    def __enter__(self):
+        self.start_time = time.monotonic()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.latency_tracker.record_request(self.service_name, self.audio_request_context,
+            time.monotonic() - self.start_time, exception_value == None)
+        return False
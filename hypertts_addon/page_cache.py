@@ -0,0 +1,59 @@
+import time
+import threading
+import collections
+
+from . import constants
+from . import errors
+from . import singleflight
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class PageCache():
+    """
+    short lived cache of the data extracted from the pages of a dictionary website, shared by all the voices
+    of the service: the page of a word holds the audio of every accent, so it only gets fetched and parsed once
+    when requesting the UK and US audio. concurrent requests for the same page share a single fetch.
+    a page which doesn't exist is cached as well, as None.
+    """
+    def __init__(self, ttl_seconds=constants.DICTIONARY_PAGE_CACHE_TTL_SECONDS,
+            max_entries=constants.DICTIONARY_PAGE_CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        # url -> (expiration time, extracted data, or None if the page doesn't exist)
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.single_flight = singleflight.SingleFlight()
+
+    def get(self, url, fetch_fn):
+        # fetch_fn downloads the page and returns the data extracted from it, or raises AudioNotFoundError if
+        # the page doesn't exist. returns None in that case
+        with self.lock:
+            entry = self.entries.get(url, None)
+            if entry != None:
+                expiration_time, data = entry
+                if expiration_time > self.clock():
+                    logger.debug(f'page cache hit for {url}')
+                    self.entries.move_to_end(url)
+                    return data
+                del self.entries[url]
+        return self.single_flight.call(url, lambda: self.fetch(url, fetch_fn))
+
+    def fetch(self, url, fetch_fn):
+        try:
+            data = fetch_fn()
+        except errors.AudioNotFoundError:
+            # the other voices of the word shouldn't request the page again
+            logger.debug(f'page not found: {url}')
+            data = None
+        with self.lock:
+            self.entries[url] = (self.clock() + self.ttl_seconds, data)
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
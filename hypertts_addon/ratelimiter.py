@@ -0,0 +1,102 @@
+import time
+import threading
+import contextlib
+from dataclasses import dataclass
+
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    # a value of 0 means no limit
+    requests_per_second: float = 0
+    characters_per_minute: int = 0
+    max_in_flight: int = 0
+
+    def unlimited(self):
+        return self.requests_per_second <= 0 and self.characters_per_minute <= 0 and self.max_in_flight <= 0
+
+
+class TokenBucket():
+    """
+    tokens refill continuously at `rate` per second, up to `capacity`. a caller which takes more tokens
+    than available reserves them (the bucket goes negative) and sleeps until they would have been refilled,
+    so concurrent callers queue up fairly and nobody waits unless the limit is actually exceeded.
+    """
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.last_refill = self.clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens) -> float:
+        # returns how long the caller needs to wait before its tokens are available
+        # a single request never waits for more than a full bucket
+        tokens = min(tokens, self.capacity)
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens=1):
+        wait_time = self.reserve(tokens)
+        if wait_time > 0:
+            logger.debug(f'rate limit reached, waiting {wait_time:.2f}s')
+            self.sleep(wait_time)
+
+
+class ServiceRateLimiter():
+    def __init__(self, rate_limits: RateLimits, clock=time.monotonic, sleep=time.sleep):
+        self.rate_limits = rate_limits
+        self.request_bucket = None
+        self.character_bucket = None
+        self.in_flight_semaphore = None
+        if rate_limits.requests_per_second > 0:
+            # allow a burst of one second worth of requests
+            capacity = max(1, rate_limits.requests_per_second)
+            self.request_bucket = TokenBucket(rate_limits.requests_per_second, capacity, clock=clock, sleep=sleep)
+        if rate_limits.characters_per_minute > 0:
+            self.character_bucket = TokenBucket(rate_limits.characters_per_minute / 60.0, rate_limits.characters_per_minute, clock=clock, sleep=sleep)
+        if rate_limits.max_in_flight > 0:
+            self.in_flight_semaphore = threading.BoundedSemaphore(rate_limits.max_in_flight)
+
+    @contextlib.contextmanager
+    def limit(self, source_text):
+        if self.in_flight_semaphore != None:
+            self.in_flight_semaphore.acquire()
+        try:
+            if self.request_bucket != None:
+                self.request_bucket.acquire(1)
+            if self.character_bucket != None:
+                self.character_bucket.acquire(len(source_text))
+            yield
+        finally:
+            if self.in_flight_semaphore != None:
+                self.in_flight_semaphore.release()
+
+
+class RateLimiterManager():
+    """
+    holds one rate limiter per service, the limiter is rebuilt whenever the service's limits change
+    (the user reconfigured the service)
+    """
+    def __init__(self):
+        self.rate_limiters = {}
+        self.lock = threading.Lock()
+
+    def get_rate_limiter(self, service_name, rate_limits: RateLimits) -> ServiceRateLimiter:
+        with self.lock:
+            rate_limiter = self.rate_limiters.get(service_name, None)
+            if rate_limiter == None or rate_limiter.rate_limits != rate_limits:
+                logger.info(f'configuring rate limiter for {service_name}: {rate_limits}')
+                rate_limiter = ServiceRateLimiter(rate_limits)
+                self.rate_limiters[service_name] = rate_limiter
+            return rate_limiter
@@ -0,0 +1,150 @@
+import time
+import random
+import threading
+import datetime
+import email.utils
+import requests
+
+from . import constants
+from . import errors
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+# http status codes which indicate the request may succeed if sent again later
+TRANSIENT_STATUS_CODES = [408, 425, 429, 500, 502, 503, 504]
+
+
+def parse_retry_after(retry_after):
+    # Retry-After is either a number of seconds or an http date
+    if retry_after == None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_transient_failure(exception):
+    # returns (is_transient, retry_after_seconds)
+    if isinstance(exception, errors.RequestError):
+        if exception.status_code in TRANSIENT_STATUS_CODES:
+            return True, parse_retry_after(exception.retry_after)
+        return False, None
+    if isinstance(exception, requests.exceptions.HTTPError) and exception.response != None:
+        if exception.response.status_code in TRANSIENT_STATUS_CODES:
+            return True, parse_retry_after(exception.response.headers.get('Retry-After', None))
+        return False, None
+    if isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True, None
+    return False, None
+
+
+class RetryPolicy():
+    def __init__(self, max_attempts, base_delay=constants.RETRY_BASE_DELAY_SECONDS,
+            max_delay=constants.RETRY_MAX_DELAY_SECONDS, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def get_delay(self, attempt, retry_after):
+        # full jitter exponential backoff, unless the server told us how long to wait
+        if retry_after != None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn, description):
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                transient, retry_after = get_transient_failure(e)
+                attempt += 1
+                if not transient or attempt >= self.max_attempts:
+                    raise e
+                if retry_after != None and retry_after > self.max_delay:
+                    logger.warning(f'{description}: server asked to retry after {retry_after:.0f}s, giving up')
+                    raise e
+                delay = self.get_delay(attempt - 1, retry_after)
+                logger.warning(f'{description}: transient failure ({e}), attempt {attempt}/{self.max_attempts}, retrying in {delay:.1f}s')
+                self.sleep(delay)
+
+
+class CircuitBreaker():
+    """
+    after failure_threshold consecutive transient failures, requests are rejected right away for
+    reset_seconds. after that, a single trial request is let through, if it succeeds the circuit closes.
+    """
+    def __init__(self, service_name, failure_threshold=constants.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=constants.CIRCUIT_BREAKER_RESET_SECONDS, clock=time.monotonic):
+        self.service_name = service_name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failure_count = 0
+        self.opened_time = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        with self.lock:
+            if self.opened_time == None:
+                return
+            elapsed = self.clock() - self.opened_time
+            if elapsed >= self.reset_seconds and not self.trial_in_progress:
+                # half-open: let one request through
+                self.trial_in_progress = True
+                return
+            retry_in_seconds = max(0, self.reset_seconds - elapsed)
+            raise errors.ServiceUnavailable(self.service_name, self.failure_count, retry_in_seconds)
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_time != None:
+                logger.info(f'{self.service_name}: request succeeded, closing circuit')
+            self.failure_count = 0
+            self.opened_time = None
+            self.trial_in_progress = False
+
+    def record_failure(self, exception):
+        transient, retry_after = get_transient_failure(exception)
+        with self.lock:
+            self.trial_in_progress = False
+            if not transient:
+                # the service responded, the problem is with this particular request
+                self.failure_count = 0
+                self.opened_time = None
+                return
+            self.failure_count += 1
+            if self.failure_count >= self.failure_threshold:
+                if self.opened_time == None:
+                    logger.warning(f'{self.service_name}: {self.failure_count} consecutive failures, opening circuit')
+                self.opened_time = self.clock()
+
+    def call(self, fn):
+        self.before_request()
+        try:
+            result = fn()
+        except Exception as e:
+            self.record_failure(e)
+            raise e
+        self.record_success()
+        return result
+
+
+class CircuitBreakerManager():
+    def __init__(self):
+        self.circuit_breakers = {}
+        self.lock = threading.Lock()
+
+    def get_circuit_breaker(self, service_name) -> CircuitBreaker:
+        with self.lock:
+            if service_name not in self.circuit_breakers:
+                self.circuit_breakers[service_name] = CircuitBreaker(service_name)
+            return self.circuit_breakers[service_name]
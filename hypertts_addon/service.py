@@ -11,6 +11,9 @@ from . import constants
 from . import voice as voice_module
 from . import languages
 from . import errors
+from . import ratelimiter
+from . import http_session
+from . import token_manager
 from . import logging_utils
 
 from .services import voicelist
@@ -19,6 +22,14 @@ logger = logging_utils.get_child_logger(__name__)
 
 
 class ServiceBase(abc.ABC):
+    # optional configuration key, services which support concurrent requests declare it in configuration_options
+    CONFIG_BATCH_CONCURRENCY = 'batch_concurrency'
+    # optional rate limiting configuration keys, enforced by the ServiceManager
+    CONFIG_THROTTLE_SECONDS = 'throttle_seconds' # legacy, minimum interval between requests
+    CONFIG_REQUESTS_PER_SECOND = 'requests_per_second'
+    CONFIG_CHARACTERS_PER_MINUTE = 'characters_per_minute'
+    CONFIG_MAX_IN_FLIGHT = 'max_in_flight'
+
     def __init__(self):
         self._config = {}
     
@@ -62,6 +73,53 @@ class ServiceBase(abc.ABC):
     def test_service(self):
         return False
 
+    # how many audio requests a batch can have in flight for this service
+    def default_batch_concurrency(self) -> int:
+        return 1 # default, requests are sent one at a time
+
+    def get_batch_concurrency(self) -> int:
+        if not hasattr(self, '_config'):
+            return self.default_batch_concurrency()
+        concurrency = self.get_configuration_value_optional(self.CONFIG_BATCH_CONCURRENCY, 0)
+        if concurrency == None or concurrency <= 0:
+            return self.default_batch_concurrency()
+        return concurrency
+
+    def get_rate_limits(self) -> ratelimiter.RateLimits:
+        if not hasattr(self, '_config'):
+            return ratelimiter.RateLimits()
+        requests_per_second = self.get_configuration_value_optional(self.CONFIG_REQUESTS_PER_SECOND, 0) or 0
+        characters_per_minute = self.get_configuration_value_optional(self.CONFIG_CHARACTERS_PER_MINUTE, 0) or 0
+        max_in_flight = self.get_configuration_value_optional(self.CONFIG_MAX_IN_FLIGHT, 0) or 0
+        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0) or 0
+        if requests_per_second <= 0 and throttle_seconds > 0:
+            # users who configured throttle_seconds get the equivalent request rate
+            requests_per_second = 1.0 / throttle_seconds
+        return ratelimiter.RateLimits(requests_per_second=requests_per_second,
+            characters_per_minute=characters_per_minute, max_in_flight=max_in_flight)
+
+    # pooled http sessions, shared by all the services and handed over by the ServiceManager
+    def get_http_session_manager(self) -> http_session.HttpSessionManager:
+        if getattr(self, 'http_session_manager', None) == None:
+            # service used on its own
+            self.http_session_manager = http_session.HttpSessionManager()
+        return self.http_session_manager
+
+    # access tokens cache, shared by all the services and handed over by the ServiceManager
+    def get_token_manager(self) -> token_manager.TokenManager:
+        if getattr(self, 'token_manager', None) == None:
+            self.token_manager = token_manager.TokenManager()
+        return self.token_manager
+
+    def http_request(self, method, url, **kwargs):
+        return self.get_http_session_manager().request(method, url, self.get_batch_concurrency(), self.name, **kwargs)
+
+    def http_get(self, url, **kwargs):
+        return self.http_request('GET', url, **kwargs)
+
+    def http_post(self, url, **kwargs):
+        return self.http_request('POST', url, **kwargs)
+
     @abc.abstractmethod
     def voice_list(self) -> typing.List[voice_module.TtsVoice_v3]:
         pass
@@ -70,6 +128,26 @@ class ServiceBase(abc.ABC):
     def get_tts_audio(self, source_text, voice: voice_module.TtsVoice_v3, options):
         pass
 
+    def write_tts_audio(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_file):
+        """writes the audio into audio_file, a binary file object. services which can stream the audio override this,
+        so that long audio goes from the response to the file without being held in memory"""
+        audio_file.write(self.get_tts_audio(source_text, voice, options))
+
+    def check_dictionary_response(self, source_text, voice: voice_module.TtsVoice_v3, response):
+        # a page which couldn't be loaded (rate limiting, server error, bot challenge) doesn't mean the dictionary
+        # doesn't have the word, only a 404 does
+        if response.status_code == 404:
+            raise errors.AudioNotFoundError(source_text, voice)
+        if response.status_code != 200:
+            error_message = f'status code {response.status_code}: {response.reason}'
+            raise errors.RequestError(source_text, voice, error_message, response=response)
+
+    def write_response_audio(self, response, audio_file):
+        # response must have been requested with stream=True
+        with response:
+            for chunk in response.iter_content(chunk_size=constants.AUDIO_STREAM_CHUNK_SIZE):
+                audio_file.write(chunk)
+
 
     # some helper functions
     def basic_voice_list(self) -> typing.List[voice_module.TtsVoice_v3]:
@@ -14,6 +14,11 @@ from . import errors
 from . import version
 from . import constants
 from . import config_models
+from . import ratelimiter
+from . import retry
+from . import latency
+from . import http_session
+from . import token_manager
 from . import cloudlanguagetools as cloudlanguagetools_module
 from . import logging_utils
 logger = logging_utils.get_child_logger(__name__)
@@ -33,6 +38,14 @@ class ServiceManager():
         self.cloudlanguagetools_enabled = False
         self.allow_test_services = allow_test_services
         self.cloudlanguagetools = cloudlanguagetools
+        self.rate_limiter_manager = ratelimiter.RateLimiterManager()
+        self.circuit_breaker_manager = retry.CircuitBreakerManager()
+        self.latency_tracker = latency.LatencyTracker()
+        # keep-alive connections, shared by all the services
+        self.http_session_manager = http_session.HttpSessionManager()
+        self.cloudlanguagetools.http_session_manager = self.http_session_manager
+        # access tokens of the services which authenticate with one
+        self.token_manager = token_manager.TokenManager()
 
     def configure(self, configuration_model):
         hypertts_pro_mode = configuration_model.hypertts_pro_api_key_set()
@@ -55,6 +68,12 @@ class ServiceManager():
         else:
             self.cloudlanguagetools_enabled = False
 
+    def shutdown(self):
+        # called when the profile closes
+        logger.info('shutting down service manager')
+        self.token_manager.shutdown()
+        self.http_session_manager.close()
+
     def remove_non_existent_services(self, configuration_model):
         # remove non existent services from the service enabled map
         service_enabled_map = configuration_model.get_service_enabled_map()
@@ -105,6 +124,8 @@ class ServiceManager():
                 logger.info(f'skipping test service {subclass_instance.name}')
                 continue
             logger.info(f'instantiating service {subclass_instance.name}')
+            subclass_instance.http_session_manager = self.http_session_manager
+            subclass_instance.token_manager = self.token_manager
             self.services[subclass_instance.name] = subclass_instance
 
     def service_exists(self, service_name):
@@ -142,15 +163,27 @@ class ServiceManager():
                 return True
         return False
 
-    def get_tts_audio(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context):
+    def get_tts_audio(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context, audio_file=None):
+        # when audio_file (a binary file object) is provided, the audio is streamed into it and None is returned,
+        # otherwise the audio is returned as bytes
         # assert the type of voice being passed in
         assert isinstance(voice, voice_module.TtsVoice_v3), f"Expected voice to be TtsVoice_v3, got {type(voice).__name__}"
-        if hasattr(sys, '_sentry_crash_reporting'):
-            return self.get_tts_audio_instrumented(source_text, voice, options, audio_request_context)
+        with self.latency_tracker.measure(voice.service, audio_request_context):
+            if hasattr(sys, '_sentry_crash_reporting'):
+                return self.get_tts_audio_instrumented(source_text, voice, options, audio_request_context, audio_file)
+            else:
+                return self.get_tts_audio_implementation(source_text, voice, options, audio_request_context, audio_file)
+
+    def get_rate_limiter(self, voice: voice_module.TtsVoice_v3) -> ratelimiter.ServiceRateLimiter:
+        service = self.services[voice.service]
+        if self.use_cloud_language_tools(voice):
+            # the service isn't configured when going through cloudlanguagetools
+            rate_limits = ratelimiter.RateLimits()
         else:
-            return self.get_tts_audio_implementation(source_text, voice, options, audio_request_context)
+            rate_limits = service.get_rate_limits()
+        return self.rate_limiter_manager.get_rate_limiter(voice.service, rate_limits)
 
-    def get_tts_audio_instrumented(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context):
+    def get_tts_audio_instrumented(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context, audio_file):
         transaction_name = f'{voice.service}'
         if self.use_cloud_language_tools(voice):
             transaction_name = f'cloudlanguagetools_{voice.service}'
@@ -158,7 +191,7 @@ class ServiceManager():
         raise_exception = None
         with sentry_sdk.start_transaction(op="audio", name=transaction_name) as transaction:
             try:
-                result_audio = self.get_tts_audio_implementation(source_text, voice, options, audio_request_context)
+                result_audio = self.get_tts_audio_implementation(source_text, voice, options, audio_request_context, audio_file)
                 transaction.status = 'ok'
                 return result_audio
             except Exception as e:
@@ -172,13 +205,44 @@ class ServiceManager():
         if raise_exception != None:
             raise raise_exception
 
-    def get_tts_audio_implementation(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context):
+    def get_tts_audio_implementation(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context, audio_file):
+        # transient failures are retried, and a service which keeps failing gets its requests rejected right away
+        retry_policy = retry.RetryPolicy(self.get_retry_max_attempts(audio_request_context))
+        circuit_breaker = self.circuit_breaker_manager.get_circuit_breaker(voice.service)
+        rate_limiter = self.get_rate_limiter(voice)
+        def request_attempt():
+            # every attempt, retries included, goes through the service's rate limits. blocks only if one of them
+            # would be exceeded, and the in flight slot isn't held while backing off
+            with rate_limiter.limit(source_text):
+                return self.get_tts_audio_request(source_text, voice, options, audio_request_context, audio_file)
+        return circuit_breaker.call(lambda: retry_policy.call(request_attempt, f'{voice.service} audio request'))
+
+    def get_retry_max_attempts(self, audio_request_context):
+        if audio_request_context != None and audio_request_context.audio_request_reason == constants.AudioRequestReason.batch:
+            return constants.RETRY_MAX_ATTEMPTS_BATCH
+        return constants.RETRY_MAX_ATTEMPTS_INTERACTIVE
+
+    def get_tts_audio_request(self, source_text, voice: voice_module.TtsVoice_v3, options, audio_request_context, audio_file):
+        if audio_file != None:
+            # a retried request starts over
+            audio_file.seek(0)
+            audio_file.truncate()
         if self.use_cloud_language_tools(voice):
+            if audio_file != None:
+                return self.cloudlanguagetools.write_tts_audio(source_text, voice, options, audio_request_context, audio_file)
             return self.cloudlanguagetools.get_tts_audio(source_text, voice, options, audio_request_context)
         else:
             service = self.services[voice.service]
+            if audio_file != None:
+                return service.write_tts_audio(source_text, voice, options, audio_file)
             return service.get_tts_audio(source_text, voice, options)
 
+    def get_batch_concurrency(self, voice_id: voice_module.TtsVoiceId_v3) -> int:
+        service = self.get_service(voice_id.service)
+        if self.cloudlanguagetools_enabled and service.cloudlanguagetools_enabled():
+            return constants.CLOUDLANGUAGETOOLS_BATCH_CONCURRENCY
+        return service.get_batch_concurrency()
+
     def full_voice_list(self, single_service_name=None) -> typing.List[voice_module.TtsVoice_v3]:
         full_list = []
         for service_name, service_instance in self.services.items():
@@ -1,4 +1,3 @@
-import requests
 import time
 import datetime
 import uuid
@@ -20,8 +19,6 @@ class AliCloud(service.ServiceBase):
     CONFIG_APP_KEY = 'app_key'
     CONFIG_THROTTLE_SECONDS = 'throttle_seconds'
 
-    access_token = None
-
     def cloudlanguagetools_enabled(self):
         return False
 
@@ -38,11 +35,15 @@ class AliCloud(service.ServiceBase):
             self.CONFIG_ACCESS_ID: str,
             self.CONFIG_ACCESS_KEY: str,
             self.CONFIG_APP_KEY: str,
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int
         }
     
     # this process is described by https://www.alibabacloud.com/help/en/isi/getting-started/use-http-or-https-to-obtain-an-access-token?spm=a2c63.p38356.0.i1#topic-2572194
     def refresh_token(self):
+        # returns (token, lifetime in seconds), called by the token manager
         logger.info(f"refreshing token")
         params = {
             "AccessKeyId": self.get_configuration_value_mandatory(self.CONFIG_ACCESS_ID),
@@ -81,54 +82,59 @@ class AliCloud(service.ServiceBase):
 
         params_str = f"Signature={signature}&{params_str}"
 
-        r = requests.get(f"http://nlsmeta.ap-southeast-1.aliyuncs.com/?{params_str}")
+        r = self.http_get(f"http://nlsmeta.ap-southeast-1.aliyuncs.com/?{params_str}")
         
         # API definition says any error will return non-200 RC
         if r.status_code != 200:
             logger.warning(f"Request to http://nlsmeta.ap-southeast-1.aliyuncs.com/?{params_str} failed:\n {r.text}")
-            return
+            r.raise_for_status()
         
         j = r.json()
-        self.access_token = j["Token"]
-        logger.info(f"Got access token: {self.access_token}")
+        access_token = j["Token"]
+        logger.info(f"Got access token, expires at {access_token['ExpireTime']}")
+        return access_token["Id"], access_token["ExpireTime"] - time.time()
+
+    def get_access_token(self):
+        account = (self.get_configuration_value_mandatory(self.CONFIG_ACCESS_ID),
+            self.get_configuration_value_mandatory(self.CONFIG_ACCESS_KEY))
+        return self.get_token_manager().get_token(self.name, account, self.refresh_token)
 
     def voice_list(self):
         return self.basic_voice_list()
 
     def get_tts_audio(self, source_text, voice: voice.VoiceBase, voice_options):
-        if not self.access_token or self.access_token["ExpireTime"] <= int(time.time()):
-            self.refresh_token()
+        access_token = self.get_access_token()
 
         app_key = self.get_configuration_value_mandatory(self.CONFIG_APP_KEY)
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
         speed = int(voice_options.get('speed', voice.options['speed']['default']))
         pitch = int(voice_options.get('pitch', voice.options['pitch']['default']))
         voice = voice.voice_key['voice_key']
 
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
-
         params = {
             "format": "mp3",
             "appkey": app_key,
             "speech_rate": speed,
             "pitch_rate": pitch,
             "text": source_text,
-            "token": self.access_token["Id"],
+            "token": access_token,
             "voice": voice
         }
 
-        response = requests.get(
+        response = self.http_get(
             "https://nls-gateway-ap-southeast-1.aliyuncs.com/stream/v1/tts",
             params=params,
             timeout=constants.RequestTimeout
         )
         
         if response.status_code != 200:
-            data = response.json()
-            error_message = data.get('message', str(data))
+            try:
+                data = response.json()
+                error_message = data.get('message', str(data))
+            except ValueError:
+                # gateway errors don't come back as json
+                error_message = f'status code: {response.status_code}: {response.content}'
             logger.warning(error_message)
-            raise errors.RequestError(source_text, voice, error_message)
+            raise errors.RequestError(source_text, voice, error_message, response=response)
         
         if response.headers['Content-Type'] != 'audio/mpeg':
             logger.warning(f'Unexpected response type. Response as text: {response.text}')
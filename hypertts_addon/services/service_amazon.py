@@ -1,7 +1,6 @@
 import sys
 import requests
 import datetime
-import time
 import boto3
 import botocore
 import contextlib
@@ -20,6 +19,8 @@ class Amazon(service.ServiceBase):
     CONFIG_SECRET_ACCESS_KEY = 'aws_secret_access_key'
     CONFIG_REGION = 'aws_region'
     CONFIG_THROTTLE_SECONDS = 'throttle_seconds'
+    # polly error codes meaning the request was rate limited
+    THROTTLING_ERROR_CODES = ['ThrottlingException', 'Throttling', 'TooManyRequestsException']
 
     def __init__(self):
         service.ServiceBase.__init__(self)
@@ -28,6 +29,9 @@ class Amazon(service.ServiceBase):
     def cloudlanguagetools_enabled(self):
         return True
 
+    def default_batch_concurrency(self) -> int:
+        return 4
+
     @property
     def service_type(self) -> constants.ServiceType:
         return constants.ServiceType.tts
@@ -65,7 +69,11 @@ class Amazon(service.ServiceBase):
                 'us-gov-east-1',
                 'us-gov-west-1',                
             ],
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int,
+            self.CONFIG_BATCH_CONCURRENCY: int
         }
 
     def configure(self, config):
@@ -85,10 +93,6 @@ class Amazon(service.ServiceBase):
         aws_access_key_id=self.get_configuration_value_mandatory(self.CONFIG_ACCESS_KEY_ID)
         aws_secret_access_key=self.get_configuration_value_mandatory(self.CONFIG_SECRET_ACCESS_KEY)
 
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)        
-
         pitch = voice_options.get('pitch', voice.options['pitch']['default'])
         pitch_str = f'{pitch:+.0f}%'
         rate = voice_options.get('rate', voice.options['rate']['default'])
@@ -116,7 +120,14 @@ class Amazon(service.ServiceBase):
         try:
             response = self.polly_client.synthesize_speech(Text=ssml_str, TextType="ssml", OutputFormat=audio_format_map[audio_format], VoiceId=voice.voice_key['voice_id'], Engine=voice.voice_key['engine'])
         except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as error:
-            raise errors.RequestError(source_text, voice, str(error))
+            request_error = errors.RequestError(source_text, voice, str(error))
+            if isinstance(error, botocore.exceptions.ClientError):
+                # keep the status code, so that throttling and server errors get retried
+                if error.response.get('Error', {}).get('Code') in self.THROTTLING_ERROR_CODES:
+                    request_error.status_code = 429
+                else:
+                    request_error.status_code = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', None)
+            raise request_error
 
         if "AudioStream" in response:
             with contextlib.closing(response["AudioStream"]) as stream:
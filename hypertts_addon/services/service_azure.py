@@ -1,7 +1,4 @@
 import sys
-import requests
-import datetime
-import time
 
 from hypertts_addon import voice
 from hypertts_addon import service
@@ -15,14 +12,18 @@ class Azure(service.ServiceBase):
     CONFIG_REGION = 'region'
     CONFIG_API_KEY = 'api_key'
     CONFIG_THROTTLE_SECONDS = 'throttle_seconds'
+    # azure access tokens are valid for 10 minutes
+    TOKEN_LIFETIME_SECONDS = 600
 
     def __init__(self):
         service.ServiceBase.__init__(self)
-        self.access_token = None
 
     def cloudlanguagetools_enabled(self):
         return True
 
+    def default_batch_concurrency(self) -> int:
+        return 4
+
     @property
     def service_type(self) -> constants.ServiceType:
         return constants.ServiceType.tts
@@ -59,10 +60,15 @@ class Azure(service.ServiceBase):
                 'germanywestcentral'
             ],
             self.CONFIG_API_KEY: str,
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int,
+            self.CONFIG_BATCH_CONCURRENCY: int
         }
 
     def get_token(self, subscription_key, region):
+        # returns (token, lifetime in seconds), called by the token manager
         if len(subscription_key) == 0:
             raise ValueError("subscription key required")
 
@@ -70,20 +76,14 @@ class Azure(service.ServiceBase):
         headers = {
             'Ocp-Apim-Subscription-Key': subscription_key
         }
-        response = requests.post(fetch_token_url, headers=headers)
-        self.access_token = str(response.text)
-        self.access_token_timestamp = datetime.datetime.now()
+        response = self.http_post(fetch_token_url, headers=headers)
+        response.raise_for_status()
         logger.debug(f'requested access_token')
+        return str(response.text), self.TOKEN_LIFETIME_SECONDS
 
-    def token_refresh_required(self):
-        if self.access_token == None:
-            logger.debug(f'no token, must request')
-            return True
-        time_diff = datetime.datetime.now() - self.access_token_timestamp
-        if time_diff.total_seconds() > 300:
-            logger.debug(f'time_diff: {time_diff}, requesting token')
-            return True
-        return False
+    def get_access_token(self, subscription_key, region):
+        return self.get_token_manager().get_token(self.name, (region, subscription_key),
+            lambda: self.get_token(subscription_key, region))
 
     def voice_list(self):
         return self.basic_voice_list()
@@ -92,13 +92,8 @@ class Azure(service.ServiceBase):
 
         region = self.get_configuration_value_mandatory(self.CONFIG_REGION)
         subscription_key = self.get_configuration_value_mandatory(self.CONFIG_API_KEY)
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
         
-        if self.token_refresh_required():
-            self.get_token(subscription_key, region)
+        access_token = self.get_access_token(subscription_key, region)
 
         voice_name = voice.voice_key['name']
 
@@ -116,7 +111,7 @@ class Azure(service.ServiceBase):
         url_path = 'cognitiveservices/v1'
         constructed_url = base_url + url_path
         headers = {
-            'Authorization': 'Bearer ' + self.access_token,
+            'Authorization': 'Bearer ' + access_token,
             'Content-Type': 'application/ssml+xml',
             'X-Microsoft-OutputFormat': audio_format_map[audio_format],
             'User-Agent': 'anki-hyper-tts'
@@ -128,10 +123,13 @@ class Azure(service.ServiceBase):
         
         body = ssml_str.encode(encoding='utf-8')
 
-        response = requests.post(constructed_url, headers=headers, data=body, timeout=constants.RequestTimeout)
+        response = self.http_post(constructed_url, headers=headers, data=body, timeout=constants.RequestTimeout)
         if response.status_code != 200:
             error_message = f'status code {response.status_code}: {response.reason}'
             logger.error(error_message)
-            raise errors.RequestError(source_text, voice, error_message)
+            if response.status_code == 401:
+                # the token was revoked, request a new one next time
+                self.get_token_manager().invalidate(self.name, (region, subscription_key))
+            raise errors.RequestError(source_text, voice, error_message, response=response)
 
         return response.content
@@ -1,6 +1,5 @@
 import sys
 import re
-import requests
 import bs4
 
 from hypertts_addon import voice
@@ -8,6 +7,7 @@ from hypertts_addon import service
 from hypertts_addon import errors
 from hypertts_addon import constants
 from hypertts_addon import languages
+from hypertts_addon import page_cache
 from hypertts_addon import logging_utils
 logger = logging_utils.get_child_logger(__name__)
 
@@ -15,9 +15,14 @@ class Cambridge(service.ServiceBase):
     # https://dictionary.cambridge.org/dictionary/english/vehicle
     WEBSITE = 'https://dictionary.cambridge.org'
     SEARCH_URL = WEBSITE + '/dictionary/english/'
+    HEADERS = {
+        'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0'
+    }
 
     def __init__(self):
         service.ServiceBase.__init__(self)
+        # the UK and US voices share the page of each word
+        self.page_cache = page_cache.PageCache()
 
     @property
     def service_type(self) -> constants.ServiceType:
@@ -44,33 +49,45 @@ class Cambridge(service.ServiceBase):
             self.build_voice('US', languages.AudioLanguage.en_US, 'us')
         ]
 
-    def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
-        headers = {
-		    'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0'
-        }
-
-        complete_url = self.SEARCH_URL + source_text
+    def get_sound_urls(self, complete_url, source_text, voice: voice.TtsVoice_v3):
+        # returns {accent: sound url} for the accents found on the page
         logger.info(f'loading url: {complete_url}')
-        response = requests.get(complete_url, headers=headers)
+        response = self.http_get(complete_url, headers=self.HEADERS)
+        self.check_dictionary_response(source_text, voice, response)
+
+        # only the pronunciation sections get parsed, not the whole page
+        # <span class="uk dpron-i ">
+        parse_only = bs4.SoupStrainer('span', {'class': re.compile(r'\bdpron-i\b')})
+        soup = bs4.BeautifulSoup(response.content, 'html.parser', parse_only=parse_only)
 
-        soup = bs4.BeautifulSoup(response.content, 'html.parser')
+        sound_urls = {}
+        for span_pronunciation_section in soup.find_all('span', {'class': 'dpron-i'}):
+            for accent in ['uk', 'us']:
+                # only the first section of each accent is considered
+                if accent in span_pronunciation_section['class'] and accent not in sound_urls:
+                    source_tag = span_pronunciation_section.find('source', {'type': 'audio/mpeg'})
+                    sound_urls[accent] = self.WEBSITE + source_tag['src'] if source_tag != None else None
+        logger.debug(f'sound_urls: {sound_urls}')
+        return sound_urls
 
-        section_class_map = {
-            languages.AudioLanguage.en_GB: 'uk dpron-i',
-            languages.AudioLanguage.en_US: 'us dpron-i',
+    def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
+        complete_url = self.SEARCH_URL + source_text
+        sound_urls = self.page_cache.get(complete_url, lambda: self.get_sound_urls(complete_url, source_text, voice))
+        if sound_urls == None:
+            # the dictionary doesn't have a page for this word
+            raise errors.AudioNotFoundError(source_text, voice)
+
+        accent_map = {
+            languages.AudioLanguage.en_GB: 'uk',
+            languages.AudioLanguage.en_US: 'us',
         }
-        wanted_class = section_class_map[voice.audio_languages[0]]
-        logger.debug(f'wanted_class: [{wanted_class}]')
-        
-        # <span class="uk dpron-i ">
-        span_pronunciation_section = soup.find('span', {'class': wanted_class})
-        logger.debug(f'span_pronunciation_section: {span_pronunciation_section}')
-        if span_pronunciation_section != None:
-            source_tag = span_pronunciation_section.find('source', {'type': 'audio/mpeg'})
-            if source_tag != None:
-                sound_url = self.WEBSITE + source_tag['src']
-                response = requests.get(sound_url, headers=headers)
-                return response.content                
+        wanted_accent = accent_map[voice.audio_languages[0]]
+        logger.debug(f'wanted_accent: [{wanted_accent}]')
+
+        sound_url = sound_urls.get(wanted_accent, None)
+        if sound_url != None:
+            response = self.http_get(sound_url, headers=self.HEADERS)
+            return response.content                
 
         # if we couldn't locate the source tag, raise notfound
-        raise errors.AudioNotFoundError(source_text, voice)
\ No newline at end of file
+        raise errors.AudioNotFoundError(source_text, voice)
@@ -1,5 +1,4 @@
 import sys
-import requests
 import base64
 
 from hypertts_addon import voice
@@ -12,10 +11,11 @@ logger = logging_utils.get_child_logger(__name__)
 class CereProc(service.ServiceBase):
     CONFIG_USERNAME = 'username'
     CONFIG_PASSWORD = 'password'
+    # cerevoice access tokens are valid for an hour, refresh them well before
+    TOKEN_LIFETIME_SECONDS = 1800
 
     def __init__(self):
         service.ServiceBase.__init__(self)
-        self.access_token = None
 
     def cloudlanguagetools_enabled(self):
         return True
@@ -34,19 +34,29 @@ class CereProc(service.ServiceBase):
             self.CONFIG_PASSWORD: str
         }
 
-    def get_access_token(self):
-        username = self.get_configuration_value_mandatory(self.CONFIG_USERNAME)
-        password = self.get_configuration_value_mandatory(self.CONFIG_PASSWORD)
+    def request_access_token(self, username, password):
+        # returns (token, lifetime in seconds), called by the token manager
         combined = f'{username}:{password}'
         auth_string = base64.b64encode(combined.encode('utf-8')).decode('utf-8')
         headers = {'authorization': f'Basic {auth_string}'}
 
         auth_url = 'https://api.cerevoice.com/v2/auth'
-        response = requests.get(auth_url, headers=headers, 
+        response = self.http_get(auth_url, headers=headers, 
             timeout=constants.RequestTimeout)
+        response.raise_for_status()
 
         access_token = response.json()['access_token']        
-        return access_token
+        return access_token, self.TOKEN_LIFETIME_SECONDS
+
+    def get_account(self):
+        return (self.get_configuration_value_mandatory(self.CONFIG_USERNAME),
+            self.get_configuration_value_mandatory(self.CONFIG_PASSWORD))
+
+    def get_access_token(self):
+        # cached, the auth endpoint is only queried when the token is about to expire
+        username, password = self.get_account()
+        return self.get_token_manager().get_token(self.name, (username, password),
+            lambda: self.request_access_token(username, password))
     
     def get_auth_headers(self):
         headers={'Authorization': f'Bearer {self.get_access_token()}'}
@@ -64,11 +74,14 @@ class CereProc(service.ServiceBase):
 <speak xmlns="http://www.w3.org/2001/10/synthesis">{source_text}</speak>""".encode(encoding='utf-8')
 
         # logger.debug(f'querying url: {url}')
-        response = requests.post(url, data=ssml_text, headers=self.get_auth_headers(), timeout=constants.RequestTimeout)
+        response = self.http_post(url, data=ssml_text, headers=self.get_auth_headers(), timeout=constants.RequestTimeout)
 
         if response.status_code == 200:
             return response.content
 
         # otherwise, an error occured
+        if response.status_code == 401:
+            # the token was revoked, request a new one next time
+            self.get_token_manager().invalidate(self.name, self.get_account())
         error_message = f"status code: {response.status_code} reason: {response.reason}"
-        raise errors.RequestError(source_text, voice, error_message)
\ No newline at end of file
+        raise errors.RequestError(source_text, voice, error_message, response=response)
\ No newline at end of file
@@ -1,6 +1,5 @@
 import sys
 import re
-import requests
 import bs4
 
 from hypertts_addon import voice
@@ -49,7 +48,8 @@ class Duden(service.ServiceBase):
         }
 
         full_url = self.SEARCH_URL + source_text
-        response = requests.get(full_url, headers=headers)
+        response = self.http_get(full_url, headers=headers)
+        self.check_dictionary_response(source_text, voice, response)
 
         soup = bs4.BeautifulSoup(response.content, 'html.parser')
 
@@ -58,7 +58,7 @@ class Duden(service.ServiceBase):
         if sound_a_tag != None:
             sound_url = sound_a_tag['href']
             logger.info(f'downloading url {sound_url}')
-            response = requests.get(sound_url, headers=headers)
+            response = self.http_get(sound_url, headers=headers)
             return response.content
         else:
             logger.warning(f'could not find audio for {source_text} (source tag not found)')        
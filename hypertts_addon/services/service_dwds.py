@@ -1,6 +1,5 @@
 import sys
 import re
-import requests
 import bs4
 
 from hypertts_addon import voice
@@ -57,7 +56,8 @@ class DigitalesWorterbuchDeutschenSprache(service.ServiceBase):
         }
 
         full_url = self.SEARCH_URL + source_text
-        response = requests.get(full_url, headers=headers)
+        response = self.http_get(full_url, headers=headers)
+        self.check_dictionary_response(source_text, voice, response)
 
         soup = bs4.BeautifulSoup(response.content, 'html.parser')
 
@@ -66,7 +66,7 @@ class DigitalesWorterbuchDeutschenSprache(service.ServiceBase):
         if source_tag != None:
             sound_url = source_tag['src']
             logger.info(f'downloading url {sound_url}')
-            response = requests.get(sound_url, headers=headers)
+            response = self.http_get(sound_url, headers=headers)
             return response.content
         else:
             logger.warning(f'could not find audio for {source_text} (source tag not found)')
@@ -1,5 +1,4 @@
 import sys
-import requests
 
 
 from hypertts_addon import voice
@@ -19,6 +18,9 @@ class ElevenLabs(service.ServiceBase):
     def cloudlanguagetools_enabled(self):
         return True
 
+    def default_batch_concurrency(self) -> int:
+        return 2
+
     @property
     def service_type(self) -> constants.ServiceType:
         return constants.ServiceType.tts
@@ -29,7 +31,8 @@ class ElevenLabs(service.ServiceBase):
 
     def configuration_options(self):
         return {
-            self.CONFIG_API_KEY: str
+            self.CONFIG_API_KEY: str,
+            self.CONFIG_BATCH_CONCURRENCY: int
         }
 
     def configure(self, config):
@@ -40,6 +43,12 @@ class ElevenLabs(service.ServiceBase):
         return self.basic_voice_list()
 
     def get_tts_audio(self, source_text, voice: voice.VoiceBase, voice_options):
+        return self.request_audio(source_text, voice, voice_options, False).content
+
+    def write_tts_audio(self, source_text, voice: voice.VoiceBase, voice_options, audio_file):
+        self.write_response_audio(self.request_audio(source_text, voice, voice_options, True), audio_file)
+
+    def request_audio(self, source_text, voice: voice.VoiceBase, voice_options, stream):
         api_key = self.get_configuration_value_mandatory(self.CONFIG_API_KEY)
 
         voice_id = voice.voice_key['voice_id']
@@ -60,7 +69,7 @@ class ElevenLabs(service.ServiceBase):
             }
         }
 
-        response = requests.post(url, json=data, headers=headers)
+        response = self.http_post(url, json=data, headers=headers, stream=stream)
         if response.status_code != 200:
             error_message = f'{self.name}: error processing TTS request: {response.status_code} {response.text}'
             if response.status_code in [401]:
@@ -68,8 +77,9 @@ class ElevenLabs(service.ServiceBase):
                 logger.warning(error_message)
             else:
                 logger.error(error_message)
-            raise errors.RequestError(source_text, voice, error_message)
+            response.close()
+            raise errors.RequestError(source_text, voice, error_message, response=response)
 
         response.raise_for_status()
         
-        return response.content
+        return response
@@ -1,5 +1,4 @@
 import sys
-import requests
 import pprint
 import json
 import cachetools
@@ -99,7 +98,7 @@ class ElevenLabsCustom(service.ServiceBase):
     def voice_list_cached(self):
         # get the list of models
         url = "https://api.elevenlabs.io/v1/models"
-        response = requests.get(url, headers=self.get_headers(), timeout=constants.RequestTimeout)
+        response = self.http_get(url, headers=self.get_headers(), timeout=constants.RequestTimeout)
         response.raise_for_status()
         model_data = response.json()      
         
@@ -107,7 +106,7 @@ class ElevenLabsCustom(service.ServiceBase):
         model_data = [model for model in model_data if model['can_do_text_to_speech']]
 
         url = "https://api.elevenlabs.io/v1/voices"
-        response = requests.get(url, headers=self.get_headers(), timeout=constants.RequestTimeout)
+        response = self.http_get(url, headers=self.get_headers(), timeout=constants.RequestTimeout)
         response.raise_for_status()
         voice_data = response.json()['voices']
         
@@ -157,6 +156,12 @@ class ElevenLabsCustom(service.ServiceBase):
 
 
     def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, voice_options):
+        return self.request_audio(source_text, voice, voice_options, False).content
+
+    def write_tts_audio(self, source_text, voice: voice.TtsVoice_v3, voice_options, audio_file):
+        self.write_response_audio(self.request_audio(source_text, voice, voice_options, True), audio_file)
+
+    def request_audio(self, source_text, voice: voice.TtsVoice_v3, voice_options, stream):
 
         voice_id = voice.voice_key['voice_id']
         url = f'https://api.elevenlabs.io/v1/text-to-speech/{voice_id}'
@@ -173,7 +178,7 @@ class ElevenLabsCustom(service.ServiceBase):
             }
         }
 
-        response = requests.post(url, json=data, headers=headers, timeout=constants.RequestTimeout)
+        response = self.http_post(url, json=data, headers=headers, timeout=constants.RequestTimeout, stream=stream)
         if response.status_code != 200:
             error_message = f'{self.name}: error processing TTS request: {response.status_code} {response.text}'
             if response.status_code in [401]:
@@ -181,7 +186,8 @@ class ElevenLabsCustom(service.ServiceBase):
                 logger.warning(error_message)
             else:
                 logger.error(error_message)
-            raise errors.RequestError(source_text, voice, error_message)
+            response.close()
+            raise errors.RequestError(source_text, voice, error_message, response=response)
         response.raise_for_status()
         
-        return response.content
+        return response
@@ -1,7 +1,5 @@
 import sys
-import requests
 import datetime
-import time
 import urllib
 import json
 
@@ -47,7 +45,10 @@ class Forvo(service.ServiceBase):
                 self.CONFIG_API_URL_COMMERCIAL,
                 self.CONFIG_API_URL_CORPORATE,
             ],
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int
         }
 
 
@@ -58,10 +59,6 @@ class Forvo(service.ServiceBase):
 
         api_key = self.get_configuration_value_mandatory(self.CONFIG_API_KEY)
         api_url = self.get_configuration_value_optional(self.CONFIG_API_URL, self.CONFIG_API_URL_FREE)
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
 
         # prevent getting blocked by cloudflare
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:85.0) Gecko/20100101 Firefox/85.0'}
@@ -92,7 +89,7 @@ class Forvo(service.ServiceBase):
 
         # 2024/08: forvo's certificate is invalid from what I can tell, there's an open support request via email
         verify_ssl_certificate=False
-        response = requests.get(url, headers=headers, timeout=constants.RequestTimeout, verify=verify_ssl_certificate)
+        response = self.http_get(url, headers=headers, timeout=constants.RequestTimeout, verify=verify_ssl_certificate)
         if response.status_code == 200:
             try:
                 data = response.json()
@@ -106,8 +103,8 @@ class Forvo(service.ServiceBase):
             if len(items) == 0:
                 raise errors.AudioNotFoundError(source_text, voice)
             audio_url = items[0]['pathmp3']
-            audio_request = requests.get(audio_url, headers=headers, timeout=constants.RequestTimeout, verify=verify_ssl_certificate)
+            audio_request = self.http_get(audio_url, headers=headers, timeout=constants.RequestTimeout, verify=verify_ssl_certificate)
             return audio_request.content
 
         error_message = f'status_code: {response.status_code} response: {response.content}'
-        raise errors.RequestError(source_text, voice, error_message)
+        raise errors.RequestError(source_text, voice, error_message, response=response)
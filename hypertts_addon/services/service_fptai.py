@@ -1,5 +1,4 @@
 import sys
-import requests
 import time
 
 
@@ -49,7 +48,7 @@ class FptAi(service.ServiceBase):
         }
         if 'speed' in options:
             headers['speed'] = str(options.get('speed'))
-        response = requests.post(api_url, headers=headers, data=body.encode('utf-8'), 
+        response = self.http_post(api_url, headers=headers, data=body.encode('utf-8'), 
             timeout=constants.RequestTimeout)
 
         if response.status_code == 200:
@@ -65,14 +64,14 @@ class FptAi(service.ServiceBase):
             while max_tries > 0:
                 time.sleep(wait_time)
                 logger.debug(f'checking whether audio is available on {async_url}')
-                response = requests.get(async_url, allow_redirects=True, timeout=constants.RequestTimeout)
+                response = self.http_get(async_url, allow_redirects=True, timeout=constants.RequestTimeout)
                 if response.status_code == 200 and len(response.content) > 0:
                     return response.content
                 wait_time = wait_time * 2
                 max_tries -= 1            
             
             error_message = f'could not retrieve audio after {total_tries} tries (url {async_url})'
-            raise errors.RequestError(source_text, voice, error_message)
+            raise errors.RequestError(source_text, voice, error_message, response=response)
 
         error_message = f'could not retrieve FPT.AI audio: {response.content}'
-        raise errors.RequestError(source_text, voice, error_message)
\ No newline at end of file
+        raise errors.RequestError(source_text, voice, error_message, response=response)
\ No newline at end of file
@@ -1,7 +1,5 @@
 import sys
-import requests
 import base64
-import time
 
 
 from hypertts_addon import voice
@@ -23,6 +21,9 @@ class Google(service.ServiceBase):
     def cloudlanguagetools_enabled(self):
         return True
 
+    def default_batch_concurrency(self) -> int:
+        return 4
+
     @property
     def service_type(self) -> constants.ServiceType:
         return constants.ServiceType.tts
@@ -35,7 +36,11 @@ class Google(service.ServiceBase):
         return {
             self.CONFIG_API_KEY: str,
             self.CONFIG_EXPLORER_API_KEY: bool,
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int,
+            self.CONFIG_BATCH_CONCURRENCY: int
         }
 
     def voice_list(self):
@@ -45,10 +50,6 @@ class Google(service.ServiceBase):
         # configuration options
         api_key = self.get_configuration_value_mandatory(self.CONFIG_API_KEY)
         is_explorer_api_key = self.get_configuration_value_optional(self.CONFIG_EXPLORER_API_KEY, False)
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
 
         audio_format_str = voice_options.get(options.AUDIO_FORMAT_PARAMETER, options.AudioFormat.mp3.name)
         audio_format = options.AudioFormat[audio_format_str]
@@ -77,14 +78,14 @@ class Google(service.ServiceBase):
         headers = {}
         if is_explorer_api_key:
             headers['x-origin'] = 'https://explorer.apis.google.com'
-        response = requests.post(f"https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}", json=payload, headers=headers,
+        response = self.http_post(f"https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}", json=payload, headers=headers,
             timeout=constants.RequestTimeout)
         
         if response.status_code != 200:
             data = response.json()
             error_message = data.get('error', {}).get('message', str(data))
             logger.warning(error_message)
-            raise errors.RequestError(source_text, voice, error_message)
+            raise errors.RequestError(source_text, voice, error_message, response=response)
 
         data = response.json()
         encoded = data['audioContent']
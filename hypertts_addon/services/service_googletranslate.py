@@ -1,5 +1,4 @@
 import sys
-import time
 import gtts
 import io
 from typing import List
@@ -37,7 +36,10 @@ class GoogleTranslate(service.ServiceBase):
 
     def configuration_options(self):
         return {
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int
         }
 
     @property
@@ -79,18 +81,15 @@ class GoogleTranslate(service.ServiceBase):
         return voices
 
     def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
-        # configuration options
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
+        buffer = io.BytesIO()
+        self.write_tts_audio(source_text, voice, options, buffer)
+        return buffer.getbuffer()
 
+    def write_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options, audio_file):
         try:
             tts = gtts.gTTS(text=source_text, lang=voice.voice_key)
-            buffer = io.BytesIO()
-            tts.write_to_fp(buffer)
-
-            return buffer.getbuffer()
+            # written one sentence at a time
+            tts.write_to_fp(audio_file)
         except gtts.gTTSError as e:
             logger.warning(f'exception while retrieving sound for {source_text}: {e}')
             # this error will be handled, and not reported as unusual
@@ -1,5 +1,4 @@
 import sys
-import requests
 import json
 
 from hypertts_addon import voice
@@ -55,10 +54,14 @@ class Naver(service.ServiceBase):
         }
 
         # alternate_data = 'speaker=clara&text=vehicle&volume=0&speed=0&pitch=0&format=mp3'
-        response = requests.post(url, data=data, headers=headers, timeout=constants.RequestTimeout)
+        response = self.http_post(url, data=data, headers=headers, timeout=constants.RequestTimeout)
         if response.status_code == 200:
             return response.content
 
-        response_data = response.json()
+        try:
+            response_data = response.json()
+        except ValueError:
+            # gateway errors don't come back as json
+            response_data = response.content
         error_message = f'Status code: {response.status_code}: {response_data}'
-        raise errors.RequestError(source_text, voice, error_message)
+        raise errors.RequestError(source_text, voice, error_message, response=response)
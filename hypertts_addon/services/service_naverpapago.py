@@ -1,7 +1,5 @@
 import sys
-import requests
 import base64
-import time
 import uuid
 import hmac
 import hashlib
@@ -31,7 +29,10 @@ class NaverPapago(service.ServiceBase):
 
     def configuration_options(self):
         return {
-            self.CONFIG_THROTTLE_SECONDS: float
+            self.CONFIG_THROTTLE_SECONDS: float,
+            self.CONFIG_REQUESTS_PER_SECOND: float,
+            self.CONFIG_CHARACTERS_PER_MINUTE: int,
+            self.CONFIG_MAX_IN_FLIGHT: int
         }
 
     @property
@@ -114,11 +115,6 @@ class NaverPapago(service.ServiceBase):
         }
 
     def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
-        # configuration options
-        throttle_seconds = self.get_configuration_value_optional(self.CONFIG_THROTTLE_SECONDS, 0)
-        if throttle_seconds > 0:
-            time.sleep(throttle_seconds)
-
         url = self.TRANSLATE_MKID
         params = {
             'alpha': 0,
@@ -129,9 +125,9 @@ class NaverPapago(service.ServiceBase):
         }
         headers = self.generate_headers()
         logger.info(f'executing POST request on {url} with headers={headers}, data={params}')
-        response = requests.post(url, headers=headers, data=params)
+        response = self.http_post(url, headers=headers, data=params)
         if response.status_code != 200:
-            raise errors.RequestError(source_text, voice, f'got status_code {response.status_code} from {url}: {response.content}')
+            raise errors.RequestError(source_text, voice, f'got status_code {response.status_code} from {url}: {response.content}', response=response)
 
         response_data = response.json()
         sound_id = response_data['id']
@@ -143,7 +139,7 @@ class NaverPapago(service.ServiceBase):
         final_url = self.TRANSLATE_ENDPOINT + sound_id
         logger.info(f'final_url: {final_url}')
 
-        response = requests.get(final_url)
+        response = self.http_get(final_url)
         if response.status_code != 200:
-            raise errors.RequestError(source_text, voice, f'got status_code {response.status_code} from {final_url}: {response.content}')
+            raise errors.RequestError(source_text, voice, f'got status_code {response.status_code} from {final_url}: {response.content}', response=response)
         return response.content
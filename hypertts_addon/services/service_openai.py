@@ -19,6 +19,9 @@ class OpenAI(service.ServiceBase):
     def cloudlanguagetools_enabled(self):
         return True
 
+    def default_batch_concurrency(self) -> int:
+        return 4
+
     @property
     def service_type(self) -> constants.ServiceType:
         return constants.ServiceType.tts
@@ -29,7 +32,8 @@ class OpenAI(service.ServiceBase):
 
     def configuration_options(self):
         return {
-            self.CONFIG_API_KEY: str
+            self.CONFIG_API_KEY: str,
+            self.CONFIG_BATCH_CONCURRENCY: int
         }
 
     def configure(self, config):
@@ -40,6 +44,12 @@ class OpenAI(service.ServiceBase):
         return self.basic_voice_list()
 
     def get_tts_audio(self, source_text, voice: voice.VoiceBase, voice_options):
+        return self.request_audio(source_text, voice, voice_options, False).content
+
+    def write_tts_audio(self, source_text, voice: voice.VoiceBase, voice_options, audio_file):
+        self.write_response_audio(self.request_audio(source_text, voice, voice_options, True), audio_file)
+
+    def request_audio(self, source_text, voice: voice.VoiceBase, voice_options, stream):
 
         url = 'https://api.openai.com/v1/audio/speech'
 
@@ -67,7 +77,12 @@ class OpenAI(service.ServiceBase):
             'speed': speed
         }
 
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
+        response = self.http_post(url, json=data, headers=headers, stream=stream)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            # the body of a streamed response wasn't read, release the connection
+            response.close()
+            raise
         
-        return response.content
+        return response
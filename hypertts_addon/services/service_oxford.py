@@ -1,6 +1,5 @@
 import sys
 import re
-import requests
 import bs4
 
 from hypertts_addon import voice
@@ -8,14 +7,20 @@ from hypertts_addon import service
 from hypertts_addon import errors
 from hypertts_addon import constants
 from hypertts_addon import languages
+from hypertts_addon import page_cache
 from hypertts_addon import logging_utils
 logger = logging_utils.get_child_logger(__name__)
 
 class Oxford(service.ServiceBase):
     URL_BASE = 'https://www.oxfordlearnersdictionaries.com/definition/english/'
+    HEADERS = {
+        'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0'
+    }
 
     def __init__(self):
         service.ServiceBase.__init__(self)
+        # the en_GB and en_US voices share the page of each word
+        self.page_cache = page_cache.PageCache()
 
     @property
     def service_type(self) -> constants.ServiceType:
@@ -42,16 +47,33 @@ class Oxford(service.ServiceBase):
             self.build_voice(languages.AudioLanguage.en_US, languages.AudioLanguage.en_US.name),
         ]
 
-    def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
-        headers = {
-		    'User-Agent':'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:97.0) Gecko/20100101 Firefox/97.0'
-        }
-        url = self.URL_BASE + source_text
+    def get_sound_urls(self, url, source_text, voice: voice.TtsVoice_v3):
+        # returns {pronunciation class: sound url} for the pronunciations found on the page
         logger.debug(f'loading url: {url}')
-        response = requests.get(url, headers=headers)
+        response = self.http_get(url, headers=self.HEADERS)
         logger.debug(f'response.status_code: {response.status_code}')
-        
-        soup = bs4.BeautifulSoup(response.content, 'html.parser')
+        self.check_dictionary_response(source_text, voice, response)
+
+        # only the audio buttons get parsed, not the whole page
+        # <div class="sound audio_play_button pron-uk icon-audio" data-src-mp3="...">
+        parse_only = bs4.SoupStrainer('div', {'class': re.compile(r'\baudio_play_button\b')})
+        soup = bs4.BeautifulSoup(response.content, 'html.parser', parse_only=parse_only)
+
+        sound_urls = {}
+        for div_pronunciation in soup.find_all('div', {'class': 'audio_play_button'}):
+            for pronunciation_class in ['pron-uk', 'pron-us']:
+                # only the first button of each pronunciation is considered
+                if pronunciation_class in div_pronunciation['class'] and pronunciation_class not in sound_urls:
+                    sound_urls[pronunciation_class] = div_pronunciation.get('data-src-mp3', None)
+        logger.debug(f'sound_urls: {sound_urls}')
+        return sound_urls
+
+    def get_tts_audio(self, source_text, voice: voice.TtsVoice_v3, options):
+        url = self.URL_BASE + source_text
+        sound_urls = self.page_cache.get(url, lambda: self.get_sound_urls(url, source_text, voice))
+        if sound_urls == None:
+            # the dictionary doesn't have a page for this word
+            raise errors.AudioNotFoundError(source_text, voice)
 
         section_class_map = {
             languages.AudioLanguage.en_GB: 'pron-uk',
@@ -60,14 +82,10 @@ class Oxford(service.ServiceBase):
         wanted_class = section_class_map[voice.audio_languages[0]]
         logger.debug(f'wanted_class: [{wanted_class}]')
 
-        # <span class="uk dpron-i ">
-        div_pronunciation = soup.find('div', {'class': f'sound audio_play_button {wanted_class} icon-audio'})
-        # logger.debug(f'span_pronunciation_section: {span_pronunciation_section}')
-        if div_pronunciation != None:
-            sound_url = div_pronunciation['data-src-mp3']
-            if sound_url != None:
-                response = requests.get(sound_url, headers=headers)
-                return response.content                
+        sound_url = sound_urls.get(wanted_class, None)
+        if sound_url != None:
+            response = self.http_get(sound_url, headers=self.HEADERS)
+            return response.content                
 
         # if we couldn't locate the source tag, raise notfound
         raise errors.AudioNotFoundError(source_text, voice)
@@ -1,6 +1,5 @@
 import sys
 import re
-import requests
 import bs4
 
 from hypertts_addon import voice
@@ -52,6 +51,6 @@ class SpanishDict(service.ServiceBase):
 
         url = f'https://audio1.spanishdict.com/audio?lang={language}&text={source_text}'
         logger.debug(f'opening url {url}')
-        response = requests.get(url, headers=headers)
+        response = self.http_get(url, headers=headers)
 
         return response.content
\ No newline at end of file
@@ -1,5 +1,4 @@
 import sys
-import requests
 import urllib
 import hashlib
 import time
@@ -59,7 +58,7 @@ class VocalWare(service.ServiceBase):
 
         retry_count = 3
         while retry_count > 0:
-            response = requests.get(url, timeout=constants.RequestTimeout)
+            response = self.http_get(url, timeout=constants.RequestTimeout)
             if response.status_code == 200:
                 return response.content
             retry_count -= 1
@@ -72,4 +71,4 @@ class VocalWare(service.ServiceBase):
         if response.status_code == 503:
             error_message = f'VocalWare service temporarily unavailable (503)'
 
-        raise errors.RequestError(source_text, voice, error_message)
+        raise errors.RequestError(source_text, voice, error_message, response=response)
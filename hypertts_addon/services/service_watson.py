@@ -1,5 +1,4 @@
 import sys
-import requests
 import json
 
 from hypertts_addon import voice
@@ -53,11 +52,11 @@ class Watson(service.ServiceBase):
             'text': source_text
         }
 
-        response = requests.post(constructed_url, data=json.dumps(data), auth=('apikey', speech_key), headers=headers, timeout=constants.RequestTimeout)
+        response = self.http_post(constructed_url, data=json.dumps(data), auth=('apikey', speech_key), headers=headers, timeout=constants.RequestTimeout)
 
         if response.status_code == 200:
             return response.content
 
         # otherwise, an error occured
         error_message = f"Status code: {response.status_code} reason: {response.reason}"
-        raise errors.RequestError(source_text, voice, error_message)
\ No newline at end of file
+        raise errors.RequestError(source_text, voice, error_message, response=response)
\ No newline at end of file
@@ -0,0 +1,53 @@
+import threading
+
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class InFlightCall():
+    def __init__(self):
+        self.done_event = threading.Event()
+        self.result = None
+        self.exception = None
+        self.waiter_count = 0
+
+
+class SingleFlight():
+    """
+    concurrent calls with the same key run the function only once: the first caller runs it,
+    the others wait for it to finish and get the same result (or the same exception)
+    """
+    def __init__(self):
+        self.in_flight_calls = {}
+        self.lock = threading.Lock()
+
+    def call(self, key, fn):
+        with self.lock:
+            in_flight_call = self.in_flight_calls.get(key, None)
+            first_caller = in_flight_call == None
+            if first_caller:
+                in_flight_call = InFlightCall()
+                self.in_flight_calls[key] = in_flight_call
+            else:
+                in_flight_call.waiter_count += 1
+        if not first_caller:
+            return self.wait(key, in_flight_call)
+
+        try:
+            in_flight_call.result = fn()
+            return in_flight_call.result
+        except Exception as e:
+            in_flight_call.exception = e
+            raise e
+        finally:
+            with self.lock:
+                del self.in_flight_calls[key]
+            in_flight_call.done_event.set()
+
+    def wait(self, key, in_flight_call):
+        logger.debug(f'waiting for in flight call {key}')
+        in_flight_call.done_event.wait()
+        # shared result, this caller didn't run fn
+        if in_flight_call.exception != None:
+            raise in_flight_call.exception
+        return in_flight_call.result
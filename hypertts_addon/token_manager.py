@@ -0,0 +1,98 @@
+"""
+access tokens of the services which authenticate with a short lived token (Azure, AliCloud, CereProc).
+tokens are cached per service and account, and refreshed in the background when they get close to
+expiring, so that the audio requests don't wait on the auth endpoint. when no valid token is cached,
+a single request to the auth endpoint is made, the concurrent workers wait for it and share the token.
+"""
+
+import time
+import threading
+import concurrent.futures
+
+from . import constants
+from . import singleflight
+from . import logging_utils
+logger = logging_utils.get_child_logger(__name__)
+
+
+class AccessToken():
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class TokenManager():
+    def __init__(self, clock=time.time,
+            refresh_window_seconds=constants.TOKEN_REFRESH_WINDOW_SECONDS,
+            expiry_margin_seconds=constants.TOKEN_EXPIRY_MARGIN_SECONDS):
+        self.clock = clock
+        # refresh in the background when the token expires within this window
+        self.refresh_window_seconds = refresh_window_seconds
+        # don't use a token which expires within this margin, the request could reach the service after it expired
+        self.expiry_margin_seconds = expiry_margin_seconds
+        # (service, account) -> AccessToken
+        self.tokens = {}
+        # (service, account) -> future of the background refresh
+        self.refresh_futures = {}
+        self.lock = threading.Lock()
+        self.single_flight = singleflight.SingleFlight()
+
+    def get_token(self, service_name, account, fetch_fn):
+        """
+        returns the cached token for this service and account, fetching a new one if required.
+        fetch_fn requests a token from the auth endpoint, and returns (token value, lifetime in seconds).
+        account identifies the credentials, it's never logged.
+        """
+        key = (service_name, account)
+        with self.lock:
+            access_token = self.tokens.get(key, None)
+        current_time = self.clock()
+        if access_token == None or access_token.expires_at - self.expiry_margin_seconds <= current_time:
+            return self.single_flight.call(key, lambda: self.fetch_token(key, fetch_fn)).value
+        if access_token.expires_at - self.refresh_window_seconds <= current_time:
+            self.start_background_refresh(key, fetch_fn)
+        return access_token.value
+
+    def fetch_token(self, key, fetch_fn) -> AccessToken:
+        service_name, account = key
+        logger.info(f'requesting access token for {service_name}')
+        # the lifetime starts when the request is sent
+        request_time = self.clock()
+        value, lifetime_seconds = fetch_fn()
+        access_token = AccessToken(value, request_time + lifetime_seconds)
+        with self.lock:
+            self.tokens[key] = access_token
+        return access_token
+
+    def start_background_refresh(self, key, fetch_fn):
+        with self.lock:
+            refresh_future = self.refresh_futures.get(key, None)
+            if refresh_future != None and not refresh_future.done():
+                # already refreshing
+                return
+            refresh_future = concurrent.futures.Future()
+            self.refresh_futures[key] = refresh_future
+        # daemon thread, doesn't keep Anki from exiting while waiting on the auth endpoint
+        thread = threading.Thread(target=self.refresh_token, args=(key, fetch_fn, refresh_future), name='hypertts-token', daemon=True)
+        thread.start()
+
+    def refresh_token(self, key, fetch_fn, refresh_future):
+        service_name, account = key
+        try:
+            self.single_flight.call(key, lambda: self.fetch_token(key, fetch_fn))
+        except Exception as e:
+            # the current token is still valid, the next request will try again
+            logger.warning(f'could not refresh access token for {service_name}: {e}')
+        finally:
+            refresh_future.set_result(None)
+
+    def invalidate(self, service_name, account):
+        # the service rejected the token, the next request fetches a new one
+        with self.lock:
+            self.tokens.pop((service_name, account), None)
+
+    def shutdown(self):
+        # the profile is closing, its tokens are forgotten. refreshes in progress are left to finish on their own
+        with self.lock:
+            self.tokens = {}
+            self.refresh_futures = {}
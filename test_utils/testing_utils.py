@@ -26,7 +26,8 @@ def create_simple_batch(hypertts_instance,
         save_preset=True, 
         voice_name='voice_a_1',
         target_field='Sound',
-        use_selection=False):
+        use_selection=False,
+        skip_up_to_date=False):
     """create simple batch config and optionally save"""
     voice_list = hypertts_instance.service_manager.full_voice_list()
     selected_voice = [x for x in voice_list if x.name == voice_name][0]
@@ -35,7 +36,7 @@ def create_simple_batch(hypertts_instance,
 
     batch = config_models.BatchConfig(hypertts_instance.anki_utils)
     source = config_models.BatchSource(mode=constants.BatchMode.simple, source_field='Chinese', use_selection=use_selection)
-    target = config_models.BatchTarget(target_field, False, True)
+    target = config_models.BatchTarget(target_field, False, True, skip_up_to_date=skip_up_to_date)
     text_processing = config_models.TextProcessing()
 
     batch.set_source(source)
@@ -50,6 +51,16 @@ def create_simple_batch(hypertts_instance,
 
     return batch    
 
+def record_tts_requests(service):
+    """wrap get_tts_audio of the service, returns the list of source texts which reach it"""
+    requested_text_list = []
+    original_get_tts_audio = service.get_tts_audio
+    def recording_get_tts_audio(source_text, voice, options):
+        requested_text_list.append(source_text)
+        return original_get_tts_audio(source_text, voice, options)
+    service.get_tts_audio = recording_get_tts_audio
+    return requested_text_list
+
 def voice_selection_voice_list_select(name: str, service: str, voices_combobox):
     for i in range(voices_combobox.count()):
         item_text = voices_combobox.itemText(i)
@@ -107,11 +118,14 @@ class MockEditor():
 
 class MockCollection():
     def __init__(self):
-        pass
+        self.update_notes_calls = []
 
     def update_note(self, note):
         pass
 
+    def update_notes(self, notes):
+        self.update_notes_calls.append(notes)
+
 class MockTextInputTypingTimer():
     def __init__(self, text_input, text_input_changed_fn):
         self.enabled = True
@@ -134,6 +148,8 @@ class MockAnkiUtils():
         self.show_loading_indicator_called = None
         self.hide_loading_indicator_called = None
         self.tooltip_messages = []
+        self.progress_bar_updates = []
+        self.progress_bar_cancel_requested = False
         self.mock_collection = MockCollection()
         self.preset_rules_status = None
 
@@ -159,6 +175,7 @@ class MockAnkiUtils():
         # responses for dialogs
         self.ask_user_bool_response = True
         self.ask_user_get_text_response = None
+        self.ask_user_save_file_response = None
         self.ask_user_choose_from_list_response = None
         self.ask_user_choose_from_list_response_string = None
 
@@ -198,6 +215,10 @@ class MockAnkiUtils():
     def get_note_by_id(self, note_id):
         return self.notes_by_id[note_id]
 
+    def get_note_fields_containing(self, text):
+        field_values_list = ['\x1f'.join(note.field_dict.values()) for note in self.notes_by_id.values()]
+        return [x for x in field_values_list if text in x]
+
 
     def get_model(self, model_id):
         # should return a dict which has flds
@@ -301,6 +322,12 @@ class MockAnkiUtils():
     def show_progress_bar(self, message):
         self.show_progress_bar_called = True
 
+    def update_progress_bar(self, message, value, max_value):
+        self.progress_bar_updates.append((message, value, max_value))
+
+    def progress_bar_want_cancel(self):
+        return self.progress_bar_cancel_requested
+
     def stop_progress_bar(self):
         self.stop_progress_bar_called = True
 
@@ -323,6 +350,9 @@ class MockAnkiUtils():
     def ask_user_get_text(self, message, parent, default, title):
         return self.ask_user_get_text_response, 1
 
+    def ask_user_save_file(self, parent, title, default_filename, file_filter):
+        return self.ask_user_save_file_response
+
     def ask_user_choose_from_list(self, parent, prompt: str, choices: list[str], startrow: int = 0) -> int:
         if self.ask_user_choose_from_list_response_string != None:
             # we need to look for the index of that string inside choices
@@ -1,4 +1,6 @@
 import re
+import time
+import threading
 import datetime
 
 from test_utils import testing_utils
@@ -6,6 +8,7 @@ from test_utils import testing_utils
 from hypertts_addon import constants
 from hypertts_addon import config_models
 from hypertts_addon import batch_status
+from hypertts_addon import batch_estimate
 from hypertts_addon import logging_utils
 
 logger = logging_utils.get_test_child_logger(__name__)
@@ -851,3 +854,382 @@ def test_priority_voices_not_found(qtbot):
 
     # make sure we got a AudioNotFoundError in the batch error manager
     assert str(batch_status_obj[0].error) == 'Audio not found in any voices for [老人家]'
+
+
+def test_concurrent_batch(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    # allow ServiceA to process several requests at once
+    hypertts_instance.service_manager.get_service('ServiceA').configure({'api_key': 'valid_key', 'batch_concurrency': 3})
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+    assert hypertts_instance.get_batch_concurrency(batch.voice_selection) == 3
+
+    # note_id_3 has an empty source field
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+
+    # notes are updated in order, the last change corresponds to the last row
+    assert listener.current_row == 4
+    assert listener.batch_ended == True
+
+    expected_source_text = {
+        config_gen.note_id_1: '老人家',
+        config_gen.note_id_2: '你好',
+        config_gen.note_id_4: '赚钱',
+        config_gen.note_id_5: '大使馆',
+    }
+    for note_id, source_text in expected_source_text.items():
+        note = hypertts_instance.anki_utils.get_note_by_id(note_id)
+        sound_tag = note.set_values['Sound']
+        audio_full_path = hypertts_instance.anki_utils.extract_sound_tag_audio_full_path(sound_tag)
+        audio_data = hypertts_instance.anki_utils.extract_mock_tts_audio(audio_full_path)
+        assert audio_data['source_text'] == source_text
+
+    assert batch_status_obj[2].status == constants.BatchNoteStatus.Error
+    assert str(batch_status_obj[2].error) == 'Source text is empty'
+    assert batch_status_obj[4].status == constants.BatchNoteStatus.Done
+
+
+def test_batch_identical_requests_grouped(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    hypertts_instance.service_manager.get_service('ServiceA').configure({'api_key': 'valid_key', 'batch_concurrency': 3})
+
+    # count the requests which actually reach the service
+    requested_text_list = testing_utils.record_tts_requests(hypertts_instance.service_manager.get_service('ServiceA'))
+
+    # note 2 and note 4 now have the same text as note 1
+    hypertts_instance.anki_utils.get_note_by_id(config_gen.note_id_2).field_dict['Chinese'] = '老人家'
+    hypertts_instance.anki_utils.get_note_by_id(config_gen.note_id_4).field_dict['Chinese'] = '老人家'
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_4, config_gen.note_id_5]
+
+    # the preview reports how many requests are saved by grouping
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.populate_batch_status_processed_text(note_id_list, batch.source, batch.text_processing, batch_status_obj)
+    assert hypertts_instance.get_batch_audio_request_count(batch_status_obj, batch.voice_selection) == (4, 2)
+
+    # in random mode, each note may get a different voice, nothing can be grouped
+    random_selection = config_models.VoiceSelectionRandom()
+    random_selection.add_voice(config_models.VoiceWithOptionsRandom(get_default_voice_id(hypertts_instance), {}))
+    assert hypertts_instance.get_batch_audio_request_count(batch_status_obj, random_selection) == (4, 4)
+
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+
+    assert sorted(requested_text_list) == sorted(['老人家', '大使馆'])
+    sound_file_1 = batch_status_obj[0].sound_file
+    assert batch_status_obj[1].sound_file == sound_file_1
+    assert batch_status_obj[2].sound_file == sound_file_1
+    assert batch_status_obj[3].sound_file != sound_file_1
+    for note_id in [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_4]:
+        note = hypertts_instance.anki_utils.get_note_by_id(note_id)
+        assert f'[sound:{sound_file_1}]' in note.set_values['Sound']
+
+
+class StopAfterNoteListener(MockBatchStatusListener):
+    # stops the batch once a given note is done, simulating the user pressing stop
+    def __init__(self, anki_utils, stop_note_id):
+        MockBatchStatusListener.__init__(self, anki_utils)
+        self.stop_note_id = stop_note_id
+        self.batch_status = None
+
+    def batch_change(self, note_id, row, total_count, start_time, current_time):
+        MockBatchStatusListener.batch_change(self, note_id, row, total_count, start_time, current_time)
+        note_status = self.batch_status.get_note_status(note_id)
+        if note_id == self.stop_note_id and note_status.status == constants.BatchNoteStatus.Done:
+            self.batch_status.stop()
+
+
+def test_batch_resume(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    requested_text_list = testing_utils.record_tts_requests(hypertts_instance.service_manager.get_service('ServiceA'))
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_4, config_gen.note_id_5]
+
+    # first run gets stopped after the second note
+    listener = StopAfterNoteListener(hypertts_instance.anki_utils, config_gen.note_id_2)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    listener.batch_status = batch_status_obj
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+
+    assert batch_status_obj[1].status == constants.BatchNoteStatus.Done
+    assert batch_status_obj[2].status != constants.BatchNoteStatus.Done
+
+    journal = hypertts_instance.get_interrupted_batch_journal(note_id_list, batch)
+    assert journal != None
+    assert journal.note_count == 4
+    assert journal.completed_note_ids == set([config_gen.note_id_1, config_gen.note_id_2])
+
+    # a different set of notes is a different batch
+    assert hypertts_instance.get_interrupted_batch_journal(note_id_list[0:3], batch) == None
+
+    # resume, the notes completed in the first run don't get processed again
+    requested_text_list.clear()
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection(), resume=True)
+
+    # audio for the remaining notes may have been requested ahead, before the first run was stopped
+    assert '老人家' not in requested_text_list
+    assert '你好' not in requested_text_list
+    for i in range(4):
+        assert batch_status_obj[i].status == constants.BatchNoteStatus.Done
+    assert batch_status_obj[0].sound_file == None
+    assert batch_status_obj[3].sound_file != None
+
+    # batch completed, nothing left to resume
+    assert hypertts_instance.get_interrupted_batch_journal(note_id_list, batch) == None
+
+
+def test_batch_note_updates_chunked(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    preferences = hypertts_instance.get_preferences()
+    preferences.batch_processing.note_update_chunk_size = 2
+    hypertts_instance.save_preferences(preferences)
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    # the third note has an empty source field and fails
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    mock_collection = testing_utils.MockCollection()
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, mock_collection)
+
+    # notes get written two at a time, the failed note isn't written
+    written_note_ids = [[note.id for note in notes] for notes in mock_collection.update_notes_calls]
+    assert written_note_ids == [
+        [config_gen.note_id_1, config_gen.note_id_2],
+        [config_gen.note_id_4, config_gen.note_id_5]]
+
+    for i in [0, 1, 3, 4]:
+        assert batch_status_obj[i].status == constants.BatchNoteStatus.Done
+        assert batch_status_obj[i].sound_file != None
+    assert batch_status_obj[2].status == constants.BatchNoteStatus.Error
+
+
+class FailingMockCollection(testing_utils.MockCollection):
+    def update_notes(self, notes):
+        raise Exception('collection is locked')
+
+
+def test_batch_note_updates_failure(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2]
+
+    reported_exceptions = []
+    hypertts_instance.anki_utils.report_unknown_exception_background = lambda exception: reported_exceptions.append(exception)
+
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, FailingMockCollection())
+
+    # the error is reported once, and shows on each note of the chunk
+    assert [str(x) for x in reported_exceptions] == ['collection is locked']
+    for i in range(2):
+        assert batch_status_obj[i].status == constants.BatchNoteStatus.Error
+        assert str(batch_status_obj[i].error) == 'Could not write the note to the collection: collection is locked'
+
+
+def test_batch_pipeline_read_ahead(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+
+    prepared_note_ids = []
+    original_prepare_batch_note_request = hypertts_instance.prepare_batch_note_request
+    def recording_prepare_batch_note_request(batch_note_request, batch):
+        prepared_note_ids.append(batch_note_request.note_id)
+        return original_prepare_batch_note_request(batch_note_request, batch)
+    hypertts_instance.prepare_batch_note_request = recording_prepare_batch_note_request
+
+    # the collection is only read from the calling thread
+    note_reader_threads = []
+    original_get_note_by_id = hypertts_instance.anki_utils.get_note_by_id
+    def recording_get_note_by_id(note_id):
+        note_reader_threads.append(threading.current_thread())
+        return original_get_note_by_id(note_id)
+    hypertts_instance.anki_utils.get_note_by_id = recording_get_note_by_id
+
+    # the first audio request is slow, the notes keep getting read in the meantime
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    prepared_count_list = []
+    original_get_tts_audio = service_a.get_tts_audio
+    def slow_get_tts_audio(source_text, voice, options):
+        if len(prepared_count_list) == 0:
+            deadline = time.time() + 5
+            while len(prepared_note_ids) < len(note_id_list) and time.time() < deadline:
+                time.sleep(0.01)
+        prepared_count_list.append(len(prepared_note_ids))
+        return original_get_tts_audio(source_text, voice, options)
+    service_a.get_tts_audio = slow_get_tts_audio
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+
+    # all the notes were read while the first audio request was in flight
+    assert prepared_count_list[0] == len(note_id_list)
+    assert prepared_note_ids == note_id_list
+    assert note_reader_threads == [threading.current_thread()] * len(note_id_list)
+    for i in [0, 1, 3, 4]:
+        assert batch_status_obj[i].status == constants.BatchNoteStatus.Done
+    assert batch_status_obj[2].status == constants.BatchNoteStatus.Error
+
+
+def test_batch_estimate(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False)
+
+    # note 2 now has the same text as note 1, the third note is empty
+    hypertts_instance.anki_utils.get_note_by_id(config_gen.note_id_2).field_dict['Chinese'] = '老人家'
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.populate_batch_status_processed_text(note_id_list, batch.source, batch.text_processing, batch_status_obj)
+
+    estimate = hypertts_instance.estimate_batch(batch_status_obj, batch.voice_selection)
+    assert estimate.note_count == 4
+    assert estimate.empty_note_count == 1
+    assert estimate.shared_request_count == 1
+    assert estimate.request_count() == 3
+    assert estimate.cache_hit_count() == 0
+    assert estimate.character_count() == 8
+    service_estimate = estimate.service_estimates['ServiceA']
+    # no request sent to the service yet, the default latency is used
+    assert service_estimate.latency_seconds == None
+    assert estimate.estimated_seconds == 3 * constants.BATCH_ESTIMATE_DEFAULT_LATENCY_SECONDS
+
+    # after the batch ran, all the audio is in the cache, nothing gets billed
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+    estimate = hypertts_instance.estimate_batch(batch_status_obj, batch.voice_selection)
+    assert estimate.request_count() == 3
+    assert estimate.cache_hit_count() == 3
+    assert estimate.character_count() == 0
+    assert estimate.service_estimates['ServiceA'].latency_seconds != None
+    assert estimate.estimated_seconds == 0
+    assert 'ServiceA: 3 requests, 0 characters billed' in estimate.get_summary()
+
+    # in random mode, notes are spread across voices according to their weights
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_a_1 = get_default_voice_id(hypertts_instance)
+    voice_b_1 = [x for x in voice_list if x.name == 'alex'][0].voice_id
+    random_selection = config_models.VoiceSelectionRandom()
+    random_selection.add_voice(config_models.VoiceWithOptionsRandom(voice_a_1, {}, random_weight=3))
+    random_selection.add_voice(config_models.VoiceWithOptionsRandom(voice_b_1, {}, random_weight=1))
+    estimate = hypertts_instance.estimate_batch(batch_status_obj, random_selection)
+    assert estimate.shared_request_count == 0
+    assert estimate.service_estimates['ServiceA'].request_count == 3
+    assert estimate.service_estimates['ServiceA'].cache_hit_count == 3
+    assert estimate.service_estimates['ServiceB'].request_count == 1
+    # (3 + 3 + 2 + 3) characters, a quarter of which go to ServiceB
+    assert estimate.service_estimates['ServiceB'].character_count == 2.75
+
+
+def test_batch_estimate_format_duration():
+    assert batch_estimate.format_duration(0) == '0 seconds'
+    assert batch_estimate.format_duration(1) == '1 second'
+    assert batch_estimate.format_duration(45) == '45 seconds'
+    assert batch_estimate.format_duration(59.7) == '1 minute, 0 seconds'
+    assert batch_estimate.format_duration(61) == '1 minute, 1 second'
+    assert batch_estimate.format_duration(90) == '1 minute, 30 seconds'
+    assert batch_estimate.format_duration(299) == '4 minutes, 59 seconds'
+    assert batch_estimate.format_duration(300) == '5 minutes'
+    assert batch_estimate.format_duration(3599) == '59 minutes'
+    assert batch_estimate.format_duration(5400) == '1.5 hours'
+
+
+def test_batch_status_large_selection(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    note_id_list = list(range(1000000, 1200000))
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    assert len(batch_status_obj) == 200000
+    assert batch_status_obj[199999].note_id == 1199999
+    assert batch_status_obj[5].status == None
+    assert batch_status_obj[5].processed_text == None
+
+    with batch_status_obj.get_batch_running_action_context():
+        with batch_status_obj.get_note_action_context(1000005, True) as note_action_context:
+            note_action_context.set_source_text('old people')
+            note_action_context.set_processed_text(' '.join(['old', 'people']))
+            note_action_context.set_status(constants.BatchNoteStatus.Done)
+        with batch_status_obj.get_note_action_context(1000006, True) as note_action_context:
+            raise Exception('failed')
+
+    note_status = batch_status_obj.get_note_status(1000005)
+    assert note_status.status == constants.BatchNoteStatus.Done
+    assert note_status.error == None
+    # unchanged processed text isn't stored twice
+    assert note_status.processed_text is note_status.source_text
+    assert batch_status_obj[6].status == constants.BatchNoteStatus.Error
+    assert str(batch_status_obj[6].error) == 'failed'
+    assert batch_status_obj[7].status == None
+
+
+def test_batch_skip_up_to_date(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+
+    requested_text_list = testing_utils.record_tts_requests(hypertts_instance.service_manager.get_service('ServiceA'))
+
+    batch = testing_utils.create_simple_batch(hypertts_instance, save_preset=False, skip_up_to_date=True)
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_4]
+
+    # first run, none of the notes have the sound tag
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, testing_utils.MockCollection())
+    assert len(requested_text_list) == 3
+    for i in range(3):
+        assert batch_status_obj[i].status == constants.BatchNoteStatus.Done
+
+    # the sound tags set by the first run are now in the notes
+    for note_id in note_id_list:
+        note = hypertts_instance.anki_utils.get_note_by_id(note_id)
+        note.field_dict['Sound'] = note.set_values['Sound']
+
+    # the text of the second note changes, its audio is now outdated
+    hypertts_instance.anki_utils.get_note_by_id(config_gen.note_id_2).field_dict['Chinese'] = '大使馆'
+
+    requested_text_list.clear()
+    listener = MockBatchStatusListener(hypertts_instance.anki_utils)
+    batch_status_obj = batch_status.BatchStatus(hypertts_instance.anki_utils, note_id_list, listener)
+    mock_collection = testing_utils.MockCollection()
+    hypertts_instance.process_batch_audio(note_id_list, batch, batch_status_obj, mock_collection)
+
+    assert requested_text_list == ['大使馆']
+    assert batch_status_obj[0].status == constants.BatchNoteStatus.Skipped
+    assert batch_status_obj[0].processed_text == '老人家'
+    assert batch_status_obj[1].status == constants.BatchNoteStatus.Done
+    assert batch_status_obj[2].status == constants.BatchNoteStatus.Skipped
+    # only the outdated note gets written
+    written_note_ids = [[note.id for note in notes] for notes in mock_collection.update_notes_calls]
+    assert written_note_ids == [[config_gen.note_id_2]]
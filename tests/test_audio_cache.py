@@ -0,0 +1,732 @@
+import os
+import json
+import sqlite3
+import tempfile
+import time
+import threading
+import aqt.qt
+
+from test_utils import testing_utils
+from test_utils import gui_testing_utils
+
+from hypertts_addon import audio_cache
+from hypertts_addon import component_preferences
+from hypertts_addon import singleflight
+from hypertts_addon import errors
+from hypertts_addon import config_models
+from hypertts_addon import options as options_module
+from hypertts_addon import context
+from hypertts_addon import constants
+from hypertts_addon import logging_utils
+
+logger = logging_utils.get_test_child_logger(__name__)
+
+
+class MockClock():
+    def __init__(self):
+        self.current_time = 1000.0
+
+    def clock(self):
+        return self.current_time
+
+
+def test_audio_cache_index():
+    with tempfile.TemporaryDirectory() as user_files_dir:
+        # files generated before the index existed get imported when it's created
+        with open(os.path.join(user_files_dir, 'hypertts-legacy.mp3'), 'wb') as f:
+            f.write(b'legacy audio')
+        with open(os.path.join(user_files_dir, 'hypertts-empty.mp3'), 'wb') as f:
+            pass
+        with open(os.path.join(user_files_dir, 'other_file.txt'), 'wb') as f:
+            f.write(b'not audio')
+
+        mock_clock = MockClock()
+        index = audio_cache.AudioCacheIndex(user_files_dir, clock=mock_clock.clock)
+        index.open()
+        assert index.get_filename_set() == set(['hypertts-legacy.mp3'])
+        assert index.get_total_size() == len(b'legacy audio')
+
+        index.add('abc', 'hypertts-abc.ogg', 100, 'ogg_opus', 'ServiceA')
+        assert index.get_entry_count() == 2
+        assert index.get_total_size() == 100 + len(b'legacy audio')
+        assert index.get_service_stats()['ServiceA'] == (1, 100)
+
+        # lookups mark the entry as used
+        mock_clock.current_time += 60
+        entry = index.lookup('abc')
+        assert entry.filename == 'hypertts-abc.ogg'
+        assert entry.size == 100
+        assert entry.service == 'ServiceA'
+        assert entry.created == 1000.0
+        assert entry.last_used == 1060.0
+        assert index.lookup('notcached') == None
+
+        index.remove('abc')
+        assert index.lookup('abc') == None
+        index.close()
+
+        # the index persists, the import doesn't run again
+        os.remove(os.path.join(user_files_dir, 'hypertts-legacy.mp3'))
+        index = audio_cache.AudioCacheIndex(user_files_dir)
+        index.open()
+        assert index.lookup('legacy').size == len(b'legacy audio')
+        index.close()
+
+
+def test_audio_cache_temp_files():
+    with tempfile.TemporaryDirectory() as user_files_dir:
+        def create_temp_file(filename, age_seconds):
+            full_filename = os.path.join(user_files_dir, filename)
+            with open(full_filename, 'wb') as f:
+                f.write(b'partial audio')
+            file_time = time.time() - age_seconds
+            os.utime(full_filename, (file_time, file_time))
+            return full_filename
+
+        # left behind by an interrupted request, removed by the import
+        stale_filename = create_temp_file(constants.AUDIO_TEMP_FILE_PREFIX + 'stale.mp3', 2 * constants.AUDIO_TEMP_FILE_MAX_AGE_SECONDS)
+        # may still be getting written
+        recent_filename = create_temp_file(constants.AUDIO_TEMP_FILE_PREFIX + 'recent.mp3', 0)
+        index = audio_cache.AudioCacheIndex(user_files_dir)
+        index.open()
+        assert not os.path.exists(stale_filename)
+        assert os.path.exists(recent_filename)
+        assert index.get_filename_set() == set()
+
+        # also removed after the import
+        stale_filename = create_temp_file(constants.AUDIO_TEMP_FILE_PREFIX + 'stale.mp3', 2 * constants.AUDIO_TEMP_FILE_MAX_AGE_SECONDS)
+        assert index.remove_temp_files() == 1
+        assert not os.path.exists(stale_filename)
+        assert os.path.exists(recent_filename)
+        index.close()
+
+
+def test_audio_cache_opened_in_background(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    assert not hypertts_instance.audio_cache_opened()
+    hypertts_instance.start_audio_cache_open()
+    assert hypertts_instance.audio_cache_opened()
+
+    # the preferences dialog doesn't open the index on the main thread
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    hypertts_instance.anki_utils.run_in_background_calls = []
+    original_run_in_background = hypertts_instance.anki_utils.run_in_background
+    def run_in_background(task_fn, task_done_fn):
+        assert not hypertts_instance.audio_cache_opened()
+        hypertts_instance.anki_utils.run_in_background_calls.append(task_fn)
+        original_run_in_background(task_fn, task_done_fn)
+    hypertts_instance.anki_utils.run_in_background = run_in_background
+    dialog = gui_testing_utils.EmptyDialog()
+    dialog.setupUi()
+    preferences = component_preferences.ComponentPreferences(hypertts_instance, dialog)
+    preferences.draw(dialog.getLayout())
+    assert len(hypertts_instance.anki_utils.run_in_background_calls) == 1
+    assert 'Cached audio files: 0' in preferences.audio_cache.statistics_label.text()
+
+
+def test_generate_audio_uses_index(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+
+    full_filename, audio_filename = hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context)
+    entry = hypertts_instance.get_audio_cache().lookup(hypertts_instance.get_hash_for_audio_request('old people', voice_id, {}))
+    assert entry.filename == audio_filename
+    assert entry.size == os.path.getsize(full_filename)
+    assert entry.format == 'mp3'
+    assert entry.service == 'ServiceA'
+
+    # served from the index, no request sent
+    service_a.requested_audio = None
+    assert hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context) == (full_filename, audio_filename)
+    assert service_a.requested_audio == None
+    assert hypertts_instance.get_cached_audio_filenames() == set([audio_filename])
+
+    # the file got deleted from user_files, it gets generated again
+    os.remove(full_filename)
+    assert hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context) == (full_filename, audio_filename)
+    assert service_a.requested_audio['source_text'] == 'old people'
+    assert os.path.exists(full_filename)
+    assert hypertts_instance.get_audio_cache().lookup(hypertts_instance.get_hash_for_audio_request('old people', voice_id, {})).size == os.path.getsize(full_filename)
+
+    # an empty file in the index gets generated again
+    hash_str = hypertts_instance.get_hash_for_audio_request('old people', voice_id, {})
+    open(full_filename, 'wb').close()
+    hypertts_instance.get_audio_cache().add(hash_str, audio_filename, 0, 'mp3', 'ServiceA')
+    service_a.requested_audio = None
+    hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context)
+    assert service_a.requested_audio['source_text'] == 'old people'
+    assert hypertts_instance.get_audio_cache().lookup(hash_str).size > 0
+
+    # empty audio returned by the service isn't cached
+    service_a.get_tts_audio = lambda source_text, voice, options: b''
+    try:
+        hypertts_instance.generate_audio_write_file('young people', voice_id, {}, audio_request_context)
+        assert False, 'expected RequestError'
+    except errors.RequestError:
+        pass
+    assert hypertts_instance.get_audio_cache().lookup(hypertts_instance.get_hash_for_audio_request('young people', voice_id, {})) == None
+    assert [x for x in os.listdir(os.path.dirname(full_filename)) if x.startswith(constants.AUDIO_TEMP_FILE_PREFIX)] == []
+
+
+def test_audio_cache_eviction():
+    with tempfile.TemporaryDirectory() as user_files_dir:
+        mock_clock = MockClock()
+        index = audio_cache.AudioCacheIndex(user_files_dir, clock=mock_clock.clock)
+        index.open()
+        for hash_str in ['a', 'b', 'c', 'd']:
+            filename = f'hypertts-{hash_str}.mp3'
+            with open(os.path.join(user_files_dir, filename), 'wb') as f:
+                f.write(b'x' * 100)
+            index.add(hash_str, filename, 100, 'mp3', 'ServiceA')
+            mock_clock.current_time += 1
+        # a was used most recently
+        index.lookup('a')
+
+        # under the limit, nothing to do
+        assert index.evict(400, set()) == (0, 0)
+
+        # b is the least recently used, but is used by a note
+        assert index.evict(200, set(['hypertts-b.mp3'])) == (2, 200)
+        assert index.get_filename_set() == set(['hypertts-a.mp3', 'hypertts-b.mp3'])
+        assert not os.path.exists(os.path.join(user_files_dir, 'hypertts-c.mp3'))
+        assert not os.path.exists(os.path.join(user_files_dir, 'hypertts-d.mp3'))
+        index.close()
+
+
+def test_evict_audio_cache_keeps_collection_files(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+
+    # no limit by default
+    assert hypertts_instance.evict_audio_cache() == (0, 0)
+
+    full_filename_1, audio_filename_1 = hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context)
+    full_filename_2, audio_filename_2 = hypertts_instance.generate_audio_write_file('hello', voice_id, {}, audio_request_context)
+    hypertts_instance.anki_utils.get_note_by_id(config_gen.note_id_1).field_dict['Sound'] = f'[sound:{audio_filename_1}]'
+    assert hypertts_instance.get_collection_audio_filenames() == set([audio_filename_1])
+
+    # over the limit: everything gets evicted except the file used by the note
+    preferences = hypertts_instance.get_preferences()
+    preferences.audio_cache.max_size_mb = 1
+    hypertts_instance.save_preferences(preferences)
+    hypertts_instance.get_audio_cache().add('large', 'hypertts-large.mp3', 2 * 1024 * 1024, 'mp3', 'ServiceA')
+    hypertts_instance.start_audio_cache_eviction()
+    assert os.path.exists(full_filename_1)
+    assert not os.path.exists(full_filename_2)
+    assert hypertts_instance.get_cached_audio_filenames() == set([audio_filename_1])
+
+
+def test_generate_audio_single_flight(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.realtime)
+
+    # the first request is slow, the others ask for the same audio in the meantime
+    request_started = threading.Event()
+    release_request = threading.Event()
+    request_count = [0]
+    get_tts_audio = hypertts_instance.service_manager.get_tts_audio
+    def slow_get_tts_audio(*args, **kwargs):
+        request_count[0] += 1
+        request_started.set()
+        release_request.wait(5)
+        return get_tts_audio(*args, **kwargs)
+    hypertts_instance.service_manager.get_tts_audio = slow_get_tts_audio
+
+    result_list = []
+    def generate_audio():
+        result_list.append(hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context))
+    thread_list = [threading.Thread(target=generate_audio) for i in range(4)]
+    thread_list[0].start()
+    assert request_started.wait(5)
+    for thread in thread_list[1:]:
+        thread.start()
+    release_request.set()
+    for thread in thread_list:
+        thread.join()
+
+    assert request_count[0] == 1
+    assert len(set(result_list)) == 1
+    full_filename, audio_filename = result_list[0]
+    assert os.path.getsize(full_filename) > 0
+    # no temporary file left behind
+    assert [x for x in os.listdir(os.path.dirname(full_filename)) if x.startswith(constants.AUDIO_TEMP_FILE_PREFIX)] == []
+
+
+def test_single_flight_exception():
+    single_flight = singleflight.SingleFlight()
+    def failing_fn():
+        raise errors.AudioNotFoundError('old people', 'voice_1')
+    try:
+        single_flight.call('key', failing_fn)
+        assert False, 'expected AudioNotFoundError'
+    except errors.AudioNotFoundError:
+        pass
+    # the failed call doesn't stay in flight
+    assert single_flight.call('key', lambda: 42) == 42
+
+
+def test_hot_audio_cache():
+    hot_cache = audio_cache.HotAudioCache(100)
+    hot_cache.put('a', 'x' * 39)
+    hot_cache.put('b', 'x' * 39)
+    assert hot_cache.get('a') == 'x' * 39
+    # over 100 bytes, b is the least recently used
+    hot_cache.put('c', 'x' * 39)
+    assert hot_cache.get('b') == None
+    assert hot_cache.get('a') != None
+    assert hot_cache.get('c') != None
+    assert hot_cache.total_bytes == 80
+
+    # replacing an entry doesn't count it twice
+    hot_cache.put('c', 'y' * 39)
+    assert hot_cache.total_bytes == 80
+    hot_cache.remove('c')
+    assert hot_cache.get('c') == None
+    assert hot_cache.total_bytes == 40
+    hot_cache.clear()
+    assert len(hot_cache) == 0
+
+    # the cache index is told about repeated playbacks once per interval
+    mock_clock = MockClock()
+    hot_cache = audio_cache.HotAudioCache(100, mark_used_interval=300, clock=mock_clock.clock)
+    hot_cache.put('a', 'x' * 39)
+    assert hot_cache.mark_used_required('a') == False
+    mock_clock.current_time += 301
+    assert hot_cache.mark_used_required('a') == True
+    assert hot_cache.mark_used_required('a') == False
+
+
+class MockRealtimeTTSTag():
+    def __init__(self, other_args, field_text):
+        self.other_args = other_args
+        self.field_text = field_text
+
+
+def test_realtime_audio_hot_cache(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+
+    voice_selection = config_models.VoiceSelectionSingle()
+    voice_selection.set_voice(config_models.VoiceWithOptions(voice_id, {}))
+    source = config_models.RealtimeSourceAnkiTTS()
+    source.field_name = 'Chinese'
+    source.field_type = constants.AnkiTTSFieldType.Regular
+    front = config_models.RealtimeConfigSide()
+    front.side_enabled = True
+    front.source = source
+    front.text_processing = config_models.TextProcessing()
+    front.voice_selection = voice_selection
+    realtime_config = config_models.RealtimeConfig()
+    realtime_config.front = front
+    realtime_config.back = config_models.RealtimeConfigSide()
+    settings_key = hypertts_instance.save_realtime_config(realtime_config, None)
+
+    load_count = [0]
+    load_realtime_config = hypertts_instance.load_realtime_config
+    def counting_load_realtime_config(settings_key):
+        load_count[0] += 1
+        return load_realtime_config(settings_key)
+    hypertts_instance.load_realtime_config = counting_load_realtime_config
+
+    tts_tag = MockRealtimeTTSTag([f'{constants.TTS_TAG_HYPERTTS_PRESET}=Front_{settings_key}'], '老人家')
+    full_filename = hypertts_instance.get_audio_filename_tts_tag(tts_tag)
+    assert os.path.exists(full_filename)
+    # the second playback doesn't look at the configuration
+    assert hypertts_instance.get_audio_filename_tts_tag(tts_tag) == full_filename
+    assert load_count[0] == 1
+
+    # repeated playbacks are recorded in the cache index, so that the file doesn't get evicted first
+    audio_cache_index = hypertts_instance.get_audio_cache()
+    def get_last_used():
+        return audio_cache_index.connection.execute('SELECT last_used FROM audio_files WHERE filename = ?',
+            (os.path.basename(full_filename),)).fetchone()[0]
+    last_used = get_last_used()
+    current_time = audio_cache_index.clock()
+    audio_cache_index.clock = lambda: current_time + 3600
+    hypertts_instance.realtime_audio_cache.mark_used_interval = 0
+    assert hypertts_instance.get_audio_filename_tts_tag(tts_tag) == full_filename
+    assert get_last_used() == current_time + 3600
+    assert get_last_used() > last_used
+
+    # the file got evicted, it gets generated again
+    os.remove(full_filename)
+    assert hypertts_instance.get_audio_filename_tts_tag(tts_tag) == full_filename
+    assert os.path.exists(full_filename)
+    assert load_count[0] == 2
+
+    # saving the realtime configuration invalidates the cache
+    hypertts_instance.save_realtime_config(realtime_config, settings_key)
+    assert hypertts_instance.get_audio_filename_tts_tag(tts_tag) == full_filename
+    assert load_count[0] == 3
+
+
+def test_canonical_audio_request_hash(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+
+    get_hash = lambda options: hypertts_instance.get_hash_for_audio_request('old people', voice_id, options)
+    # option order doesn't matter
+    assert get_hash({'pitch': 2.0, 'style': 2}) == get_hash({'style': 2, 'pitch': 2.0})
+    assert get_hash({'pitch': 2}) == get_hash({'pitch': 2.0})
+    assert get_hash({'pitch': 2.5}) != get_hash({})
+
+
+def test_audio_request_hash_service_unavailable(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    options = {'speaking_rate': 1.0, 'pitch': 2.0}
+
+    hash_str = hypertts_instance.get_hash_for_audio_request('old people', voice_id, options)
+    # the audio cached while the service was available is found while it's disabled
+    service_a.enabled = False
+    assert hypertts_instance.get_hash_for_audio_request('old people', voice_id, options) == hash_str
+    service_a.enabled = True
+    assert hypertts_instance.get_hash_for_audio_request('old people', voice_id, options) == hash_str
+
+
+def test_legacy_audio_file_migration(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+    options = {'speaking_rate': 1.0}
+
+    # audio file written by a previous version
+    legacy_hash_str = hypertts_instance.get_legacy_hash_for_audio_request('old people', voice_id, options)
+    legacy_full_filename = hypertts_instance.get_full_audio_file_name(legacy_hash_str, options_module.AudioFormat.mp3)
+    with open(legacy_full_filename, 'wb') as f:
+        f.write(b'legacy audio')
+
+    service_a.requested_audio = None
+    full_filename, audio_filename = hypertts_instance.generate_audio_write_file('old people', voice_id, options, audio_request_context)
+    assert service_a.requested_audio == None
+    assert audio_filename == hypertts_instance.get_audio_filename(hypertts_instance.get_hash_for_audio_request('old people', voice_id, options), options_module.AudioFormat.mp3)
+    assert not os.path.exists(legacy_full_filename)
+    with open(full_filename, 'rb') as f:
+        assert f.read() == b'legacy audio'
+    assert hypertts_instance.get_cached_audio_filenames() == set([audio_filename])
+
+    # notes which got their audio from the previous version are still up to date
+    legacy_sound_tag = f'[sound:{os.path.basename(legacy_full_filename)}]'
+    voice_selection = config_models.VoiceSelectionSingle()
+    voice_selection.set_voice(config_models.VoiceWithOptions(voice_id, options))
+    assert legacy_sound_tag in hypertts_instance.get_expected_sound_tags('old people', voice_selection)
+
+
+def test_warm_realtime_audio_cache(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+
+    voice_selection = config_models.VoiceSelectionSingle()
+    voice_selection.set_voice(config_models.VoiceWithOptions(voice_id, {}))
+    source = config_models.RealtimeSourceAnkiTTS()
+    source.field_name = 'Chinese'
+    source.field_type = constants.AnkiTTSFieldType.Regular
+    front = config_models.RealtimeConfigSide()
+    front.side_enabled = True
+    front.source = source
+    front.text_processing = config_models.TextProcessing()
+    front.voice_selection = voice_selection
+    realtime_config = config_models.RealtimeConfig()
+    realtime_config.front = front
+    realtime_config.back = config_models.RealtimeConfigSide()
+    settings_key = hypertts_instance.save_realtime_config(realtime_config, None)
+    # add the tts tag to the front of the note type
+    tts_tag = hypertts_instance.build_realtime_tts_tag(front, hypertts_instance.build_side_settings_key(constants.AnkiCardSide.Front, settings_key))
+    config_gen.model_chinese['tmpls'][0]['qfmt'] += '\n' + tts_tag
+
+    # the third note is empty, the german notes don't have realtime audio
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+    realtime_request_list = hypertts_instance.get_realtime_audio_requests(note_id_list)
+    assert [text for realtime_side_model, text in realtime_request_list] == ['老人家', '你好', '赚钱', '大使馆']
+    assert hypertts_instance.get_realtime_audio_requests([config_gen.note_id_german_1]) == []
+
+    # cancelled after the first request
+    hypertts_instance.get_batch_concurrency = lambda voice_selection: 1
+    cancel_event = threading.Event()
+    progress_list = []
+    def cancelling_progress_fn(completed_count, request_count):
+        progress_list.append((completed_count, request_count))
+        cancel_event.set()
+    assert hypertts_instance.warm_realtime_audio_cache(realtime_request_list, cancelling_progress_fn, cancel_event) == (1, 0)
+    assert progress_list == [(1, 4)]
+
+    # an unexpected error is counted, the other requests keep going
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    original_get_tts_audio = service_a.get_tts_audio
+    def failing_get_tts_audio(source_text, voice, options):
+        if source_text == '你好':
+            raise ConnectionError('connection reset')
+        return original_get_tts_audio(source_text, voice, options)
+    service_a.get_tts_audio = failing_get_tts_audio
+    assert hypertts_instance.warm_realtime_audio_cache(realtime_request_list[1:], lambda completed_count, request_count: None, threading.Event()) == (3, 1)
+    service_a.get_tts_audio = original_get_tts_audio
+
+    progress_list = []
+    def progress_fn(completed_count, request_count):
+        progress_list.append((completed_count, request_count))
+    assert hypertts_instance.warm_realtime_audio_cache(realtime_request_list, progress_fn, threading.Event()) == (4, 0)
+    assert progress_list == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    audio_cache_index = hypertts_instance.get_audio_cache()
+    for text in ['老人家', '你好', '赚钱', '大使馆']:
+        assert audio_cache_index.lookup(hypertts_instance.get_hash_for_audio_request(text, voice_id, {})) != None
+
+
+def test_audio_statistics(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    batch_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+    realtime_context = context.AudioRequestContext(constants.AudioRequestReason.realtime)
+
+    full_filename, audio_filename = hypertts_instance.generate_audio_write_file('old people', voice_id, {}, batch_context)
+    hypertts_instance.generate_audio_write_file('old people', voice_id, {}, realtime_context)
+    hypertts_instance.generate_audio_write_file('old people', voice_id, {}, realtime_context)
+    audio_size = os.path.getsize(full_filename)
+
+    latency_tracker = hypertts_instance.service_manager.latency_tracker
+    data = latency_tracker.serialize()
+    batch_counters = data['services']['ServiceA']['batch']
+    assert batch_counters['hit_count'] == 0
+    assert batch_counters['miss_count'] == 1
+    assert batch_counters['bytes_generated'] == audio_size
+    assert batch_counters['request_count'] == 1
+    assert sum(batch_counters['latency_histogram'].values()) == 1
+    realtime_counters = data['services']['ServiceA']['realtime']
+    assert realtime_counters['hit_count'] == 2
+    assert realtime_counters['miss_count'] == 0
+    assert realtime_counters['bytes_served'] == 2 * audio_size
+
+    hit_count, miss_count, hit_rate, bytes_served, latency_saved = latency_tracker.get_service_summary()['ServiceA']
+    assert (hit_count, miss_count, bytes_served) == (2, 1, 2 * audio_size)
+    assert abs(hit_rate - 2 / 3) < 0.001
+
+    # the preferences dialog shows and exports the statistics
+    dialog = gui_testing_utils.EmptyDialog()
+    dialog.setupUi()
+    preferences = component_preferences.ComponentPreferences(hypertts_instance, dialog)
+    preferences.draw(dialog.getLayout())
+    assert 'Cached audio files: 1' in preferences.audio_cache.statistics_label.text()
+    assert '<td>ServiceA</td>' in preferences.audio_cache.statistics_label.text()
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        export_path = os.path.join(export_dir, 'statistics.json')
+        hypertts_instance.anki_utils.ask_user_save_file_response = export_path
+        qtbot.mouseClick(preferences.audio_cache.export_statistics_button, aqt.qt.Qt.MouseButton.LeftButton)
+        with open(export_path, 'r', encoding='utf-8') as f:
+            exported_data = json.load(f)
+        assert exported_data['services']['ServiceA']['realtime']['hit_count'] == 2
+        assert exported_data['audio_cache']['file_count'] == 1
+
+    qtbot.mouseClick(preferences.audio_cache.reset_statistics_button, aqt.qt.Qt.MouseButton.LeftButton)
+    assert latency_tracker.get_service_summary() == {}
+    # the batch estimates still use the latency of the recent requests
+    assert latency_tracker.get_average_latency('ServiceA') != None
+    assert 'No audio requested' in preferences.audio_cache.statistics_label.text()
+
+
+def test_deduplicate_identical_audio(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+    # a dictionary service returning the same recording for different requests
+    hypertts_instance.service_manager.get_service('ServiceA').get_tts_audio = lambda *args: b'identical recording'
+
+    # disabled by default
+    full_filename_1, audio_filename_1 = hypertts_instance.generate_audio_write_file('Old People', voice_id, {}, audio_request_context)
+    full_filename_2, audio_filename_2 = hypertts_instance.generate_audio_write_file('old people!', voice_id, {}, audio_request_context)
+    assert audio_filename_1 != audio_filename_2
+
+    preferences = hypertts_instance.get_preferences()
+    preferences.audio_cache.deduplicate_audio = True
+    hypertts_instance.save_preferences(preferences)
+    full_filename_3, audio_filename_3 = hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context)
+    assert audio_filename_3 == audio_filename_1
+    assert full_filename_3 == full_filename_1
+    # served from the shared file from now on
+    assert hypertts_instance.generate_audio_write_file('old people', voice_id, {}, audio_request_context) == (full_filename_1, audio_filename_1)
+
+    audio_cache_index = hypertts_instance.get_audio_cache()
+    assert audio_cache_index.get_entry_count() == 2
+    assert audio_cache_index.get_total_size() == 2 * len(b'identical recording')
+    assert hypertts_instance.get_cached_audio_hashes() == set([hypertts_instance.get_hash_for_audio_request(text, voice_id, {})
+        for text in ['Old People', 'old people!', 'old people']])
+
+    # a note which got the shared file is up to date
+    voice_selection = config_models.VoiceSelectionSingle()
+    voice_selection.set_voice(config_models.VoiceWithOptions(voice_id, {}))
+    assert f'[sound:{audio_filename_1}]' in hypertts_instance.get_expected_sound_tags('old people', voice_selection)
+
+    # the shared file gets evicted along with all of its requests
+    assert audio_cache_index.evict(0, set()) == (2, 2 * len(b'identical recording'))
+    assert not os.path.exists(full_filename_1)
+    assert audio_cache_index.lookup(hypertts_instance.get_hash_for_audio_request('Old People', voice_id, {})) == None
+    assert audio_cache_index.lookup(hypertts_instance.get_hash_for_audio_request('old people', voice_id, {})) == None
+
+
+def test_audio_cache_index_upgrade():
+    with tempfile.TemporaryDirectory() as user_files_dir:
+        # index created by the first version, without content hashes
+        connection = sqlite3.connect(os.path.join(user_files_dir, constants.AUDIO_CACHE_INDEX_FILENAME))
+        connection.execute('CREATE TABLE audio_files (hash TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, '
+            'format TEXT, service TEXT, created REAL NOT NULL, last_used REAL NOT NULL)')
+        connection.execute("INSERT INTO audio_files VALUES ('abc', 'hypertts-abc.mp3', 100, 'mp3', 'ServiceA', 1000.0, 1000.0)")
+        connection.execute('PRAGMA user_version = 1')
+        connection.commit()
+        connection.close()
+
+        index = audio_cache.AudioCacheIndex(user_files_dir)
+        index.open()
+        entry = index.lookup('abc')
+        assert entry.size == 100
+        assert entry.content_hash == None
+        index.add('def', 'hypertts-def.mp3', 200, 'mp3', 'ServiceA', 'content')
+        assert index.find_content('content') == 'hypertts-def.mp3'
+        index.add_missing_audio('ServiceA', '"voice"', 'missing word')
+        assert index.get_missing_audio_count() == 1
+        index.close()
+
+
+def test_streamed_audio_written_to_file(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice = [x for x in voice_list if x.name == 'voice_a_1'][0]
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+
+    # a service streaming its audio in chunks
+    chunk_list = [b'chunk_1', b'chunk_2', b'chunk_3']
+    def write_tts_audio(source_text, voice, options, audio_file):
+        for chunk in chunk_list:
+            audio_file.write(chunk)
+    service_a.write_tts_audio = write_tts_audio
+
+    full_filename, audio_filename = hypertts_instance.generate_audio_write_file('old people', voice.voice_id, {}, audio_request_context)
+    with open(full_filename, 'rb') as f:
+        assert f.read() == b'chunk_1chunk_2chunk_3'
+    entry = hypertts_instance.get_audio_cache().lookup(hypertts_instance.get_hash_for_audio_request('old people', voice.voice_id, {}))
+    assert entry.size == len(b'chunk_1chunk_2chunk_3')
+    user_files_dir = os.path.dirname(full_filename)
+    assert [x for x in os.listdir(user_files_dir) if x.startswith(constants.AUDIO_TEMP_FILE_PREFIX)] == []
+
+    # a request which starts over gets a clean file
+    audio_file = tempfile.TemporaryFile()
+    audio_file.write(b'previous attempt')
+    hypertts_instance.service_manager.get_tts_audio('old people', voice, {}, audio_request_context, audio_file=audio_file)
+    audio_file.seek(0)
+    assert audio_file.read() == b'chunk_1chunk_2chunk_3'
+    audio_file.close()
+
+    # the stream breaks halfway, nothing is left behind
+    def failing_write_tts_audio(source_text, voice, options, audio_file):
+        audio_file.write(b'chunk_1')
+        raise errors.RequestError(source_text, voice, 'connection lost')
+    service_a.write_tts_audio = failing_write_tts_audio
+    try:
+        hypertts_instance.generate_audio_write_file('hello', voice.voice_id, {}, audio_request_context)
+        assert False, 'expected an exception'
+    except errors.RequestError as e:
+        assert e.error_message == 'connection lost'
+    assert not os.path.exists(hypertts_instance.get_full_audio_file_name(
+        hypertts_instance.get_hash_for_audio_request('hello', voice.voice_id, {}), options_module.AudioFormat.mp3))
+    assert [x for x in os.listdir(user_files_dir) if x.startswith(constants.AUDIO_TEMP_FILE_PREFIX)] == []
+
+
+def test_missing_audio_not_requested_again(qtbot, monkeypatch):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_id_1 = [x for x in voice_list if x.name == 'voice_a_1'][0].voice_id
+    voice_id_2 = [x for x in voice_list if x.name == 'voice_a_2'][0].voice_id
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+    audio_cache_index = hypertts_instance.get_audio_cache()
+
+    request_list = []
+    def get_tts_audio(source_text, voice, options):
+        request_list.append((source_text, voice.name))
+        raise errors.AudioNotFoundError(source_text, voice)
+    service_a.get_tts_audio = get_tts_audio
+
+    def generate_audio_not_found(source_text, voice_id):
+        try:
+            hypertts_instance.generate_audio_write_file(source_text, voice_id, {}, audio_request_context)
+            assert False, 'expected AudioNotFoundError'
+        except errors.AudioNotFoundError:
+            pass
+
+    # a tts service could have the audio on the next request
+    generate_audio_not_found('missing word', voice_id_1)
+    assert audio_cache_index.get_missing_audio_count() == 0
+    request_list.clear()
+
+    # a dictionary service which doesn't have this word
+    monkeypatch.setattr(type(service_a), 'service_type', constants.ServiceType.dictionary)
+    generate_audio_not_found('missing word', voice_id_1)
+    assert request_list == [('missing word', 'voice_a_1')]
+    # known to be missing, the request doesn't go out
+    generate_audio_not_found('missing word', voice_id_1)
+    assert request_list == [('missing word', 'voice_a_1')]
+    # other voices and words get requested
+    generate_audio_not_found('missing word', voice_id_2)
+    generate_audio_not_found('other word', voice_id_1)
+    assert len(request_list) == 3
+    assert audio_cache_index.get_missing_audio_count() == 3
+
+    # the dictionary page couldn't be loaded, the word may exist
+    def get_tts_audio_unavailable(source_text, voice, options):
+        request_list.append((source_text, voice.name))
+        raise errors.RequestError(source_text, voice, 'status code 503: Service Unavailable')
+    service_a.get_tts_audio = get_tts_audio_unavailable
+    try:
+        hypertts_instance.generate_audio_write_file('unavailable word', voice_id_1, {}, audio_request_context)
+        assert False, 'expected RequestError'
+    except errors.RequestError:
+        pass
+    assert audio_cache_index.get_missing_audio_count() == 3
+    service_a.get_tts_audio = get_tts_audio
+    request_list.clear()
+    generate_audio_not_found('missing word', voice_id_1)
+    assert request_list == []
+
+    # past the ttl, the word gets requested again
+    ttl_seconds = constants.AUDIO_CACHE_MISSING_AUDIO_TTL_DAYS_DEFAULT * 24 * 3600
+    current_time = audio_cache_index.clock()
+    audio_cache_index.clock = lambda: current_time + ttl_seconds + 1
+    generate_audio_not_found('missing word', voice_id_1)
+    assert len(request_list) == 1
+    assert audio_cache_index.remove_expired_missing_audio(ttl_seconds) == 2
+
+    # disabled
+    preferences = hypertts_instance.get_preferences()
+    preferences.audio_cache.missing_audio_ttl_days = 0
+    hypertts_instance.save_preferences(preferences)
+    generate_audio_not_found('missing word', voice_id_1)
+    generate_audio_not_found('missing word', voice_id_1)
+    assert len(request_list) == 3
@@ -790,6 +790,95 @@ def test_batch_preview(qtbot):
     # return 
 
 
+def test_batch_preview_lazy_text(qtbot, monkeypatch):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    monkeypatch.setattr(constants, 'BATCH_PREVIEW_PREFETCH_ROWS', 1)
+
+    dialog = gui_testing_utils.EmptyDialog()
+    dialog.setupUi()
+
+    note_id_list = [config_gen.note_id_1, config_gen.note_id_2, config_gen.note_id_3, config_gen.note_id_4, config_gen.note_id_5]
+
+    batch_config = config_models.BatchConfig(hypertts_instance.anki_utils)
+    batch_config.set_source(config_models.BatchSource(mode=constants.BatchMode.simple, source_field='Chinese'))
+    batch_config.set_target(config_models.BatchTarget('Sound', False, True))
+    batch_config.set_text_processing(config_models.TextProcessing())
+
+    batch_preview_callback = gui_testing_utils.MockBatchPreviewCallback()
+    batch_preview = component_batch_preview.BatchPreview(hypertts_instance, dialog, note_id_list,
+        batch_preview_callback.sample_selected,
+        batch_preview_callback.batch_start,
+        batch_preview_callback.batch_end)
+    batch_preview.load_model(batch_config)
+
+    # only the first rows, plus the prefetch window, get computed
+    assert batch_preview.batch_status[0].processed_text == '老人家'
+    assert batch_preview.batch_status[2].processed_text == ''
+    assert batch_preview.batch_status[3].processed_text == None
+    assert batch_preview.batch_status[4].processed_text == None
+
+    # a row displayed by the view gets computed on demand
+    batch_preview.row_displayed(4)
+    assert batch_preview.batch_status[4].processed_text == '大使馆'
+    assert batch_preview.batch_status[3].processed_text == None
+
+    # loading a new model discards the text computed for the previous one
+    batch_config.set_source(config_models.BatchSource(mode=constants.BatchMode.simple, source_field='English'))
+    batch_preview.load_model(batch_config)
+    assert batch_preview.batch_status[0].processed_text == 'old people'
+    assert batch_preview.batch_status[4].processed_text == None
+
+    # a computation started for a previous model stops right away
+    generation = batch_preview.generation
+    batch_preview.generation += 1
+    hypertts_instance.populate_batch_status_rows_processed_text(note_id_list[3:], batch_config.source, batch_config.text_processing,
+        batch_preview.batch_status, lambda: batch_preview.generation == generation)
+    assert batch_preview.batch_status[3].processed_text == None
+
+    # the estimate computes the text of every note
+    voice_list = hypertts_instance.service_manager.full_voice_list()
+    voice_a_1 = [x for x in voice_list if x.name == 'voice_a_1'][0]
+    voice_selection = config_models.VoiceSelectionSingle()
+    voice_selection.set_voice(config_models.VoiceWithOptions(voice_a_1.voice_id, {}))
+    batch_config.set_voice_selection(voice_selection)
+    batch_preview.load_model(batch_config)
+    batch_preview.estimate_button_pressed()
+    assert batch_preview.batch_status[3].processed_text == 'To earn money'
+    assert batch_preview.audio_request_count_label.text() == '5 notes, 5 unique audio requests (0 API calls saved)'
+    assert batch_preview.estimate_label.text() != ''
+
+    # the estimate of the previous model goes away
+    batch_preview.load_model(batch_config)
+    assert batch_preview.audio_request_count_label.text() == ''
+    assert batch_preview.estimate_label.text() == ''
+
+    # a model loaded while the batch is running resets the preview once the batch has stopped
+    with batch_preview.batch_status.get_batch_running_action_context():
+        batch_config.set_source(config_models.BatchSource(mode=constants.BatchMode.simple, source_field='Chinese'))
+        batch_preview.load_model(batch_config)
+        assert batch_preview.batch_status.must_continue == False
+        assert batch_preview.batch_status[0].processed_text == 'old people'
+    assert batch_preview.batch_status[0].processed_text == '老人家'
+
+
+def test_batch_progress_channel(qtbot):
+    progress_channel = component_batch_preview.BatchProgressChannel()
+
+    # only the first change schedules a flush, the following ones get coalesced into it
+    assert progress_channel.add_change(3, (3, 10, None, None)) == True
+    assert progress_channel.add_change(1, (1, 10, None, None)) == False
+    assert progress_channel.add_change(3, (3, 10, None, None)) == False
+
+    dirty_rows, latest_progress = progress_channel.take_changes()
+    assert dirty_rows == set([1, 3])
+    assert latest_progress == (3, 10, None, None)
+
+    # after a flush, the next change schedules a new one
+    assert progress_channel.take_changes()[0] == set()
+    assert progress_channel.add_change(4, (4, 10, None, None)) == True
+
+
 def test_batch_dialog_1(qtbot):
     config_gen = testing_utils.TestConfigGenerator()
     hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
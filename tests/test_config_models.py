@@ -382,7 +382,8 @@ class ConfigModelsTests(unittest.TestCase):
             'target': {
                 'target_field': 'Sound',
                 'text_and_sound_tag': False,
-                'remove_sound_tag': False
+                'remove_sound_tag': False,
+                'skip_up_to_date': False
             },
             'voice_selection': {
                 'voice_selection_mode': 'single',
@@ -446,7 +447,8 @@ class ConfigModelsTests(unittest.TestCase):
                 expected_output = {
                     'target_field': 'Sound',
                     'text_and_sound_tag': text_and_sound_tag,
-                    'remove_sound_tag': remove_sound_tag
+                    'remove_sound_tag': remove_sound_tag,
+                    'skip_up_to_date': False
                 }
                 assert batch_config.serialize()['target'] == expected_output
 
@@ -652,7 +654,8 @@ class ConfigModelsTests(unittest.TestCase):
             'target': {
                 'target_field': 'Audio',
                 'text_and_sound_tag': False,
-                'remove_sound_tag': False
+                'remove_sound_tag': False,
+                'skip_up_to_date': False
             },
             'voice_selection': {
                 'voice_selection_mode': 'single',
@@ -843,6 +846,16 @@ class ConfigModelsTests(unittest.TestCase):
             },
             'error_handling': {
                 'realtime_tts_errors_dialog_type': 'Dialog'
+            },
+            'batch_processing': {
+                'note_update_chunk_size': 200,
+                'prepare_queue_depth': 50,
+                'pending_requests_per_worker': 2
+            },
+            'audio_cache': {
+                'max_size_mb': 0,
+                'deduplicate_audio': False,
+                'missing_audio_ttl_days': 30
             }
         }
         self.assertEqual(config_models.serialize_preferences(preferences), expected_output)
@@ -856,6 +869,7 @@ class ConfigModelsTests(unittest.TestCase):
         self.assertEqual(preferences_1.error_handling.realtime_tts_errors_dialog_type, constants.ErrorDialogType.Dialog)
         self.assertEqual(preferences_1.keyboard_shortcuts.shortcut_editor_add_audio, None)
         self.assertEqual(preferences_1.keyboard_shortcuts.shortcut_editor_preview_audio, None)
+        self.assertEqual(preferences_1.batch_processing.note_update_chunk_size, 200)
         self.assertEqual(config_models.serialize_preferences(preferences_1), 
         {
             'keyboard_shortcuts': {
@@ -864,7 +878,17 @@ class ConfigModelsTests(unittest.TestCase):
             },
             'error_handling': {
                 'realtime_tts_errors_dialog_type': 'Dialog'
-            }                           
+            },
+            'batch_processing': {
+                'note_update_chunk_size': 200,
+                'prepare_queue_depth': 50,
+                'pending_requests_per_worker': 2
+            },
+            'audio_cache': {
+                'max_size_mb': 0,
+                'deduplicate_audio': False,
+                'missing_audio_ttl_days': 30
+            }
         })
 
         preferences_config = {
@@ -885,7 +909,17 @@ class ConfigModelsTests(unittest.TestCase):
             },
             'error_handling': {
                 'realtime_tts_errors_dialog_type': 'Dialog'
-            }                           
+            },
+            'batch_processing': {
+                'note_update_chunk_size': 200,
+                'prepare_queue_depth': 50,
+                'pending_requests_per_worker': 2
+            },
+            'audio_cache': {
+                'max_size_mb': 0,
+                'deduplicate_audio': False,
+                'missing_audio_ttl_days': 30
+            }
         })        
 
     def test_preset_mapping_rules(self):
@@ -0,0 +1,91 @@
+import threading
+
+from test_utils import testing_utils
+
+from hypertts_addon import page_cache
+from hypertts_addon import errors
+from hypertts_addon import logging_utils
+
+logger = logging_utils.get_test_child_logger(__name__)
+
+
+class MockClock():
+    def __init__(self):
+        self.current_time = 1000.0
+
+    def clock(self):
+        return self.current_time
+
+
+def test_page_shared_until_expired():
+    mock_clock = MockClock()
+    cache = page_cache.PageCache(ttl_seconds=300, max_entries=2, clock=mock_clock.clock)
+    fetch_list = []
+    def get_fetch_fn(url):
+        def fetch_fn():
+            fetch_list.append(url)
+            return {'uk': f'{url}/uk.mp3', 'us': f'{url}/us.mp3'}
+        return fetch_fn
+
+    # the second accent uses the page fetched for the first one
+    assert cache.get('vehicle', get_fetch_fn('vehicle'))['uk'] == 'vehicle/uk.mp3'
+    assert cache.get('vehicle', get_fetch_fn('vehicle'))['us'] == 'vehicle/us.mp3'
+    assert fetch_list == ['vehicle']
+
+    mock_clock.current_time += 301
+    cache.get('vehicle', get_fetch_fn('vehicle'))
+    assert fetch_list == ['vehicle', 'vehicle']
+
+    # least recently used pages get dropped
+    cache.get('car', get_fetch_fn('car'))
+    cache.get('vehicle', get_fetch_fn('vehicle'))
+    cache.get('truck', get_fetch_fn('truck'))
+    cache.get('car', get_fetch_fn('car'))
+    assert fetch_list == ['vehicle', 'vehicle', 'car', 'truck', 'car']
+
+
+def test_page_not_found_cached():
+    mock_clock = MockClock()
+    cache = page_cache.PageCache(ttl_seconds=300, clock=mock_clock.clock)
+    fetch_list = []
+    def fetch_fn():
+        fetch_list.append('vehicle')
+        raise errors.AudioNotFoundError('vehicle', 'voice_uk')
+
+    # the second accent doesn't request the missing page again
+    assert cache.get('vehicle', fetch_fn) == None
+    assert cache.get('vehicle', fetch_fn) == None
+    assert fetch_list == ['vehicle']
+
+    mock_clock.current_time += 301
+    assert cache.get('vehicle', fetch_fn) == None
+    assert fetch_list == ['vehicle', 'vehicle']
+
+
+def test_page_fetched_once_concurrently():
+    cache = page_cache.PageCache()
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+    fetch_count = [0]
+    def slow_fetch():
+        fetch_count[0] += 1
+        fetch_started.set()
+        release_fetch.wait(5)
+        return {'uk': 'vehicle/uk.mp3'}
+
+    results = []
+    def worker():
+        results.append(cache.get('vehicle', slow_fetch))
+
+    threads = [threading.Thread(target=worker) for i in range(2)]
+    threads[0].start()
+    fetch_started.wait(5)
+    threads[1].start()
+    while cache.single_flight.in_flight_calls['vehicle'].waiter_count < 1:
+        release_fetch.wait(0.01)
+    release_fetch.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fetch_count[0] == 1
+    assert results == [{'uk': 'vehicle/uk.mp3'}] * 2
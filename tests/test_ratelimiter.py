@@ -0,0 +1,113 @@
+import threading
+
+from test_utils import testing_utils
+
+from hypertts_addon import ratelimiter
+from hypertts_addon import logging_utils
+
+logger = logging_utils.get_test_child_logger(__name__)
+
+
+class MockClock():
+    # time only moves forward when the rate limiter sleeps
+    def __init__(self):
+        self.current_time = 1000.0
+        self.sleep_calls = []
+
+    def clock(self):
+        return self.current_time
+
+    def sleep(self, seconds):
+        self.sleep_calls.append(seconds)
+        self.current_time += seconds
+
+
+def test_token_bucket_burst_then_wait():
+    mock_clock = MockClock()
+    bucket = ratelimiter.TokenBucket(2, 2, clock=mock_clock.clock, sleep=mock_clock.sleep)
+
+    # two requests fit in the bucket, no waiting
+    bucket.acquire(1)
+    bucket.acquire(1)
+    assert mock_clock.sleep_calls == []
+
+    # third request needs to wait for one token to refill
+    bucket.acquire(1)
+    assert mock_clock.sleep_calls == [0.5]
+
+    # after a long pause, the bucket is full again, but never above capacity
+    mock_clock.current_time += 60
+    bucket.acquire(1)
+    bucket.acquire(1)
+    assert mock_clock.sleep_calls == [0.5]
+    bucket.acquire(1)
+    assert mock_clock.sleep_calls == [0.5, 0.5]
+
+
+def test_token_bucket_oversized_request():
+    mock_clock = MockClock()
+    bucket = ratelimiter.TokenBucket(10, 100, clock=mock_clock.clock, sleep=mock_clock.sleep)
+
+    # a request larger than the bucket takes the full bucket instead of waiting forever
+    bucket.acquire(500)
+    assert mock_clock.sleep_calls == []
+    bucket.acquire(10)
+    assert mock_clock.sleep_calls == [1.0]
+
+
+def test_service_rate_limiter_characters_per_minute():
+    mock_clock = MockClock()
+    rate_limits = ratelimiter.RateLimits(characters_per_minute=600)
+    rate_limiter = ratelimiter.ServiceRateLimiter(rate_limits, clock=mock_clock.clock, sleep=mock_clock.sleep)
+
+    with rate_limiter.limit('a' * 590):
+        pass
+    assert mock_clock.sleep_calls == []
+    # 20 characters, only 10 left in the bucket, at 10 characters per second
+    with rate_limiter.limit('b' * 20):
+        pass
+    assert mock_clock.sleep_calls == [1.0]
+
+
+def test_service_rate_limiter_max_in_flight():
+    rate_limits = ratelimiter.RateLimits(max_in_flight=1)
+    rate_limiter = ratelimiter.ServiceRateLimiter(rate_limits)
+
+    second_request_entered = threading.Event()
+    def second_request():
+        with rate_limiter.limit('second'):
+            second_request_entered.set()
+
+    with rate_limiter.limit('first'):
+        thread = threading.Thread(target=second_request)
+        thread.start()
+        # the second request can't start while the first one is in flight
+        assert second_request_entered.wait(0.2) == False
+    assert second_request_entered.wait(5) == True
+    thread.join()
+
+
+def test_rate_limiter_manager():
+    manager = ratelimiter.RateLimiterManager()
+    limiter_1 = manager.get_rate_limiter('ServiceA', ratelimiter.RateLimits(requests_per_second=2))
+    # same limits, same limiter (the buckets are shared between callers)
+    assert manager.get_rate_limiter('ServiceA', ratelimiter.RateLimits(requests_per_second=2)) is limiter_1
+    # reconfigured service, new limiter
+    limiter_2 = manager.get_rate_limiter('ServiceA', ratelimiter.RateLimits(requests_per_second=5))
+    assert limiter_2 is not limiter_1
+    assert limiter_2.rate_limits.requests_per_second == 5
+
+
+def test_service_rate_limits_throttle_seconds(qtbot):
+    config_gen = testing_utils.TestConfigGenerator()
+    hypertts_instance = config_gen.build_hypertts_instance_test_servicemanager('default')
+    service_a = hypertts_instance.service_manager.get_service('ServiceA')
+
+    assert service_a.get_rate_limits().unlimited()
+
+    # legacy throttle_seconds setting maps to a request rate
+    service_a.configure({'api_key': 'valid_key', 'throttle_seconds': 0.5})
+    assert service_a.get_rate_limits() == ratelimiter.RateLimits(requests_per_second=2.0)
+
+    service_a.configure({'api_key': 'valid_key', 'requests_per_second': 3, 'characters_per_minute': 1000, 'max_in_flight': 2})
+    assert service_a.get_rate_limits() == ratelimiter.RateLimits(requests_per_second=3, characters_per_minute=1000, max_in_flight=2)
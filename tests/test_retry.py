@@ -0,0 +1,176 @@
+import requests
+import contextlib
+
+from test_utils import testing_utils
+
+from hypertts_addon import retry
+from hypertts_addon import errors
+from hypertts_addon import constants
+from hypertts_addon import context
+from hypertts_addon import servicemanager
+from hypertts_addon import logging_utils
+
+logger = logging_utils.get_test_child_logger(__name__)
+
+
+class MockResponse():
+    def __init__(self, status_code, headers={}):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FailingRequest():
+    # fails with the given exceptions, then succeeds
+    def __init__(self, exception_list):
+        self.exception_list = exception_list
+        self.call_count = 0
+
+    def __call__(self):
+        self.call_count += 1
+        if len(self.exception_list) > 0:
+            raise self.exception_list.pop(0)
+        return b'audio'
+
+
+def build_request_error(status_code, headers={}):
+    return errors.RequestError('old people', 'voice_1', f'status code {status_code}', response=MockResponse(status_code, headers))
+
+
+def test_parse_retry_after():
+    assert retry.parse_retry_after(None) == None
+    assert retry.parse_retry_after('5') == 5.0
+    assert retry.parse_retry_after('not a date') == None
+    # http dates in the past mean retry right away
+    assert retry.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_retry_transient_failures():
+    sleep_calls = []
+    retry_policy = retry.RetryPolicy(4, base_delay=1.0, max_delay=30.0, sleep=sleep_calls.append)
+
+    request = FailingRequest([build_request_error(503), requests.exceptions.ConnectionError('connection reset')])
+    assert retry_policy.call(request, 'test request') == b'audio'
+    assert request.call_count == 3
+    assert len(sleep_calls) == 2
+    # jittered exponential backoff
+    assert 0 <= sleep_calls[0] <= 1.0
+    assert 0 <= sleep_calls[1] <= 2.0
+
+
+def test_retry_honors_retry_after():
+    sleep_calls = []
+    retry_policy = retry.RetryPolicy(4, base_delay=1.0, max_delay=30.0, sleep=sleep_calls.append)
+
+    request = FailingRequest([build_request_error(429, {'Retry-After': '7'})])
+    assert retry_policy.call(request, 'test request') == b'audio'
+    assert 7.0 <= sleep_calls[0] <= 8.0
+
+    # server wants us to wait longer than we're willing to
+    request = FailingRequest([build_request_error(429, {'Retry-After': '3600'})])
+    try:
+        retry_policy.call(request, 'test request')
+        assert False, 'expected RequestError'
+    except errors.RequestError as e:
+        assert e.status_code == 429
+    assert request.call_count == 1
+
+
+def test_retry_permanent_failures():
+    sleep_calls = []
+    retry_policy = retry.RetryPolicy(4, sleep=sleep_calls.append)
+
+    # authentication errors and audio not found are not retried
+    for exception in [build_request_error(401), errors.AudioNotFoundError('old people', 'voice_1')]:
+        request = FailingRequest([exception])
+        try:
+            retry_policy.call(request, 'test request')
+            assert False, 'expected exception'
+        except errors.HyperTTSError:
+            pass
+        assert request.call_count == 1
+    assert sleep_calls == []
+
+    # transient failure which doesn't go away
+    request = FailingRequest([build_request_error(500)] * 10)
+    try:
+        retry_policy.call(request, 'test request')
+        assert False, 'expected RequestError'
+    except errors.RequestError:
+        pass
+    assert request.call_count == 4
+
+
+def test_circuit_breaker():
+    current_time = [1000.0]
+    circuit_breaker = retry.CircuitBreaker('ServiceA', failure_threshold=3, reset_seconds=60, clock=lambda: current_time[0])
+
+    for i in range(3):
+        try:
+            circuit_breaker.call(FailingRequest([build_request_error(503)]))
+        except errors.RequestError:
+            pass
+
+    # circuit is open, the request doesn't get sent
+    request = FailingRequest([])
+    try:
+        circuit_breaker.call(request)
+        assert False, 'expected ServiceUnavailable'
+    except errors.ServiceUnavailable as e:
+        assert str(e) == 'ServiceA failed 3 times in a row, requests to this service are paused for 60 seconds'
+    assert request.call_count == 0
+
+    # after the reset period, a trial request goes through and closes the circuit
+    current_time[0] += 61
+    assert circuit_breaker.call(request) == b'audio'
+    assert request.call_count == 1
+    assert circuit_breaker.call(request) == b'audio'
+
+
+def test_circuit_breaker_permanent_failures():
+    circuit_breaker = retry.CircuitBreaker('ServiceA', failure_threshold=2, reset_seconds=60)
+
+    # a service which responds with errors specific to the request is still available
+    for i in range(5):
+        try:
+            circuit_breaker.call(FailingRequest([errors.AudioNotFoundError('old people', 'voice_1')]))
+        except errors.AudioNotFoundError:
+            pass
+    assert circuit_breaker.call(FailingRequest([])) == b'audio'
+
+
+class CountingRateLimiter():
+    def __init__(self):
+        self.acquire_count = 0
+        self.in_flight = 0
+
+    @contextlib.contextmanager
+    def limit(self, source_text):
+        self.acquire_count += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+def test_retries_go_through_rate_limiter(monkeypatch):
+    manager = servicemanager.ServiceManager(testing_utils.get_test_services_dir(), f'{constants.DIR_HYPERTTS_ADDON}.test_services', True, testing_utils.MockCloudLanguageTools())
+    manager.init_services()
+    service_a = manager.get_service('ServiceA')
+    service_a.enabled = True
+    voice = [x for x in manager.full_voice_list() if x.name == 'voice_a_1'][0]
+
+    rate_limiter = CountingRateLimiter()
+    manager.get_rate_limiter = lambda voice: rate_limiter
+    in_flight_during_backoff = []
+    monkeypatch.setattr(retry.RetryPolicy, 'get_delay', lambda self, attempt, retry_after: in_flight_during_backoff.append(rate_limiter.in_flight) or 0)
+
+    # rate limited twice, then succeeds
+    request = FailingRequest([build_request_error(429, {'Retry-After': '1'}), build_request_error(503)])
+    service_a.get_tts_audio = lambda source_text, voice, options: request()
+    audio_request_context = context.AudioRequestContext(constants.AudioRequestReason.batch)
+    assert manager.get_tts_audio('old people', voice, {}, audio_request_context) == b'audio'
+    assert request.call_count == 3
+    # each attempt acquired the rate limits, none was held while backing off
+    assert rate_limiter.acquire_count == 3
+    assert in_flight_during_backoff == [0, 0]
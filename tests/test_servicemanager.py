@@ -274,3 +274,42 @@ class ServiceManagerTests(unittest.TestCase):
                 print(f'{key} is integer')
             elif isinstance(value, list):
                 print(f'{key} is list')
+
+    def test_http_sessions(self):
+        manager = servicemanager.ServiceManager(testing_utils.get_test_services_dir(), f'{constants.DIR_HYPERTTS_ADDON}.test_services', True, testing_utils.MockCloudLanguageTools())
+        manager.init_services()
+
+        # all the services and cloudlanguagetools share the same connections
+        http_session_manager = manager.http_session_manager
+        assert manager.get_service('ServiceA').get_http_session_manager() == http_session_manager
+        assert manager.get_service('ServiceB').get_http_session_manager() == http_session_manager
+        assert manager.cloudlanguagetools.http_session_manager == http_session_manager
+
+        # one session per host
+        session_1 = http_session_manager.get_session('https://api.example.com/v1/tts')
+        session_2 = http_session_manager.get_session('https://api.example.com/v1/voices?key=abc')
+        session_3 = http_session_manager.get_session('https://other.example.com/v1/tts')
+        assert session_1 == session_2
+        assert session_1 != session_3
+
+        # services don't share their sessions, nor their cookies
+        session_service_a = http_session_manager.get_session('https://api.example.com/v1/tts', session_name='ServiceA')
+        session_service_b = http_session_manager.get_session('https://api.example.com/v1/tts', session_name='ServiceB')
+        assert session_service_a != session_1
+        assert session_service_a != session_service_b
+
+        url = 'https://api.example.com/v1/tts'
+        assert session_1.get_adapter(url)._pool_maxsize == constants.HTTP_POOL_MAXSIZE_MIN
+        # the pool grows with the batch concurrency, the session stays the same, the previous pool gets closed
+        previous_adapter = session_1.get_adapter(url)
+        closed_adapters = []
+        previous_adapter.close = lambda: closed_adapters.append(previous_adapter)
+        assert http_session_manager.get_session(url, 10) == session_1
+        assert session_1.get_adapter(url)._pool_maxsize == 11
+        assert closed_adapters == [previous_adapter]
+        http_session_manager.get_session(url, 2)
+        assert session_1.get_adapter(url)._pool_maxsize == 11
+
+        # closing the profile closes the connections
+        manager.shutdown()
+        assert http_session_manager.get_session(url) != session_1
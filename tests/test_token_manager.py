@@ -0,0 +1,137 @@
+import threading
+
+from test_utils import testing_utils
+
+from hypertts_addon import token_manager
+from hypertts_addon import logging_utils
+
+logger = logging_utils.get_test_child_logger(__name__)
+
+
+class MockClock():
+    def __init__(self):
+        self.current_time = 1000.0
+
+    def clock(self):
+        return self.current_time
+
+
+class MockAuthEndpoint():
+    def __init__(self, lifetime_seconds=600):
+        self.lifetime_seconds = lifetime_seconds
+        self.request_count = 0
+        self.fail = False
+        self.lock = threading.Lock()
+        self.thread_list = []
+
+    def fetch(self):
+        with self.lock:
+            self.request_count += 1
+            request_count = self.request_count
+            self.thread_list.append(threading.current_thread())
+        if self.fail:
+            raise Exception('auth endpoint unavailable')
+        return f'token_{request_count}', self.lifetime_seconds
+
+
+def test_token_cached_and_refreshed_in_background():
+    mock_clock = MockClock()
+    auth_endpoint = MockAuthEndpoint()
+    manager = token_manager.TokenManager(clock=mock_clock.clock, refresh_window_seconds=300, expiry_margin_seconds=30)
+
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_1'
+    mock_clock.current_time += 200
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_1'
+    assert auth_endpoint.request_count == 1
+
+    # within the refresh window, the current token is returned while a new one gets requested
+    mock_clock.current_time += 200
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_1'
+    manager.refresh_futures[('Azure', 'account_1')].result()
+    assert auth_endpoint.request_count == 2
+    # the refresh doesn't keep Anki from exiting
+    assert auth_endpoint.thread_list[1].daemon == True
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_2'
+
+    # tokens are cached per service and account
+    assert manager.get_token('Azure', 'account_2', auth_endpoint.fetch) == 'token_3'
+    assert manager.get_token('CereProc', 'account_1', auth_endpoint.fetch) == 'token_4'
+
+    # the profile closed, the tokens get requested again
+    manager.shutdown()
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_5'
+
+
+def test_token_expired_fetched_inline():
+    mock_clock = MockClock()
+    auth_endpoint = MockAuthEndpoint()
+    manager = token_manager.TokenManager(clock=mock_clock.clock, refresh_window_seconds=300, expiry_margin_seconds=30)
+
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_1'
+    # too close to the expiry to be used
+    mock_clock.current_time += 580
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_2'
+    assert auth_endpoint.request_count == 2
+
+    # the service rejected the token
+    manager.invalidate('Azure', 'account_1')
+    assert manager.get_token('Azure', 'account_1', auth_endpoint.fetch) == 'token_3'
+
+
+def test_token_background_refresh_failure():
+    mock_clock = MockClock()
+    auth_endpoint = MockAuthEndpoint()
+    manager = token_manager.TokenManager(clock=mock_clock.clock, refresh_window_seconds=300, expiry_margin_seconds=30)
+
+    assert manager.get_token('AliCloud', 'account_1', auth_endpoint.fetch) == 'token_1'
+    auth_endpoint.fail = True
+    mock_clock.current_time += 400
+    # the failed refresh is logged, the token is still valid
+    assert manager.get_token('AliCloud', 'account_1', auth_endpoint.fetch) == 'token_1'
+    manager.refresh_futures[('AliCloud', 'account_1')].result()
+    assert manager.get_token('AliCloud', 'account_1', auth_endpoint.fetch) == 'token_1'
+    manager.refresh_futures[('AliCloud', 'account_1')].result()
+    assert auth_endpoint.request_count == 3
+
+    # once expired, the error reaches the request
+    mock_clock.current_time += 200
+    try:
+        manager.get_token('AliCloud', 'account_1', auth_endpoint.fetch)
+        assert False, 'expected an exception'
+    except Exception as e:
+        assert str(e) == 'auth endpoint unavailable'
+
+    manager.shutdown()
+
+
+def test_token_no_stampede():
+    mock_clock = MockClock()
+    manager = token_manager.TokenManager(clock=mock_clock.clock)
+
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+    request_count = [0]
+    def slow_fetch():
+        request_count[0] += 1
+        fetch_started.set()
+        release_fetch.wait(5)
+        return 'shared_token', 600
+
+    results = []
+    def worker():
+        results.append(manager.get_token('CereProc', 'account_1', slow_fetch))
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    threads[0].start()
+    fetch_started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # let the other workers join the in flight request
+    while manager.single_flight.in_flight_calls[('CereProc', 'account_1')].waiter_count < 7:
+        release_fetch.wait(0.01)
+    release_fetch.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert request_count[0] == 1
+    assert results == ['shared_token'] * 8
@@ -4,6 +4,7 @@ import re
 import random
 import copy
 import unittest
+import unittest.mock
 import pydub
 import platform
 import magic
@@ -29,6 +30,7 @@ from hypertts_addon import logging_utils
 from hypertts_addon import options
 from hypertts_addon import config_models
 from hypertts_addon import voice as voice_module
+from hypertts_addon import retry
 
 logger = logging_utils.get_test_child_logger(__name__)
 
@@ -464,6 +466,26 @@ class TTSTests(unittest.TestCase):
         # pick a random en_US voice
         self.random_voice_test(service_name, AudioLanguage.en_US, 'This is the first sentence')
 
+    def test_watson_transient_error_retried(self):
+        # pytest test_tts_services.py  -k 'TTSTests and test_watson_transient_error_retried'
+        service_name = 'Watson'
+
+        voice_list = self.manager.full_voice_list()
+        selected_voice = self.pick_random_voice(voice_list, service_name, AudioLanguage.en_US)
+        if self.manager.use_cloud_language_tools(selected_voice):
+            raise unittest.SkipTest(f'service {service_name} requests go through cloud language tools, skipping')
+
+        # the service is unavailable once, then returns the audio
+        unavailable_response = unittest.mock.Mock(status_code=503, reason='Service Unavailable', headers={'Retry-After': '1'})
+        audio_response = unittest.mock.Mock(status_code=200, reason='OK', headers={}, content=b'audio')
+        service = self.manager.get_service(service_name)
+        with unittest.mock.patch.object(service, 'http_post', side_effect=[unavailable_response, audio_response]) as http_post, \
+            unittest.mock.patch.object(retry.RetryPolicy, 'get_delay', return_value=0):
+            audio_data = self.manager.get_tts_audio('This is the first sentence', selected_voice, {},
+                context.AudioRequestContext(constants.AudioRequestReason.batch))
+        assert audio_data == b'audio'
+        assert http_post.call_count == 2
+
     def test_cereproc(self):
         # pytest test_tts_services.py  -k 'TTSTests and test_cereproc'
         service_name = 'CereProc'